@@ -1,14 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+import json
 import uuid
 from app.services.ai_service import AIService
+from app.services.container import get_ai_service
 
 router = APIRouter()
 
-# Initialize AI Service once (or as a dependency) to keep memory alive
-ai_service = AIService()
-
 class ChatRequest(BaseModel):
     message: str
     session_id: Optional[str] = None
@@ -18,7 +18,7 @@ class ChatResponse(BaseModel):
     session_id: str
 
 @router.post("/", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, ai_service: AIService = Depends(get_ai_service)):
     """
     Chat with the AI Sales Assistant.
     Provide a session_id to maintain context. If none is provided, a new one is generated.
@@ -26,3 +26,42 @@ async def chat(request: ChatRequest):
     session_id = request.session_id or str(uuid.uuid4())
     response = await ai_service.generate_response(request.message, session_id)
     return ChatResponse(response=response, session_id=session_id)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/stream")
+async def chat_stream(request: ChatRequest, ai_service: AIService = Depends(get_ai_service)):
+    """
+    Streaming variant of the chat endpoint (Server-Sent Events).
+    Emits `session` first, then `text` chunks as the model produces them,
+    `tool_start` / `tool_end` around product searches and orders, and finally `done`.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+
+    async def events():
+        yield _sse("session", {"session_id": session_id})
+        async for event in ai_service.stream_response(request.message, session_id):
+            event_type = event.pop("type")
+            yield _sse(event_type, event)
+        yield _sse("done", {"session_id": session_id})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/sessions/stats")
+async def chat_session_stats(ai_service: AIService = Depends(get_ai_service)):
+    """
+    Session count, estimated history size and eviction counters of the chat session store.
+    """
+    return ai_service.chat_sessions.stats()
+
+@router.get("/routing/stats")
+async def chat_routing_stats(ai_service: AIService = Depends(get_ai_service)):
+    """
+    Model tier per turn: calls, failures, fallbacks and turn latency of each Gemini tier.
+    """
+    return ai_service.model_router.stats()
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from app.core.http import http_clients
+from app.services.container import get_shopify_client, services
+from app.services.shopify_rate_limiter import shopify_rate_limiter
 from app.services.shopify_service import ShopifyClient
 
 router = APIRouter()
 
 @router.get("/health")
-async def health_check():
-    client = ShopifyClient()
+async def health_check(client: ShopifyClient = Depends(get_shopify_client)):
     try:
         shop_data = await client.check_connection()
         return {
@@ -15,3 +17,26 @@ async def health_check():
         }
     except Exception as e:
         raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/health/ready")
+async def readiness():
+    """
+    Ready once the services are built and the warm-up has run, with the time each startup step took.
+    """
+    if not services.ready:
+        raise HTTPException(status_code=503, detail=services.stats())
+    return services.stats()
+
+@router.get("/health/http")
+async def http_pool_stats():
+    """
+    Request counters and connection pool usage of the shared outbound HTTP clients.
+    """
+    return http_clients.stats()
+
+@router.get("/health/shopify-rate-limit")
+async def shopify_rate_limit_stats():
+    """
+    Estimated Shopify API bucket level, queued requests and 429 count.
+    """
+    return shopify_rate_limiter.stats()
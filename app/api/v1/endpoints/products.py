@@ -1,17 +1,27 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, Query
 from typing import List
 from app.services.shopify_service import ShopifyClient
 from app.schemas.product import Product
+from app.services.catalog_cache import catalog_cache
+from app.services.container import get_shopify_client
+from app.services.product_render_cache import product_render_cache
 
 router = APIRouter()
 
 @router.get("/search")
 async def search_products(
-    q: str = Query(..., min_length=2, description="Search query for product title")
+    q: str = Query(..., min_length=2, description="Search query for product title"),
+    client: ShopifyClient = Depends(get_shopify_client),
 ):
     """
     Search for products by title.
     """
-    client = ShopifyClient()
     products_str = await client.search_products(query=q)
     return {"result": products_str}
+
+@router.get("/catalog/stats")
+async def catalog_stats():
+    """
+    Hit/miss/age stats for the in-memory catalog snapshot and the rendered result blocks.
+    """
+    return {**catalog_cache.stats(), "render_cache": product_render_cache.stats()}
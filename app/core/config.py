@@ -1,16 +1,136 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
+from typing import Literal, Optional
 
 class Settings(BaseSettings):
     SHOPIFY_STORE_URL: str
     SHOPIFY_ACCESS_TOKEN: str
     SHOPIFY_API_VERSION: str = "2024-01"
+    # Overrides the Admin API base URL (e.g. a local stub for benchmarks)
+    SHOPIFY_API_BASE_URL: Optional[str] = None
     GEMINI_API_KEY: str
     
     # Meta (WhatsApp/Instagram) Config
     META_ACCESS_TOKEN: str = "placeholder_token"
     META_PHONE_ID: str = "placeholder_id"
     META_VERIFY_TOKEN: str = "MODAMASAL_SECRET_TOKEN"
+    # Graph API root incl. version (overridable for a local stub in benchmarks)
+    META_GRAPH_BASE_URL: str = "https://graph.facebook.com/v17.0"
+    # Quick bursts from one WhatsApp sender are merged into a single model turn
+    WHATSAPP_DEBOUNCE_SECONDS: float = 1.5
+    WHATSAPP_MAX_DEBOUNCE_SECONDS: float = 5.0
+    WHATSAPP_MAX_BATCH_MESSAGES: int = 10
+    # Meta redelivers webhooks; message IDs seen within this window are dropped. The cache is per
+    # process, so a redelivery that reaches another worker process is still queued (a unique
+    # message id on the jobs table would catch those)
+    WHATSAPP_DEDUP_MAX_IDS: int = 50000
+    WHATSAPP_DEDUP_TTL_SECONDS: int = 24 * 60 * 60
+
+    # Shared outbound HTTP pools (one per upstream)
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 10
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    HTTP2_ENABLED: bool = False
+    SHOPIFY_TIMEOUT_SECONDS: float = 15.0
+    META_TIMEOUT_SECONDS: float = 10.0
+
+    # Startup warm-up: upstream connections are opened and the catalog is loaded before the
+    # app reports ready. A failed or slow step is logged and left to the first request
+    STARTUP_WARMUP: bool = True
+    STARTUP_WARMUP_TIMEOUT_SECONDS: float = 30.0
+    # Connections opened per upstream (about the number of concurrent first requests to absorb)
+    HTTP_WARMUP_CONNECTIONS: int = 4
+
+    # In-memory chat sessions (AIService)
+    CHAT_MAX_SESSIONS: int = 5000
+    CHAT_MAX_HISTORY_BYTES: int = 256 * 1024 * 1024
+    CHAT_SESSION_IDLE_TTL_SECONDS: int = 6 * 60 * 60
+    # History replayed to the model each turn is compacted to stay within this budget
+    CHAT_HISTORY_TOKEN_BUDGET: int = 6000
+    CHAT_HISTORY_KEEP_TURNS: int = 3
+    CHAT_TOOL_RESULT_MAX_CHARS: int = 800
+
+    # Tool loop of a single chat turn
+    AI_MAX_TOOL_ROUNDS: int = 4
+    AI_TURN_TIME_BUDGET_SECONDS: float = 45.0
+
+    # Gemini model tiers. "rules" routes each model call by message and conversation features
+    # (see app/services/model_router.py); "fixed" always uses the flash tier
+    AI_ROUTING_POLICY: Literal["rules", "fixed"] = "rules"
+    AI_MODEL_LITE: str = "gemini-flash-lite-latest"
+    AI_MODEL_FLASH: str = "gemini-flash-latest"
+    AI_MODEL_PRO: str = "gemini-pro-latest"
+    # Time one model call may take (until the first chunk when streaming) before the next tier is tried
+    AI_TIMEOUT_LITE_SECONDS: float = 8.0
+    AI_TIMEOUT_FLASH_SECONDS: float = 15.0
+    AI_TIMEOUT_PRO_SECONDS: float = 30.0
+
+    # Persistent background job queue (webhook processing)
+    JOB_WORKERS: int = 4
+    JOB_QUEUE_MAX_DEPTH: int = 1000
+    # Jobs passed on by their handler and still running elsewhere (WhatsApp messages waiting in a
+    # sender's mailbox); workers stop claiming while this many are outstanding
+    JOB_MAX_HANDED_OFF: int = 200
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_VISIBILITY_TIMEOUT_SECONDS: float = 120.0
+    JOB_POLL_INTERVAL_SECONDS: float = 1.0
+
+    # Shopify REST rate limit (leaky bucket) and retries
+    SHOPIFY_BUCKET_SIZE: int = 40
+    SHOPIFY_LEAK_RATE: float = 2.0
+    SHOPIFY_WRITE_RESERVE: int = 4
+    SHOPIFY_MAX_RETRIES: int = 3
+    SHOPIFY_RETRY_BACKOFF_SECONDS: float = 0.5
+
+    # Catalog snapshot used by product search
+    CATALOG_TTL_SECONDS: int = 300
+    CATALOG_PREFETCH_PAGES: bool = True
+    # "rest" pages through /products.json; "bulk" runs a GraphQL bulk operation (better for large stores)
+    CATALOG_SYNC_MODE: Literal["rest", "bulk"] = "rest"
+    CATALOG_BULK_POLL_SECONDS: float = 2.0
+    CATALOG_BULK_TIMEOUT_SECONDS: float = 600.0
+    # Rendered search result blocks kept per product version
+    CATALOG_RENDER_CACHE_SIZE: int = 50000
+
+    # Database engine. "debug" echoes every SQL statement; keep "production" in deployments
+    DB_PROFILE: Literal["production", "debug"] = "production"
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    # Interpolated into PRAGMA statements, so only the values SQLite accepts
+    SQLITE_JOURNAL_MODE: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"] = "WAL"
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    # SQLite has one writer at a time; a small pool queues writers fairly instead of in busy retries
+    SQLITE_POOL_SIZE: int = 5
+    ASYNCPG_STATEMENT_CACHE_SIZE: int = 100
+
+    # Logging (JSON lines on stdout, written from a background thread)
+    LOG_LEVEL: str = "INFO"
+    # Per-module overrides, e.g. "app.services.shopify_service=DEBUG,httpx=WARNING"
+    LOG_LEVELS: str = ""
+    # Share of DEBUG records kept when debug logging is on
+    LOG_DEBUG_SAMPLE_RATE: float = 0.1
+
+    # Admin dashboard live updates (SSE)
+    ADMIN_EVENTS_QUEUE_SIZE: int = 1000
+    ADMIN_EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    # Catch-up re-reads changes this much older than the client's position, since updated_at is
+    # set before commit and a slow transaction can commit behind it
+    ADMIN_CHANGES_OVERLAP_SECONDS: float = 5.0
+    # A reconnecting tab further behind than this many changes gets `resync` instead of a replay
+    ADMIN_EVENTS_REPLAY_MAX: int = 5000
+
+    # Request tracing: the slowest traces are kept for the admin panel, and requests sending
+    # TRACE_DEBUG_HEADER get their span breakdown back in a Server-Timing header
+    TRACE_DEBUG_HEADER: str = "X-Debug-Timing"
+    TRACE_SLOWEST_SIZE: int = 50
+    TRACE_MAX_SPANS: int = 500
+    # Long-lived streams (SSE) and the scrape endpoints would crowd out real requests
+    TRACE_EXCLUDED_PATHS: str = "/metrics,/api/v1/admin/orders/events,/api/v1/admin/traces"
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
@@ -21,4 +141,12 @@ class Settings(BaseSettings):
             raise ValueError("SHOPIFY_STORE_URL must not contain 'http://' or 'https://'")
         return v
 
+    @field_validator("AI_MAX_TOOL_ROUNDS")
+    @classmethod
+    def validate_max_tool_rounds(cls, v: int) -> int:
+        # With no tool round the first function call could never be answered
+        if v < 1:
+            raise ValueError("AI_MAX_TOOL_ROUNDS must be at least 1")
+        return v
+
 settings = Settings()
@@ -0,0 +1,157 @@
+import asyncio
+import importlib.util
+import logging
+import time
+from typing import Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_ERRORS, UPSTREAM_SECONDS
+from app.core.tracing import record
+
+logger = logging.getLogger(__name__)
+
+SHOPIFY = "shopify"
+META = "meta"
+
+
+def _operation(request: httpx.Request) -> str:
+    """
+    Metric label for a request: the API resource ("products.json", "messages"), never an id
+    or a signed bulk-result file name, so the number of series stays small.
+    """
+    resource = request.url.path.rstrip("/").rsplit("/", 1)[-1]
+    if resource.endswith(".json") or resource == "messages":
+        return f"{request.method} {resource}"
+    return f"{request.method} other"
+
+
+class _CountingTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the pooled transport to count requests, record their latency (until the response
+    headers arrive) and expose the connection pool state.
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, name: str):
+        self._transport = transport
+        self.name = name
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        operation = _operation(request)
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception as e:
+            self.errors += 1
+            UPSTREAM_ERRORS.inc(upstream=self.name, operation=operation)
+            record(f"{self.name} {operation}", start, error=type(e).__name__)
+            raise
+        finally:
+            self.in_flight -= 1
+            UPSTREAM_SECONDS.observe(time.perf_counter() - start, upstream=self.name, operation=operation)
+        failed = response.status_code == 429 or response.status_code >= 500
+        if failed:
+            UPSTREAM_ERRORS.inc(upstream=self.name, operation=operation)
+        record(f"{self.name} {operation}", start, error=str(response.status_code) if failed else None)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def pool_stats(self) -> dict:
+        # httpcore does not publish pool metrics; read them defensively
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for c in connections if getattr(c, "is_idle", lambda: False)())
+        http2 = sum(1 for c in connections if "HTTP/2" in repr(c))
+        return {
+            "connections": len(connections),
+            "idle": idle,
+            "active": len(connections) - idle,
+            "http2": http2,
+        }
+
+
+class HTTPClients:
+    """
+    One pooled httpx.AsyncClient per upstream (Shopify, Meta Graph).
+    Opened in the app lifespan and closed on shutdown, so connections are reused across requests.
+    Outside the app (scripts, benchmarks) a client is created on first use; call close() when done.
+    """
+
+    def __init__(self):
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._transports: Dict[str, _CountingTransport] = {}
+
+    def _timeouts(self) -> Dict[str, float]:
+        return {
+            SHOPIFY: settings.SHOPIFY_TIMEOUT_SECONDS,
+            META: settings.META_TIMEOUT_SECONDS,
+        }
+
+    def _http2_enabled(self) -> bool:
+        if not settings.HTTP2_ENABLED:
+            return False
+        if importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP2_ENABLED ayarlı ama 'h2' paketi kurulu değil, HTTP/1.1 kullanılıyor.")
+            return False
+        return True
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        transport = _CountingTransport(
+            httpx.AsyncHTTPTransport(limits=limits, http2=self._http2_enabled()), name
+        )
+        timeout = httpx.Timeout(self._timeouts()[name], connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS)
+        self._transports[name] = transport
+        return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+    async def start(self) -> None:
+        for name in (SHOPIFY, META):
+            self.get(name)
+
+    async def warm_up(self, name: str, url: str, connections: int = 1) -> None:
+        """
+        Opens `connections` pooled connections to an upstream (DNS, TCP and TLS done up front)
+        with concurrent unauthenticated HEAD requests; the response status does not matter.
+        """
+        client = self.get(name)
+        await asyncio.gather(*(client.head(url) for _ in range(connections)))
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        client = self._clients.get(name)
+        if client is None or client.is_closed:
+            client = self._create(name)
+            self._clients[name] = client
+        return client
+
+    async def close(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    def stats(self) -> dict:
+        result = {}
+        for name, transport in self._transports.items():
+            client: Optional[httpx.AsyncClient] = self._clients.get(name)
+            result[name] = {
+                "open": client is not None and not client.is_closed,
+                "requests": transport.requests,
+                "errors": transport.errors,
+                "in_flight": transport.in_flight,
+                **transport.pool_stats(),
+            }
+        return result
+
+
+http_clients = HTTPClients()
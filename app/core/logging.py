@@ -0,0 +1,169 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.core.config import Settings, settings
+
+# Attributes every LogRecord has; anything else on a record came in through `extra=`
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+PHONE_RE = re.compile(r"(?<!\d)(?:\+?90[\s-]*)?0?5\d{2}[\s-]*\d{3}[\s-]*\d{2}[\s-]*\d{2}(?!\d)")
+# Extra fields holding phone numbers (WhatsApp sender IDs are phone numbers too) or addresses
+PHONE_FIELDS = {"phone", "to_number", "sender_id"}
+ADDRESS_FIELDS = {"address", "address1"}
+
+
+def mask_phone(value) -> str:
+    digits = re.sub(r"\D", "", str(value))
+    return f"***{digits[-4:]}" if len(digits) > 4 else "***"
+
+
+def mask_phones_in(text: str) -> str:
+    return PHONE_RE.sub(lambda m: mask_phone(m.group()), text)
+
+
+class RedactionFilter(logging.Filter):
+    """
+    Masks phone numbers (keeping the last 4 digits) and drops addresses. Phone fields are
+    masked whole; numbers inside the message text, the traceback and any other string `extra`
+    field (a WhatsApp session_id is "wa_<phone>") are masked where they appear.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in list(vars(record).items()):
+            if key in _RECORD_ATTRS or not value:
+                continue
+            if key in PHONE_FIELDS:
+                setattr(record, key, mask_phone(value))
+            elif key in ADDRESS_FIELDS:
+                setattr(record, key, "[redacted]")
+            elif isinstance(value, str) and PHONE_RE.search(value):
+                setattr(record, key, mask_phones_in(value))
+        message = record.getMessage()
+        if PHONE_RE.search(message):
+            record.msg = mask_phones_in(message)
+            record.args = None
+        # Exception messages carry numbers too; redact the rendered traceback instead
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if record.exc_text and PHONE_RE.search(record.exc_text):
+            record.exc_text = mask_phones_in(record.exc_text)
+        return True
+
+
+class DebugSampler(logging.Filter):
+    """
+    Lets through only a `rate` share of DEBUG records (per-search / per-message events);
+    INFO and above always pass.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, message, `extra` fields and the traceback.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Merges the message arguments and renders the traceback before enqueueing (the objects
+    may change or be gone by the time the writer thread gets the record), but leaves the
+    `extra` fields in place for redaction and the JSON output.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """
+    "app.services.shopify_service=DEBUG,sqlalchemy.engine=WARNING" -> {logger: level}
+    """
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(config: Settings = settings) -> None:
+    """
+    Routes all logging through a queue: the event loop only enqueues records, and a
+    background thread formats them as JSON (with redaction) and writes them to stdout.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(log_queue)
+    # Sampled before enqueueing, so dropped debug records cost next to nothing
+    queue_handler.addFilter(DebugSampler(config.LOG_DEBUG_SAMPLE_RATE))
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter())
+    output.addFilter(RedactionFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(config.LOG_LEVEL.upper())
+    for name, level in parse_levels(config.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """
+    Flushes the queued records and stops the writer thread.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,266 @@
+import bisect
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Upstream and route latencies, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(map(labels.__getitem__, self.labelnames))
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        ...
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """
+    Monotonic count per label set, e.g. upstream_errors_total{upstream="shopify",...}.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+            for key, value in list(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """
+    Current value per label set, either set directly or read from a callback at scrape time
+    (session counts, in-flight tasks), so the hot path never has to update it.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._functions: Dict[Tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        self._functions[self._key(labels)] = fn
+
+    def samples(self) -> List[str]:
+        values = dict(self._values)
+        for key, fn in list(self._functions.items()):
+            values[key] = fn()
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket latency histogram per label set. observe() is a bisect and three additions;
+    buckets are made cumulative only when scraped.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [count per bucket..., count above the last bucket, sum]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        slots = self._values.get(key)
+        if slots is None:
+            slots = self._values[key] = [0] * (len(self.buckets) + 2)
+        slots[bisect.bisect_left(self.buckets, value)] += 1
+        slots[-1] += value
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, slots in list(self._values.items()):
+            slots = list(slots)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), slots[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {_number(cumulative)}")
+            labels = _labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(slots[-1])}")
+            lines.append(f"{self.name}_count{labels} {_number(cumulative)}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: dict, errors: Optional[Counter] = None):
+        self.histogram = histogram
+        self.labels = labels
+        self.errors = errors
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc(**self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+registry = Registry()
+
+# Outbound calls: Gemini, Shopify and Meta Graph
+UPSTREAM_SECONDS = registry.register(Histogram(
+    "upstream_request_seconds", "Latency of calls to Gemini, Shopify and Meta Graph.", ("upstream", "operation"),
+))
+UPSTREAM_ERRORS = registry.register(Counter(
+    "upstream_errors_total", "Failed upstream calls (exceptions, 429 and 5xx responses).", ("upstream", "operation"),
+))
+
+# Model tool calls
+TOOL_SECONDS = registry.register(Histogram(
+    "tool_call_seconds", "Duration of model tool calls.", ("tool",),
+))
+TOOL_ERRORS = registry.register(Counter(
+    "tool_errors_total", "Model tool calls that raised.", ("tool",),
+))
+
+# Database statements
+DB_SECONDS = registry.register(Histogram(
+    "db_query_seconds", "Database statement latency by statement type.", ("operation",), buckets=DB_BUCKETS,
+))
+DB_ERRORS = registry.register(Counter(
+    "db_errors_total", "Database statements that raised.", ("operation",),
+))
+
+# Inbound HTTP requests, labelled with the route template rather than the raw path
+HTTP_SECONDS = registry.register(Histogram(
+    "http_request_seconds", "HTTP request duration by route.", ("method", "route", "status"),
+))
+
+# Chat turns by the Gemini tier that served them
+AI_TURN_SECONDS = registry.register(Histogram(
+    "ai_turn_seconds", "Chat turn duration by the model tier that produced the answer.", ("tier",),
+))
+AI_TIER_FALLBACKS = registry.register(Counter(
+    "ai_tier_fallbacks_total", "Model calls retried on another tier after a failure or timeout.", ("from_tier", "to_tier"),
+))
+
+CHAT_SESSIONS = registry.register(Gauge(
+    "chat_sessions", "Active Gemini chat sessions.", ("channel",),
+))
+BACKGROUND_TASKS = registry.register(Gauge(
+    "background_tasks_in_flight", "Background work currently running.", ("kind",),
+))
+
+
+def track(histogram: Histogram, errors: Counter, **labels) -> _Timer:
+    """
+    Times a block into `histogram` and counts it in `errors` if it raises:
+
+        with track(UPSTREAM_SECONDS, UPSTREAM_ERRORS, upstream="gemini", operation="send_message"):
+            ...
+    """
+    return _Timer(histogram, labels, errors)
+
+
+def _route_label(scope) -> str:
+    template = getattr(scope.get("route"), "path", None)
+    if template is None:
+        return "unmatched"
+    # Depending on the FastAPI version, a route of an included router reports its path with or
+    # without the router prefix; take the prefix back from the request path (prefixes here are static)
+    segments = scope["path"].split("/")
+    return "/".join(segments[: max(len(segments) - template.count("/"), 1)]) + template
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware recording http_request_seconds per route template and status.
+    Unmatched paths share one label so scanners cannot blow up the series count.
+    Streaming responses (SSE, exports) are timed until their last body chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_SECONDS.observe(
+                time.perf_counter() - start, method=scope["method"], route=_route_label(scope), status=status[0],
+            )
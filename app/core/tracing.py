@@ -0,0 +1,257 @@
+import contextlib
+import functools
+import heapq
+import itertools
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from app.core.config import Settings, settings
+
+_TOKEN_RE = re.compile(r"[^A-Za-z0-9_.-]")
+# Keeps the Server-Timing header well below common proxy header limits
+SERVER_TIMING_MAX_ENTRIES = 60
+
+
+@dataclass(eq=False)
+class Span:
+    name: str
+    start: float
+    end: Optional[float] = None
+    error: Optional[str] = None
+    children: List["Span"] = field(default_factory=list)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> dict:
+        data = {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration_ms, 2),
+        }
+        if self.error:
+            data["error"] = self.error
+        if self.children:
+            data["children"] = [child.to_dict(origin) for child in self.children]
+        return data
+
+
+@dataclass(eq=False)
+class Trace:
+    name: str
+    root: Span
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])
+    started_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    tags: Dict[str, str] = field(default_factory=dict)
+    spans: int = 0
+    dropped: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "duration_ms": round(self.root.duration_ms, 2),
+            "tags": self.tags,
+            "dropped_spans": self.dropped,
+            **({"error": self.root.error} if self.root.error else {}),
+            "spans": [child.to_dict(self.root.start) for child in self.root.children],
+        }
+
+
+class SlowTraceBuffer:
+    """
+    Keeps the `size` slowest finished traces (a min-heap on duration, so adding one is O(log size)).
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._heap: list = []
+        self._seq = itertools.count()
+        self.recorded = 0
+
+    def add(self, trace: Trace) -> None:
+        self.recorded += 1
+        if self.size <= 0:
+            return
+        item = (trace.root.duration_ms, next(self._seq), trace)
+        if len(self._heap) < self.size:
+            heapq.heappush(self._heap, item)
+        elif item[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+
+    def slowest(self, limit: Optional[int] = None) -> List[dict]:
+        items = sorted(self._heap, key=lambda item: item[0], reverse=True)
+        return [trace.to_dict() for _, _, trace in items[:limit]]
+
+    def clear(self) -> None:
+        self._heap = []
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "kept": len(self._heap),
+            "recorded": self.recorded,
+            "threshold_ms": round(self._heap[0][0], 2) if len(self._heap) == self.size else None,
+        }
+
+
+slow_traces = SlowTraceBuffer(settings.TRACE_SLOWEST_SIZE)
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def _attach(name: str, start: float) -> Optional[Span]:
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    if trace.spans >= settings.TRACE_MAX_SPANS:
+        trace.dropped += 1
+        return None
+    new_span = Span(name, start)
+    trace.spans += 1
+    (_current_span.get() or trace.root).children.append(new_span)
+    return new_span
+
+
+@contextlib.contextmanager
+def trace(name: str):
+    """
+    Starts a new trace (one request, job or conversation turn) in the current context.
+    Tasks created inside inherit it, so tool calls running in parallel land in the same trace.
+    The finished trace is offered to the slowest-traces buffer.
+    """
+    new_trace = Trace(name=name, root=Span(name, time.perf_counter()))
+    trace_token = _current_trace.set(new_trace)
+    span_token = _current_span.set(new_trace.root)
+    try:
+        yield new_trace
+    except BaseException as e:
+        new_trace.root.error = type(e).__name__
+        raise
+    finally:
+        new_trace.root.end = time.perf_counter()
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        slow_traces.add(new_trace)
+
+
+@contextlib.contextmanager
+def span(name: str):
+    """
+    Times a block as a child of the current span; spans opened inside it nest under it.
+    Outside a trace this is a no-op. Not for blocks that yield in an async generator:
+    the generator may be closed from another context.
+    """
+    new_span = _attach(name, time.perf_counter())
+    if new_span is None:
+        yield None
+        return
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = type(e).__name__
+        raise
+    finally:
+        new_span.end = time.perf_counter()
+        _current_span.reset(token)
+
+
+def record(name: str, start: float, error: Optional[str] = None) -> None:
+    """
+    Adds a finished leaf span that started at `start` (time.perf_counter()) and ends now.
+    For calls that are timed anyway (HTTP, DB statements, model calls).
+    """
+    new_span = _attach(name, start)
+    if new_span is not None:
+        new_span.end = time.perf_counter()
+        new_span.error = error
+
+
+def tag(key: str, value) -> None:
+    """
+    Labels the current trace, e.g. with the chat session it belongs to.
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.tags[key] = str(value)
+
+
+def traced(name: str):
+    """
+    Decorator running a coroutine function inside span(name).
+    """
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def server_timing(trace: Trace) -> str:
+    """
+    Flattens the spans finished so far into a Server-Timing header value (depth-first).
+    """
+    entries = []
+
+    def walk(parent: Span) -> None:
+        for child in parent.children:
+            if len(entries) >= SERVER_TIMING_MAX_ENTRIES:
+                return
+            description = child.name.replace('"', "'")
+            entries.append(f'{_TOKEN_RE.sub("_", child.name)};desc="{description}";dur={child.duration_ms:.1f}')
+            walk(child)
+
+    walk(trace.root)
+    entries.append(f"total;dur={trace.root.duration_ms:.1f}")
+    return ", ".join(entries)
+
+
+class TracingMiddleware:
+    """
+    Traces every HTTP request except TRACE_EXCLUDED_PATHS. When the request carries
+    TRACE_DEBUG_HEADER, the response gets a Server-Timing breakdown and an X-Trace-Id.
+    For streaming responses the header only covers the work done before the body starts.
+    """
+
+    def __init__(self, app, config: Settings = settings):
+        self.app = app
+        self.excluded = tuple(p.strip() for p in config.TRACE_EXCLUDED_PATHS.split(",") if p.strip())
+        self.debug_header = config.TRACE_DEBUG_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.excluded):
+            await self.app(scope, receive, send)
+            return
+
+        debug = any(name == self.debug_header for name, _ in scope["headers"])
+
+        with trace(f'{scope["method"]} {scope["path"]}') as current:
+            async def send_wrapper(message):
+                if debug and message["type"] == "http.response.start":
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"server-timing", server_timing(current).encode("latin-1", "replace")),
+                        (b"x-trace-id", current.id.encode("latin-1")),
+                    ]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
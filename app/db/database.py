@@ -1,12 +1,20 @@
+import logging
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import time
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from app.core.config import Settings, settings
+from app.core.metrics import DB_ERRORS, DB_SECONDS
+from app.core.tracing import record
+
+logger = logging.getLogger(__name__)
 
 # Check for DATABASE_URL (Cloud) or use local SQLite
 DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL:
     DATABASE_URL = DATABASE_URL.strip()
-print(f"DEBUGGING STARTUP: Raw DATABASE_URL found: {bool(DATABASE_URL)}")
 
 if DATABASE_URL:
     if DATABASE_URL.startswith("postgres://"):
@@ -17,15 +25,91 @@ if DATABASE_URL:
 if not DATABASE_URL:
     # Fallback to local SQLite
     DATABASE_URL = "sqlite+aiosqlite:///./modamasal.db"
-    print("DEBUGGING STARTUP: Using Local SQLite")
 
-print(f"DEBUGGING STARTUP: Final URL Scheme: {DATABASE_URL.split('://')[0]}")
+logger.info("Database scheme: %s", DATABASE_URL.split("://")[0])
+
+_DB_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK"}
+
+
+def _db_operation(statement: str) -> str:
+    keyword = statement.lstrip()[:8].split(None, 1)
+    keyword = keyword[0].upper() if keyword else ""
+    return keyword if keyword in _DB_OPERATIONS else "OTHER"
+
+
+def _instrument(new_engine: AsyncEngine) -> None:
+    """
+    Records db_query_seconds / db_errors_total for every statement the engine runs,
+    and a span for it when the statement is part of a trace.
+    """
+    sync_engine = new_engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _observe(conn, cursor, statement, parameters, context, executemany):
+        operation = _db_operation(statement)
+        DB_SECONDS.observe(time.perf_counter() - context._metrics_start, operation=operation)
+        record(f"db {operation}", context._metrics_start)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        operation = _db_operation(exception_context.statement or "")
+        DB_ERRORS.inc(operation=operation)
+        start = getattr(exception_context.execution_context, "_metrics_start", None)
+        if start is not None:
+            record(f"db {operation}", start, error=type(exception_context.original_exception).__name__)
+
+def build_engine(database_url: str, config: Settings = settings) -> AsyncEngine:
+    """
+    Creates the async engine for the configured profile (see the DB_* / SQLITE_* settings).
+    SQLite gets a small fixed pool, plus WAL, the synchronous level and a busy timeout on every
+    new connection. Server databases get the DB_POOL_* settings, and asyncpg its prepared
+    statement cache size. SQL is only echoed in the debug profile.
+    """
+    url = make_url(database_url)
+    kwargs = {"echo": config.DB_PROFILE == "debug"}
+    is_memory_sqlite = url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+    if url.get_backend_name() == "sqlite":
+        if not is_memory_sqlite:
+            kwargs.update(pool_size=config.SQLITE_POOL_SIZE, max_overflow=0, pool_timeout=config.DB_POOL_TIMEOUT_SECONDS)
+    else:
+        kwargs.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_timeout=config.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=config.DB_POOL_RECYCLE_SECONDS,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+        )
+    if url.get_backend_name() == "sqlite":
+        kwargs["connect_args"] = {"timeout": config.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    elif url.get_driver_name() == "asyncpg":
+        kwargs["connect_args"] = {"prepared_statement_cache_size": config.ASYNCPG_STATEMENT_CACHE_SIZE}
+
+    new_engine = create_async_engine(database_url, **kwargs)
+
+    if url.get_backend_name() == "sqlite":
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            # WAL lets readers run alongside the single writer; NORMAL is durable in WAL mode
+            # except for the last transactions on power loss
+            cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+            cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA busy_timeout={int(config.SQLITE_BUSY_TIMEOUT_MS)}")
+            cursor.close()
+
+    _instrument(new_engine)
+    return new_engine
 
 try:
-    engine = create_async_engine(DATABASE_URL, echo=True)
+    engine = build_engine(DATABASE_URL)
 except Exception as e:
-    print(f"CRITICAL DB ENGINE ERROR: {e}")
-    raise e
+    logger.critical("DB engine could not be created: %s", e)
+    raise
 SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
 
 Base = declarative_base()
@@ -34,6 +118,25 @@ async def get_db():
     async with SessionLocal() as session:
         yield session
 
+def _create_missing_indexes(sync_conn):
+    # create_all skips tables that already exist, so indexes added to them later are created here
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+def _add_missing_columns(sync_conn):
+    # Same for nullable columns added to existing tables. alembic is installed but has no
+    # environment or revisions here yet; once it does, these columns belong in a revision
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing and column.nullable:
+                column_type = column.type.compile(dialect=sync_conn.dialect)
+                sync_conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Index
 from datetime import datetime
 import enum
 from .database import Base
@@ -44,3 +44,42 @@ class Order(Base):
     payment_method = Column(Enum(PaymentMethod), default=PaymentMethod.CREDIT_CARD)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Admin list: newest first, keyset-paginated on (created_at, id), optionally filtered
+    __table_args__ = (
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_orders_source_created_at_id", "source", "created_at", "id"),
+        Index("ix_orders_payment_method_created_at_id", "payment_method", "created_at", "id"),
+        # Dashboard catch-up: changes since (updated_at, id)
+        Index("ix_orders_updated_at_id", "updated_at", "id"),
+    )
+
+class JobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+
+class Job(Base):
+    """
+    Background job persisted so it survives restarts (see app/services/job_queue.py).
+    Finished jobs are deleted; failed ones stay for inspection.
+    """
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False) # JSON
+
+    status = Column(Enum(JobStatus), default=JobStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+
+    available_at = Column(DateTime, default=datetime.utcnow, nullable=False) # Not before (retry backoff)
+    locked_until = Column(DateTime, nullable=True) # Visibility timeout of a running job
+    claim_token = Column(String(32), nullable=True) # Set per claim; only its holder may settle the job
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_jobs_status_available_at", "status", "available_at"),
+    )
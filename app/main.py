@@ -1,13 +1,39 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import Response
 from app.api.v1.api_router import api_router
 from app.routers import admin, webhooks
+from app.core.http import http_clients
+from app.core.logging import setup_logging
+from app.core.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from app.core.tracing import TracingMiddleware
 from app.db.database import init_db
+from app.services.container import services
+from app.services.job_queue import job_queue
 
-app = FastAPI(title="ModaMasal AI Backend")
+# Before anything logs: JSON lines written from a background thread (see app/core/logging.py)
+setup_logging()
 
-@app.on_event("startup")
-async def on_startup():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     await init_db()
+    await http_clients.start()
+    # Services and warm-up (connections, catalog) before uvicorn reports startup complete
+    await services.start()
+    await job_queue.start()
+    yield
+    # Order matters: no new jobs reach the WhatsApp mailbox, its queued turns are answered (or
+    # cut off before their reply goes out), and only then are unsettled jobs released. A turn
+    # left running past stop() would reply while its job is retried by the next process
+    await job_queue.stop_claiming()
+    await webhooks.whatsapp_mailbox.close()
+    await job_queue.stop()
+    await services.close()
+    await http_clients.close()
+
+app = FastAPI(title="ModaMasal AI Backend", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 app.include_router(api_router, prefix="/api/v1")
 app.include_router(admin.router, prefix="/api/v1/admin", tags=["admin"])
@@ -16,3 +42,11 @@ app.include_router(webhooks.router, prefix="/api/v1", tags=["webhooks"])
 @app.get("/")
 async def root():
     return {"message": "ModaMasal AI Backend is running"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Prometheus text format: upstream, tool, DB and route latency histograms, error counters,
+    and session / background task gauges.
+    """
+    return Response(registry.render(), media_type=CONTENT_TYPE)
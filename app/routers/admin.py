@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
+import asyncio
+import json
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.database import get_db
-from app.services.order_service import OrderService
-from app.db.models import Order, OrderStatus
-from typing import List
+from app.core.config import settings
+from app.core.tracing import slow_traces
+from app.db.database import SessionLocal, get_db
+from app.services.order_events import order_events
+from app.services.order_export import EXPORT_MEDIA_TYPES, iter_order_export
+from app.services.order_service import OrderService, decode_cursor, decode_since, encode_cursor
+from app.db.models import Order, OrderStatus, OrderSource, PaymentMethod
+from app.schemas.order import BulkStatusResult, BulkStatusUpdate, OrderChanges, OrderPage
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
 
 router = APIRouter()
 
@@ -26,17 +34,83 @@ ADMIN_HTML = """
             <h1 class="text-2xl font-bold text-gray-800 flex items-center gap-2">
                 🛍️ ModaMasal Yönetim Paneli
             </h1>
-            <div class="flex gap-2">
+            <div class="flex gap-2 items-center">
+                <span :class="live ? 'text-green-600' : 'text-gray-400'" class="text-xs mr-2">
+                    <i class="fas fa-circle mr-1"></i>{{ live ? 'Canlı' : 'Bağlanıyor...' }}
+                </span>
                 <button @click="fetchOrders" class="bg-blue-500 text-white px-4 py-2 rounded hover:bg-blue-600 transition">
                     <i class="fas fa-sync-alt mr-1"></i> Yenile
                 </button>
             </div>
         </header>
 
+        <!-- Filters -->
+        <div class="mb-4 flex flex-wrap gap-2 items-end bg-white p-4 rounded shadow">
+            <label class="flex flex-col text-xs text-gray-500">Durum
+                <select v-model="filters.status" @change="fetchOrders" class="border rounded p-1 text-sm text-gray-800">
+                    <option value="">Tümü</option>
+                    <option>Beklemede</option>
+                    <option>Gönderildi/Kargolandı</option>
+                    <option>Tamamlandı</option>
+                    <option>İptal Edildi</option>
+                </select>
+            </label>
+            <label class="flex flex-col text-xs text-gray-500">Kaynak
+                <select v-model="filters.source" @change="fetchOrders" class="border rounded p-1 text-sm text-gray-800">
+                    <option value="">Tümü</option>
+                    <option>Web</option>
+                    <option>WhatsApp</option>
+                    <option>Instagram</option>
+                </select>
+            </label>
+            <label class="flex flex-col text-xs text-gray-500">Ödeme
+                <select v-model="filters.payment_method" @change="fetchOrders" class="border rounded p-1 text-sm text-gray-800">
+                    <option value="">Tümü</option>
+                    <option>Kredi Kartı</option>
+                    <option>Kapıda Ödeme</option>
+                </select>
+            </label>
+            <label class="flex flex-col text-xs text-gray-500">Başlangıç
+                <input type="date" v-model="filters.created_from" @change="fetchOrders" class="border rounded p-1 text-sm text-gray-800">
+            </label>
+            <label class="flex flex-col text-xs text-gray-500">Bitiş
+                <input type="date" v-model="filters.created_to" @change="fetchOrders" class="border rounded p-1 text-sm text-gray-800">
+            </label>
+            <div class="ml-auto flex gap-2">
+                <a :href="exportUrl('csv')" class="bg-gray-700 text-white px-3 py-1 rounded hover:bg-gray-800 transition">
+                    <i class="fas fa-file-csv mr-1"></i> CSV İndir
+                </a>
+                <a :href="exportUrl('ndjson')" class="bg-gray-500 text-white px-3 py-1 rounded hover:bg-gray-600 transition">
+                    <i class="fas fa-file-code mr-1"></i> NDJSON
+                </a>
+            </div>
+        </div>
+
+        <!-- Bulk actions -->
+        <div v-if="selected.length" class="mb-4 flex items-center gap-2 bg-blue-50 border border-blue-200 p-3 rounded shadow">
+            <span class="font-medium text-blue-800">{{ selected.length }} sipariş seçildi</span>
+            <button @click="bulkUpdate('Gönderildi/Kargolandı')" :disabled="bulkBusy"
+                    class="bg-green-600 text-white px-3 py-1 rounded hover:bg-green-700 transition">
+                <i class="fas fa-check mr-1"></i> Kargolandı
+            </button>
+            <button @click="bulkUpdate('Tamamlandı')" :disabled="bulkBusy"
+                    class="bg-blue-600 text-white px-3 py-1 rounded hover:bg-blue-700 transition">
+                <i class="fas fa-flag-checkered mr-1"></i> Tamamlandı
+            </button>
+            <button @click="bulkUpdate('İptal Edildi')" :disabled="bulkBusy"
+                    class="bg-red-600 text-white px-3 py-1 rounded hover:bg-red-700 transition">
+                <i class="fas fa-times mr-1"></i> İptal Et
+            </button>
+            <button @click="selected = []" class="text-gray-600 hover:underline ml-2">Seçimi Temizle</button>
+        </div>
+
         <div class="bg-white rounded-lg shadow overflow-x-auto">
             <table class="min-w-full divide-y divide-gray-200">
                 <thead class="bg-gray-50">
                     <tr>
+                        <th class="px-4 py-3 text-left">
+                            <input type="checkbox" :checked="allSelected" @change="toggleAll($event.target.checked)">
+                        </th>
                         <th class="px-4 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Durum</th>
                         <th class="px-4 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Tarih</th>
                         <th class="px-4 py-3 text-left text-xs font-medium text-gray-500 uppercase tracking-wider">Ödeme</th>
@@ -47,6 +121,10 @@ ADMIN_HTML = """
                 </thead>
                 <tbody class="bg-white divide-y divide-gray-200">
                     <tr v-for="order in orders" :key="order.id" class="hover:bg-gray-50 transition">
+                        <td class="px-4 py-4">
+                            <input type="checkbox" :value="order.id" v-model="selected">
+                        </td>
+
                         <!-- Status Badge -->
                         <td class="px-4 py-4 whitespace-nowrap">
                             <span :class="statusClass(order.status)" class="px-2 py-1 inline-flex text-xs leading-5 font-semibold rounded-full">
@@ -113,7 +191,7 @@ ADMIN_HTML = """
                         </td>
                     </tr>
                      <tr v-if="orders.length === 0">
-                        <td colspan="6" class="text-center py-10 text-gray-500">
+                        <td colspan="7" class="text-center py-10 text-gray-500">
                             <i class="fas fa-inbox text-4xl mb-3 block text-gray-300"></i>
                             Henüz sipariş bulunmamaktadır.
                         </td>
@@ -121,6 +199,12 @@ ADMIN_HTML = """
                 </tbody>
             </table>
         </div>
+
+        <div v-if="nextCursor" class="mt-4 text-center">
+            <button @click="loadMore" :disabled="loading" class="bg-white border px-4 py-2 rounded shadow hover:bg-gray-50 transition">
+                <i class="fas fa-chevron-down mr-1"></i> Daha Fazla Yükle
+            </button>
+        </div>
     </div>
 
     <script>
@@ -129,17 +213,150 @@ ADMIN_HTML = """
         createApp({
             data() {
                 return {
-                    orders: []
+                    orders: [],
+                    nextCursor: null,
+                    loading: false,
+                    filters: { status: '', source: '', payment_method: '', created_from: '', created_to: '' },
+                    live: false,
+                    selected: [],
+                    bulkBusy: false,
+                    // Events that arrive while the list is loading are applied on top of it
+                    pendingEvents: []
+                }
+            },
+            computed: {
+                allSelected() {
+                    return this.orders.length > 0 && this.selected.length === this.orders.length;
                 }
             },
             methods: {
+                toggleAll(checked) {
+                    this.selected = checked ? this.orders.map(o => o.id) : [];
+                },
+                async bulkUpdate(newStatus) {
+                    const ids = [...this.selected];
+                    if(!confirm(`${ids.length} siparişi '${newStatus}' olarak işaretlemek istediğinize emin misiniz?`)) return;
+
+                    this.bulkBusy = true;
+                    try {
+                        const response = await axios.post('/api/v1/admin/orders/status', { order_ids: ids, status: newStatus });
+                        const results = response.data.results;
+                        // Rows also update through the live events; this covers a disconnected tab
+                        for (const order of this.orders) {
+                            if (results[order.id] === 'updated') order.status = newStatus;
+                        }
+                        const missing = ids.filter(id => results[id] === 'not_found');
+                        if (missing.length) alert(`Bulunamayan siparişler: ${missing.join(', ')}`);
+                        this.selected = [];
+                    } catch (error) {
+                        alert('Toplu güncelleme başarısız!');
+                        console.error(error);
+                    } finally {
+                        this.bulkBusy = false;
+                    }
+                },
+                exportUrl(format) {
+                    const params = this.queryParams();
+                    delete params.limit;
+                    params.format = format;
+                    return '/api/v1/admin/orders/export?' + new URLSearchParams(params).toString();
+                },
+                queryParams(cursor) {
+                    const params = { limit: 50 };
+                    for (const [key, value] of Object.entries(this.filters)) {
+                        if (value) params[key] = value;
+                    }
+                    // Date inputs give days; the end day is included
+                    if (params.created_to) {
+                        const end = new Date(params.created_to);
+                        end.setDate(end.getDate() + 1);
+                        params.created_to = end.toISOString().slice(0, 10);
+                    }
+                    if (cursor) params.cursor = cursor;
+                    return params;
+                },
                 async fetchOrders() {
+                    this.loading = true;
+                    this.pendingEvents = [];
+                    try {
+                        const response = await axios.get('/api/v1/admin/orders', { params: this.queryParams() });
+                        this.orders = response.data.orders;
+                        this.nextCursor = response.data.next_cursor;
+                        this.selected = this.selected.filter(id => this.orders.some(o => o.id === id));
+                        this.pendingEvents.forEach(order => this.applyChange(order));
+                    } catch (error) {
+                        alert('Siparişler çekilemedi!');
+                        console.error(error);
+                    } finally {
+                        this.loading = false;
+                        this.pendingEvents = [];
+                    }
+                },
+                matchesFilters(order) {
+                    const f = this.filters;
+                    if (f.status && order.status !== f.status) return false;
+                    if (f.source && order.source !== f.source) return false;
+                    if (f.payment_method && order.payment_method !== f.payment_method) return false;
+                    const day = (order.created_at || '').slice(0, 10);
+                    if (f.created_from && day < f.created_from) return false;
+                    if (f.created_to && day > f.created_to) return false;
+                    return true;
+                },
+                isNewer(a, b) {
+                    return a.created_at > b.created_at || (a.created_at === b.created_at && a.id > b.id);
+                },
+                applyChange(order) {
+                    const index = this.orders.findIndex(o => o.id === order.id);
+                    if (!this.matchesFilters(order)) {
+                        if (index !== -1) this.orders.splice(index, 1);
+                        return;
+                    }
+                    if (index !== -1) {
+                        this.orders.splice(index, 1, order);
+                        return;
+                    }
+                    // Only insert inside the loaded range; older rows come with "load more"
+                    const position = this.orders.findIndex(o => this.isNewer(order, o));
+                    if (position !== -1) {
+                        this.orders.splice(position, 0, order);
+                    } else if (!this.nextCursor) {
+                        this.orders.push(order);
+                    }
+                },
+                connectLive() {
+                    // The browser reconnects on its own and sends Last-Event-ID, so missed changes are replayed
+                    const source = new EventSource('/api/v1/admin/orders/events');
+                    let loaded = false;
+                    source.addEventListener('ready', () => {
+                        this.live = true;
+                        if (!loaded) {
+                            loaded = true;
+                            this.fetchOrders();
+                        }
+                    });
+                    source.addEventListener('order', (e) => {
+                        const order = JSON.parse(e.data).order;
+                        if (this.loading) this.pendingEvents.push(order);
+                        else this.applyChange(order);
+                    });
+                    source.addEventListener('resync', () => {
+                        source.close();
+                        this.live = false;
+                        this.connectLive();
+                    });
+                    source.onerror = () => { this.live = false; };
+                },
+                async loadMore() {
+                    this.loading = true;
                     try {
-                        const response = await axios.get('/api/v1/admin/orders');
-                        this.orders = response.data;
+                        const response = await axios.get('/api/v1/admin/orders', { params: this.queryParams(this.nextCursor) });
+                        this.orders.push(...response.data.orders);
+                        this.nextCursor = response.data.next_cursor;
                     } catch (error) {
                         alert('Siparişler çekilemedi!');
                         console.error(error);
+                    } finally {
+                        this.loading = false;
                     }
                 },
                 formatDate(dateString) {
@@ -162,7 +379,7 @@ ADMIN_HTML = """
                     
                     try {
                         await axios.put(`/api/v1/admin/orders/${id}/status?status=${newStatus}`);
-                        // Update local state
+                        // Update local state (the live event carries the same change)
                         const order = this.orders.find(o => o.id === id);
                         if(order) order.status = newStatus;
                     } catch (error) {
@@ -171,9 +388,8 @@ ADMIN_HTML = """
                 }
             },
             mounted() {
-                this.fetchOrders();
-                // Auto refresh every 30s
-                setInterval(this.fetchOrders, 30000);
+                // The list is loaded once the live channel is up, then kept current by its events
+                this.connectLive();
             }
         }).mount('#app')
     </script>
@@ -185,10 +401,191 @@ ADMIN_HTML = """
 async def admin_dashboard():
     return HTMLResponse(content=ADMIN_HTML)
 
-@router.get("/orders")
-async def get_orders(db: AsyncSession = Depends(get_db)):
+def order_filters(
+    status: Optional[OrderStatus] = None,
+    source: Optional[OrderSource] = None,
+    payment_method: Optional[PaymentMethod] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> dict:
+    """
+    Query filters shared by the order list and the export.
+    """
+    return {
+        "status": status,
+        "source": source,
+        "payment_method": payment_method,
+        "created_from": created_from,
+        "created_to": created_to,
+    }
+
+@router.get("/orders", response_model=OrderPage)
+async def get_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200),
+    filters: dict = Depends(order_filters),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Newest orders first. Pass the returned next_cursor to get the following page.
+    """
+    service = OrderService(db)
+    try:
+        orders, next_cursor = await service.get_orders(limit=limit, cursor=cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return OrderPage(orders=orders, next_cursor=next_cursor)
+
+@router.get("/orders/export")
+async def export_orders(
+    format: Literal["csv", "ndjson"] = "csv",
+    filters: dict = Depends(order_filters),
+):
+    """
+    Every order matching the list filters, streamed as CSV or NDJSON (newest first).
+    """
+    filename = f"siparisler-{datetime.utcnow():%Y%m%d-%H%M}.{format}"
+    return StreamingResponse(
+        iter_order_export(format, **filters),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/orders/changes", response_model=OrderChanges)
+async def get_order_changes(
+    since: str,
+    limit: int = Query(200, ge=1, le=1000),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Orders created or updated after `since` (a cursor from this endpoint or an event id,
+    or an ISO timestamp), oldest change first. Used to catch up after a reconnect.
+    Changes from the last ADMIN_CHANGES_OVERLAP_SECONDS before `since` are included again,
+    so an order may repeat one the client already has; apply them by order id.
+    """
+    try:
+        position = decode_since(since)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    service = OrderService(db)
+    orders, cursor, has_more = await service.get_changes(
+        position, limit=limit, overlap_seconds=settings.ADMIN_CHANGES_OVERLAP_SECONDS
+    )
+    return OrderChanges(orders=orders, cursor=cursor, has_more=has_more)
+
+def _sse(event: str, data: dict, event_id: Optional[str] = None) -> str:
+    id_line = f"id: {event_id}\n" if event_id else ""
+    return f"event: {event}\n{id_line}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.get("/orders/events")
+async def order_event_stream(
+    request: Request,
+    since: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Live order changes for the dashboard (Server-Sent Events).
+    Sends `ready` once subscribed, then an `order` event per created/updated order.
+    On reconnect the browser sends Last-Event-ID and the missed changes are replayed first.
+    `resync` means this tab fell too far behind and should reload the list.
+    """
+    resume_from = last_event_id or since
+    try:
+        position = decode_since(resume_from) if resume_from else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        # Subscribe before replaying so nothing committed in between is lost
+        subscription = order_events.subscribe()
+        try:
+            last_sent = position
+            # order id -> updated_at of the versions sent by the replay, so live events
+            # published while it ran are not sent twice
+            replayed: Dict[int, datetime] = {}
+            async with SessionLocal() as db:
+                service = OrderService(db)
+                if position is None:
+                    # A fresh tab loads the list itself; stream what changes after this point
+                    last_sent = await service.latest_change() or (datetime.min, 0)
+                else:
+                    has_more = True
+                    overlap = settings.ADMIN_CHANGES_OVERLAP_SECONDS
+                    while has_more:
+                        if len(replayed) >= settings.ADMIN_EVENTS_REPLAY_MAX:
+                            # Reloading the list is cheaper than replaying an old cursor
+                            yield _sse("resync", {})
+                            return
+                        orders, cursor, has_more = await service.get_changes(
+                            last_sent, limit=500, overlap_seconds=overlap
+                        )
+                        # Only the client's position can be behind a late commit
+                        overlap = 0
+                        for order in orders:
+                            replayed[order.id] = order.updated_at
+                            yield _sse(
+                                "order",
+                                {"type": "changed", "order": order.model_dump(mode="json")},
+                                encode_cursor(order.updated_at, order.id),
+                            )
+                        last_sent = decode_cursor(cursor)
+            # Its id gives the browser a Last-Event-ID to resume from even if no order changes
+            yield _sse("ready", {}, encode_cursor(*last_sent))
+
+            while True:
+                if subscription.overflowed:
+                    yield _sse("resync", {})
+                    return
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), settings.ADMIN_EVENTS_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                # Already sent by the replay. Not compared with last_sent: a transaction that
+                # committed late publishes a change older than it
+                event_updated_at, event_order_id = decode_cursor(event["id"])
+                if replayed.get(event_order_id) == event_updated_at:
+                    continue
+                yield _sse("order", {"type": event["type"], "order": event["order"]}, event["id"])
+        finally:
+            order_events.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/orders/events/stats")
+async def order_event_stats():
+    return order_events.stats()
+
+@router.get("/traces")
+async def slowest_traces(limit: int = Query(20, ge=1, le=500)):
+    """
+    The slowest recent requests, jobs and WhatsApp turns with their span trees
+    (model calls, tool calls, Shopify / Meta requests, DB statements and commits).
+    """
+    return {**slow_traces.stats(), "traces": slow_traces.slowest(limit)}
+
+@router.delete("/traces")
+async def clear_traces():
+    slow_traces.clear()
+    return {"cleared": True}
+
+@router.post("/orders/status", response_model=BulkStatusResult)
+async def bulk_update_order_status(request: BulkStatusUpdate, db: AsyncSession = Depends(get_db)):
+    """
+    Moves many orders to one status in a single transaction, with a result per order ID.
+    """
     service = OrderService(db)
-    return await service.get_orders()
+    results = await service.bulk_update_status(request.order_ids, request.status)
+    updated = sum(1 for outcome in results.values() if outcome == "updated")
+    return BulkStatusResult(status=request.status, updated=updated, results=results)
 
 @router.put("/orders/{order_id}/status")
 async def update_order_status(order_id: int, status: OrderStatus, db: AsyncSession = Depends(get_db)):
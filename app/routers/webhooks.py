@@ -1,14 +1,28 @@
-from fastapi import APIRouter, Request, HTTPException, Query, BackgroundTasks
-from app.services.ai_service import AIService
-from app.services.social_service import SocialService
+import logging
+import time
+from typing import List
+from fastapi import APIRouter, Request, HTTPException, Query
+from fastapi.responses import JSONResponse
+from app.core.logging import mask_phone
+from app.core.metrics import BACKGROUND_TASKS
+from app.services.container import WHATSAPP_SESSION_PREFIX, services
+from app.services.job_queue import QueueFullError, job_queue
+from app.services.seen_ids import SeenIdCache
+from app.services.sender_mailbox import SenderMailbox
 
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
-ai_service = AIService()
-social_service = SocialService()
 
 VERIFY_TOKEN = settings.META_VERIFY_TOKEN
+WHATSAPP_JOB = "whatsapp_message"
+
+seen_message_ids = SeenIdCache(
+    max_size=settings.WHATSAPP_DEDUP_MAX_IDS,
+    ttl_seconds=settings.WHATSAPP_DEDUP_TTL_SECONDS,
+)
 
 @router.get("/webhooks/whatsapp")
 async def verify_webhook(
@@ -23,44 +37,131 @@ async def verify_webhook(
         return int(challenge)
     raise HTTPException(status_code=403, detail="Invalid verify token")
 
+def extract_text_messages(data: dict) -> List[dict]:
+    """
+    Walks every entry / change / message of a webhook delivery and returns its text messages
+    in delivery order. Status updates and non-text messages are skipped.
+    """
+    now = time.time()
+    result = []
+    for entry in data.get("entry", []) or []:
+        for change in entry.get("changes", []) or []:
+            value = change.get("value", {}) or {}
+            for msg in value.get("messages", []) or []:
+                text_body = (msg.get("text") or {}).get("body")
+                sender_id = msg.get("from") # Phone number
+                if not text_body or not sender_id:
+                    continue
+                try:
+                    sent_at = float(msg.get("timestamp") or now)
+                except (TypeError, ValueError):
+                    sent_at = now
+                result.append({
+                    # Redeliveries carry the same ID; fall back to content for malformed payloads
+                    "id": msg.get("id") or f"{sender_id}:{sent_at}:{text_body}",
+                    "sender_id": sender_id,
+                    "text": text_body,
+                    # Meta's timestamp has second resolution; keep payload order within the same second
+                    "received_at": sent_at + len(result) * 1e-6,
+                })
+    return result
+
 @router.post("/webhooks/whatsapp")
-async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
+async def whatsapp_webhook(request: Request):
     """
     Receive WhatsApp Messages
     """
-    data = await request.json()
-    print(f"DEBUG: WhatsApp Webhook Data: {data}")
-
     try:
-        # Check if it's a message
-        entry = data.get("entry", [])[0]
-        changes = entry.get("changes", [])[0]
-        value = changes.get("value", {})
-        messages = value.get("messages", [])
-
-        if messages:
-            msg = messages[0]
-            sender_id = msg.get("from") # Phone number
-            text_body = msg.get("text", {}).get("body")
-            
-            if text_body:
-                # Process Async
-                background_tasks.add_task(handle_whatsapp_message, sender_id, text_body)
+        data = await request.json()
+        # Only the shape is logged; the payload carries phone numbers and message texts
+        logger.debug("WhatsApp webhook received", extra={"entries": len(data.get("entry") or [])})
+
+        # Meta batches several entries / changes / messages into one delivery under load
+        messages = extract_text_messages(data)
+
+        jobs = []
+        job_message_ids = []
+        for msg in messages:
+            if msg["id"] in seen_message_ids:
+                seen_message_ids.duplicates += 1
+                continue
+            # Marked before the await below so a concurrent redelivery is dropped too
+            seen_message_ids.add(msg["id"])
+            job_message_ids.append(msg["id"])
+            jobs.append((WHATSAPP_JOB, {
+                "sender_id": msg["sender_id"],
+                "text": msg["text"],
+                "received_at": msg["received_at"],
+            }))
+
+        if jobs:
+            # Persist the whole batch in one transaction and return right away; workers pick it up (see run_whatsapp_job)
+            try:
+                await job_queue.enqueue_many(jobs)
+            except Exception:
+                # Not queued, so Meta's redelivery must not be treated as a duplicate
+                for message_id in job_message_ids:
+                    seen_message_ids.discard(message_id)
+                raise
 
         return {"status": "received"}
+    except QueueFullError:
+        # Backpressure: Meta redelivers the webhook later
+        return JSONResponse(status_code=503, content={"status": "busy"})
     except Exception as e:
-        print(f"Error processing webhook: {e}")
+        logger.exception("Error processing webhook")
         return {"status": "error"}
 
 async def handle_whatsapp_message(sender_id: str, message: str):
-    print(f"DEBUG: Background Task Started for {sender_id}. Message: {message}")
+    logger.debug("WhatsApp turn started", extra={"sender_id": sender_id, "chars": len(message)})
     # 1. Get AI Response
     # Use sender_id as session_id to maintain history per user
-    ai_response = await ai_service.generate_response(message, session_id=f"wa_{sender_id}")
-    print(f"DEBUG: AI generated response: {ai_response}")
+    # Runs in a job worker, outside any request, so the services come from the container
+    ai_response = await services.ai_service.generate_response(
+        message, session_id=f"{WHATSAPP_SESSION_PREFIX}{sender_id}"
+    )
+    logger.debug("AI response generated", extra={"sender_id": sender_id, "chars": len(ai_response)})
     
     # 2. Send Response back via SocialService
-    await social_service.send_whatsapp_message(sender_id, ai_response)
+    await services.social_service.send_whatsapp_message(sender_id, ai_response)
+
+whatsapp_mailbox = SenderMailbox(
+    handle_whatsapp_message,
+    debounce_seconds=settings.WHATSAPP_DEBOUNCE_SECONDS,
+    max_delay_seconds=settings.WHATSAPP_MAX_DEBOUNCE_SECONDS,
+    max_batch=settings.WHATSAPP_MAX_BATCH_MESSAGES,
+)
+
+BACKGROUND_TASKS.set_function(lambda: whatsapp_mailbox.active_mailboxes, kind="whatsapp_mailboxes")
+
+async def run_whatsapp_job(payload: dict):
+    """
+    Job handler: hands the message to the sender's mailbox and returns right away, so a worker
+    is not held through the debounce and the model turn (one busy sender cannot take every
+    worker). The queue keeps the job claimed until the turn containing the message has
+    finished, and retries it if the turn failed.
+    """
+    turn = whatsapp_mailbox.submit(payload["sender_id"], payload["text"], order_key=payload.get("received_at"))
+
+    async def turn_finished():
+        if not await turn:
+            # The message ends up in logs and the job's last_error; keep the number out of it
+            raise RuntimeError(f"WhatsApp turn failed for {mask_phone(payload['sender_id'])}")
+
+    return turn_finished()
+
+job_queue.register(WHATSAPP_JOB, run_whatsapp_job)
+
+@router.get("/webhooks/whatsapp/stats")
+async def whatsapp_stats():
+    """
+    Per-sender mailbox counters, duplicate deliveries, and job queue depth, retries and latency.
+    """
+    return {
+        "mailbox": whatsapp_mailbox.stats(),
+        "dedup": seen_message_ids.stats(),
+        "queue": await job_queue.stats(),
+    }
 
 # Instagram simplified placeholder
 @router.post("/webhooks/instagram")
@@ -0,0 +1,43 @@
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import datetime
+from typing import Dict, List, Literal, Optional
+from app.db.models import OrderStatus, OrderSource, PaymentMethod
+
+class OrderOut(BaseModel):
+    """Columns the admin order list shows."""
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    status: Optional[OrderStatus] = None
+    source: Optional[OrderSource] = None
+    payment_method: Optional[PaymentMethod] = None
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    phone: Optional[str] = None
+    email: Optional[str] = None
+    address: Optional[str] = None
+    city: Optional[str] = None
+    product_summary: Optional[str] = None
+    shopify_invoice_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class OrderPage(BaseModel):
+    orders: List[OrderOut]
+    next_cursor: Optional[str] = None
+
+class OrderChanges(BaseModel):
+    orders: List[OrderOut]
+    # Pass back as `since` to continue; unchanged when there was nothing new
+    cursor: str
+    has_more: bool
+
+class BulkStatusUpdate(BaseModel):
+    order_ids: List[int] = Field(..., min_length=1, max_length=1000)
+    status: OrderStatus
+
+class BulkStatusResult(BaseModel):
+    status: OrderStatus
+    updated: int
+    # Per order: moved to the status, already in it, or no such order
+    results: Dict[int, Literal["updated", "unchanged", "not_found"]]
@@ -21,6 +21,7 @@ class Product(BaseModel):
     handle: str
     product_type: Optional[str] = None
     vendor: Optional[str] = None
+    updated_at: Optional[str] = None
     variants: List[ProductVariant] = []
     images: List[ProductImage] = []
     
@@ -1,14 +1,39 @@
-import google.generativeai as genai
-from google.generativeai.types import content_types
+import asyncio
+import logging
 from collections import defaultdict
+from typing import AsyncIterator, List, Optional
 import json
+import time
 from app.core.config import settings
+from app.core.metrics import (
+    AI_TIER_FALLBACKS, AI_TURN_SECONDS, TOOL_ERRORS, TOOL_SECONDS, UPSTREAM_ERRORS, UPSTREAM_SECONDS, track,
+)
+from app.core import tracing
+from app.services.history_compactor import HistoryCompactor
+from app.services.model_router import FLASH, POLICIES, ModelRouter, RoutingPolicy, TurnContext
+from app.services.session_store import ChatSessionStore
 from app.services.shopify_service import ShopifyClient
 
+logger = logging.getLogger(__name__)
+
+TURN_TIMEOUT_MESSAGE = "Şu an yoğunluk nedeniyle yanıt veremedim efendim birazdan tekrar yazar mısınız 🌸"
+# Closes a turn whose model still asked for tools after AI_MAX_TOOL_ROUNDS
+TOOL_ROUNDS_MESSAGE = "Bunu şu an tamamlayamadım efendim biraz daha detay yazar mısınız 🌸"
+# A fallback tier is only tried if at least this much of the turn budget is left
+FALLBACK_MIN_SECONDS = 1.0
+
 class AIService:
-    def __init__(self):
+    def __init__(
+        self,
+        routing_policy: Optional[RoutingPolicy] = None,
+        shopify_client: Optional[ShopifyClient] = None,
+    ):
+        # The SDK takes about a second to import; loading it here keeps it off the app's import path
+        import google.generativeai as genai
+
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.shopify_client = ShopifyClient()
+        self._genai = genai
+        self.shopify_client = shopify_client or ShopifyClient()
         
         self.system_prompt = """Sen Moda Masal mağazasının yapay zeka satış asistanısın.
 Görevin: Müşterilerin ürün sorularını yanıtlamak ve sipariş oluşturmak.
@@ -87,86 +112,335 @@ ASLA YAPMA:
             }
         ]
 
-        self.model = genai.GenerativeModel(
-            model_name='gemini-flash-latest',
-            system_instruction=self.system_prompt,
-            tools=self.tools_config
+        # One model per tier; each model call of a turn is routed to a tier (see model_router.py)
+        self.model_router = ModelRouter(
+            self._create_model, routing_policy or POLICIES[settings.AI_ROUTING_POLICY]()
         )
+        self.model = self.model_router.model(FLASH)
         
-        # In-memory history: {session_id: ChatSession}
+        # In-memory history: {session_id: ChatSession}, bounded by count, size and idle time
         # Note: We store the chat object itself which manages history
-        self.chat_sessions = {}
+        self.chat_sessions = ChatSessionStore(
+            max_sessions=settings.CHAT_MAX_SESSIONS,
+            max_bytes=settings.CHAT_MAX_HISTORY_BYTES,
+            idle_ttl_seconds=settings.CHAT_SESSION_IDLE_TTL_SECONDS,
+        )
+        self.history_compactor = HistoryCompactor(
+            token_budget=settings.CHAT_HISTORY_TOKEN_BUDGET,
+            keep_recent_turns=settings.CHAT_HISTORY_KEEP_TURNS,
+            tool_result_chars=settings.CHAT_TOOL_RESULT_MAX_CHARS,
+        )
+        # Tool calls that outlived their turn's time budget
+        self._background_tasks = set()
 
-    async def generate_response(self, user_message: str, session_id: str) -> str:
-        if session_id not in self.chat_sessions:
-            self.chat_sessions[session_id] = self.model.start_chat(enable_automatic_function_calling=False)
-        
-        chat = self.chat_sessions[session_id]
-        
-        try:
-            # Send message to model
-            response = await chat.send_message_async(user_message)
-            
-            # Check for function calls
-            # Gemini handles function calls via 'parts'
-            if not response.parts:
-                 return response.text
-
-            part = response.parts[0]
-            
-            if part.function_call:
-                fc = part.function_call
-                function_name = fc.name
-                function_args = fc.args
-                
-                tool_result = ""
-                
-                if function_name == "search_products":
-                    query = function_args.get("query")
-                    tool_result = await self.shopify_client.search_products(query=query)
-                elif function_name == "create_draft_order":
-                    # Args come as floats sometimes in JSON parsing, ensure int
-                    variant_id = int(function_args.get("variant_id"))
-                    quantity = int(function_args.get("quantity", 1))
-                    
-                    first_name = function_args.get("first_name")
-                    last_name = function_args.get("last_name")
-                    address1 = function_args.get("address1")
-                    city = function_args.get("city")
-                    phone = function_args.get("phone")
-                    product_summary = function_args.get("product_summary")
-                    email = function_args.get("email")
-                    payment_method = function_args.get("payment_method")
-
-                    tool_result = await self.shopify_client.create_draft_order(
-                        variant_id=variant_id, 
-                        quantity=quantity,
-                        first_name=first_name,
-                        last_name=last_name,
-                        address1=address1,
-                        city=city,
-                        phone=phone,
-                        product_summary=product_summary,
-                        payment_method=payment_method,
-                        email=email
-                    )
-                
-                # Send the tool result back to the model
-                function_response_part = genai.protos.Part(
-                    function_response=genai.protos.FunctionResponse(
-                        name=function_name,
-                        response={'result': tool_result}
-                    )
+    @property
+    def pending_tool_tasks(self) -> int:
+        """
+        Tool calls still running after their turn gave up waiting for them.
+        """
+        return len(self._background_tasks)
+
+    def _create_model(self, model_name: str):
+        return self._genai.GenerativeModel(
+            model_name=model_name,
+            system_instruction=self.system_prompt,
+            tools=self.tools_config
+        )
+
+    async def execute_tool(self, function_name: str, function_args) -> str:
+        """
+        Runs one tool requested by the model and returns its result text.
+        """
+        if function_name == "search_products":
+            query = function_args.get("query")
+            return await self.shopify_client.search_products(query=query)
+
+        if function_name == "create_draft_order":
+            # Args come as floats sometimes in JSON parsing, ensure int
+            variant_id = int(function_args.get("variant_id"))
+            quantity = int(function_args.get("quantity", 1))
+
+            first_name = function_args.get("first_name")
+            last_name = function_args.get("last_name")
+            address1 = function_args.get("address1")
+            city = function_args.get("city")
+            phone = function_args.get("phone")
+            product_summary = function_args.get("product_summary")
+            email = function_args.get("email")
+            payment_method = function_args.get("payment_method")
+
+            return await self.shopify_client.create_draft_order(
+                variant_id=variant_id, 
+                quantity=quantity,
+                first_name=first_name,
+                last_name=last_name,
+                address1=address1,
+                city=city,
+                phone=phone,
+                product_summary=product_summary,
+                payment_method=payment_method,
+                email=email
+            )
+
+        return f"Bilinmeyen araç: {function_name}"
+
+    async def _timed_tool(self, function_name: str, function_args) -> str:
+        with track(TOOL_SECONDS, TOOL_ERRORS, tool=function_name), tracing.span(f"tool.{function_name}"):
+            return await self.execute_tool(function_name, function_args)
+
+    async def run_tools(self, function_calls: list, timeout: float) -> List[str]:
+        """
+        Runs all function calls of one model response concurrently.
+        Calls still running when the timeout hits are reported as timed out but not cancelled,
+        so a draft order that is already on its way still gets saved.
+        """
+        tasks = [asyncio.create_task(self._timed_tool(fc.name, fc.args)) for fc in function_calls]
+        done, pending = await asyncio.wait(tasks, timeout=max(timeout, 0))
+
+        results = []
+        for fc, task in zip(function_calls, tasks):
+            if task in pending:
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+                results.append("İşlem zaman aşımına uğradı, arka planda devam ediyor.")
+            elif task.exception() is not None:
+                logger.error("Tool error: %s", task.exception(), extra={"tool": fc.name})
+                results.append(f"Araç hatası: {task.exception()}")
+            else:
+                results.append(task.result())
+        return results
+
+    def _function_calls(self, response) -> list:
+        # Gemini handles function calls via 'parts'; a response may carry several
+        return [part.function_call for part in response.parts if part.function_call]
+
+    def _function_response_parts(self, function_calls: list, results: List[str]) -> list:
+        return [
+            self._genai.protos.Part(
+                function_response=self._genai.protos.FunctionResponse(
+                    name=fc.name,
+                    response={'result': result}
                 )
-                
-                final_response = await chat.send_message_async([function_response_part])
-                return final_response.text
-            
-            return response.text
+            )
+            for fc, result in zip(function_calls, results)
+        ]
 
+    def _close_turn(self, chat, function_response_parts: list, text: str) -> None:
+        """
+        Records pending tool results and a closing model message in the history,
+        so it never ends on an unanswered function call.
+        """
+        chat.history = chat.history + [
+            self._genai.protos.Content(role="user", parts=function_response_parts),
+            self._genai.protos.Content(role="model", parts=[self._genai.protos.Part(text=text)]),
+        ]
+
+    def _discard_pending_exchange(self, chat, committed: list) -> None:
+        """
+        Drops an exchange whose (streamed) response was abandoned half-way by restoring the
+        history as it was before the message was sent. The history setter also resets
+        ChatSession's pending sent/received pair.
+        """
+        chat.history = committed
+
+    def _abandon_turn(self, chat, committed: list, function_response_parts: Optional[list]) -> None:
+        """
+        Cleans up after a turn that was cancelled or whose client went away: the pending
+        exchange is dropped and tool results of the previous round are answered, so the
+        history never ends on an unanswered function call.
+        """
+        self._discard_pending_exchange(chat, committed)
+        if function_response_parts is not None:
+            self._close_turn(chat, function_response_parts, TURN_TIMEOUT_MESSAGE)
+
+    def _observe_gemini(self, operation: str, tier: str, started: float, failed: bool = False) -> None:
+        operation = f"{tier}:{operation}"
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream="gemini", operation=operation)
+        if failed:
+            UPSTREAM_ERRORS.inc(upstream="gemini", operation=operation)
+        self.model_router.record_call(tier, failed)
+        tracing.record(f"gemini {operation}", started, error="failed" if failed else None)
+
+    def _last_model_text(self, chat) -> str:
+        for content in reversed(chat.history):
+            if content.role == "model":
+                return "".join(part.text for part in content.parts if part.text)
+        return ""
+
+    async def _turn_events(
+        self, chat, user_message: str, stream: bool, ctx: Optional[TurnContext] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Runs one chat turn and yields its events:
+        {"type": "text", "text": ...} for answer text (incremental when streaming),
+        {"type": "tool_start" / "tool_end", "name": ...} around each tool call.
+        Each model call goes to the tier the routing policy picks; a call that fails or runs
+        out of its tier's time budget is retried on the fallback tier, unless answer text
+        was already streamed.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.AI_TURN_TIME_BUDGET_SECONDS
+
+        def remaining() -> float:
+            return max(deadline - loop.time(), 0.001)
+
+        if ctx is None:
+            ctx = TurnContext(message=user_message)
+        content = user_message
+        send_kwargs = {}
+        function_response_parts = None
+
+        operation = "send_message_stream" if stream else "send_message"
+
+        # Set once the history is consistent again; a later disconnect then changes nothing
+        settled = False
+
+        try:
+            # Tool loop: answer every function call of each response until the model replies with text
+            for round_no in range(settings.AI_MAX_TOOL_ROUNDS + 1):
+                ctx.round_no = round_no
+                tier = self.model_router.policy.choose(ctx)
+                tried = []
+                while True:
+                    tried.append(tier)
+                    # History before the message in flight; restored if its exchange is abandoned
+                    committed = list(chat.history)
+                    chat.model = self.model_router.model(tier)
+                    started = time.perf_counter()
+                    streamed = False
+                    try:
+                        response = await asyncio.wait_for(
+                            chat.send_message_async(content, stream=stream, **send_kwargs),
+                            min(self.model_router.timeout(tier), remaining()),
+                        )
+                        if stream:
+                            chunks = response.__aiter__()
+                            while True:
+                                try:
+                                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining())
+                                except StopAsyncIteration:
+                                    break
+                                text = "".join(part.text for part in chunk.parts if part.text)
+                                if text:
+                                    streamed = True
+                                    yield {"type": "text", "text": text}
+                    except Exception as e:
+                        self._observe_gemini(operation, tier, started, failed=True)
+                        if stream:
+                            self._discard_pending_exchange(chat, committed)
+                        fallback = None if streamed else self.model_router.fallback(tier, tried)
+                        if fallback is not None and remaining() > FALLBACK_MIN_SECONDS:
+                            logger.warning(
+                                "Gemini %s tier failed (%s), retrying on %s", tier, type(e).__name__, fallback,
+                            )
+                            self.model_router.record_fallback(tier, fallback)
+                            AI_TIER_FALLBACKS.inc(from_tier=tier, to_tier=fallback)
+                            ctx.fallbacks += 1
+                            tier = fallback
+                            continue
+                        if function_response_parts is not None:
+                            # The model's function call is in the history; answer it whatever the
+                            # error was, or Gemini rejects every later turn of this session
+                            self._close_turn(chat, function_response_parts, TURN_TIMEOUT_MESSAGE)
+                            settled = True
+                        if not isinstance(e, asyncio.TimeoutError) or function_response_parts is None:
+                            raise
+                        yield {"type": "text", "text": TURN_TIMEOUT_MESSAGE}
+                        return
+                    break
+                self._observe_gemini(operation, tier, started)
+                ctx.tier = tier
+
+                function_calls = self._function_calls(response)
+                if not function_calls:
+                    ctx.served_tier = tier
+                    settled = True
+                    if not stream:
+                        yield {"type": "text", "text": response.text}
+                    return
+
+                ctx.tool_names.extend(fc.name for fc in function_calls)
+                for fc in function_calls:
+                    yield {"type": "tool_start", "name": fc.name}
+                results = await self.run_tools(function_calls, remaining())
+                for fc in function_calls:
+                    yield {"type": "tool_end", "name": fc.name}
+
+                function_response_parts = self._function_response_parts(function_calls, results)
+                content = function_response_parts
+
+                # Last allowed round: make the model answer with text instead of asking for more tools
+                if round_no + 1 == settings.AI_MAX_TOOL_ROUNDS:
+                    send_kwargs["tool_config"] = {"function_calling_config": {"mode": "NONE"}}
+        except (GeneratorExit, asyncio.CancelledError):
+            # The SSE client disconnected (the generator is closed) or the turn was cancelled
+            if not settled:
+                self._abandon_turn(chat, committed, function_response_parts)
+            raise
+
+        # Out of rounds with function calls still pending: answer them and close the turn
+        ctx.served_tier = ctx.tier
+        self._close_turn(chat, function_response_parts, TOOL_ROUNDS_MESSAGE)
+        logger.warning("Chat turn ran out of tool rounds", extra={"tools": ctx.tool_names})
+        yield {"type": "text", "text": TOOL_ROUNDS_MESSAGE}
+
+    async def stream_response(self, user_message: str, session_id: str, stream: bool = True) -> AsyncIterator[dict]:
+        """
+        Yields the events of one chat turn as they happen (see _turn_events).
+        Failures are reported as an {"type": "error", "text": ...} event.
+        """
+        tracing.tag("session_id", session_id)
+        chat = self.chat_sessions.get_or_create(
+            session_id, lambda: self.model.start_chat(enable_automatic_function_calling=False)
+        )
+        started = time.perf_counter()
+        ctx = None
+
+        try:
+            # Keep the replayed history within the token budget
+            compacted = self.history_compactor.compact(chat.history)
+            if compacted is not None:
+                chat.history = compacted
+
+            ctx = TurnContext(
+                message=user_message,
+                history_length=len(chat.history),
+                last_model_text=self._last_model_text(chat),
+            )
+            events = self._turn_events(chat, user_message, stream, ctx)
+            try:
+                async for event in events:
+                    yield event
+            finally:
+                # A client that disconnects closes this generator; close the turn's right away
+                # too, so its half-finished exchange is discarded before the history is measured
+                await events.aclose()
+
+        except asyncio.TimeoutError:
+            logger.warning("Gemini turn exceeded %ss", settings.AI_TURN_TIME_BUDGET_SECONDS, extra={"session_id": session_id})
+            yield {"type": "text", "text": TURN_TIMEOUT_MESSAGE}
         except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"Gemini Service Error: {e}")
-            print(f"Traceback: {error_details}")
-            return f"Teknik Hata Detayı: {str(e)}"
+            logger.exception("Gemini service error", extra={"session_id": session_id})
+            yield {"type": "error", "text": f"Teknik Hata Detayı: {str(e)}"}
+        finally:
+            # History grew during this turn; re-measure it and apply the store's caps
+            self.chat_sessions.record(session_id)
+            if ctx is not None and ctx.served_tier is not None:
+                seconds = time.perf_counter() - started
+                self.model_router.record_turn(ctx.served_tier, seconds)
+                AI_TURN_SECONDS.observe(seconds, tier=ctx.served_tier)
+                tracing.tag("model_tier", ctx.served_tier)
+                logger.debug("Chat turn served", extra={
+                    "session_id": session_id,
+                    "tier": ctx.served_tier,
+                    "seconds": round(seconds, 3),
+                    "fallbacks": ctx.fallbacks,
+                })
+
+    @tracing.traced("ai.generate_response")
+    async def generate_response(self, user_message: str, session_id: str) -> str:
+        texts = []
+        async for event in self.stream_response(user_message, session_id, stream=False):
+            if event["type"] in ("text", "error"):
+                texts.append(event["text"])
+        return "".join(texts)
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from app.core.config import settings
+from app.schemas.product import Product
+from app.services.search_index import ProductSearchIndex
+
+logger = logging.getLogger(__name__)
+
+PageCallback = Callable[[List[Product]], Awaitable[None]]
+# Called with on_page: the loader passes it the products loaded so far after each page
+CatalogLoader = Callable[..., Awaitable[List[Product]]]
+
+
+class CatalogCache:
+    """
+    Process-wide snapshot of the Shopify catalog.
+    The first caller waits for the initial load. After that the snapshot is served
+    as-is and, once it is older than the TTL, refreshed in the background
+    (stale-while-revalidate). Concurrent refreshes share a single in-flight task.
+    Each refresh also builds the search index for the new snapshot.
+
+    During the very first load there is nothing to serve, so partial snapshots are published
+    as pages arrive: after the first page, then each time the loaded count has doubled (the
+    index rebuilds stay linear in the catalog size). Readers wait only for the first one.
+    Later refreshes keep serving the previous complete snapshot until the new one is done.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._products: List[Product] = []
+        self._index = ProductSearchIndex([])
+        self._loaded_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        # Set once anything (a partial or a complete snapshot) can be served
+        self._published = asyncio.Event()
+        self.partial = False
+
+        # Stats
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.partial_hits = 0
+        self.partial_publishes = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def age(self) -> Optional[float]:
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    @property
+    def is_stale(self) -> bool:
+        age = self.age
+        return age is None or age > self.ttl_seconds
+
+    async def _read(self, loader: CatalogLoader) -> None:
+        if self._loaded_at is None:
+            if self.partial:
+                self.partial_hits += 1
+                self._start_refresh(loader)
+                return
+            self.misses += 1
+            refresh = self._start_refresh(loader)
+            published = asyncio.ensure_future(self._published.wait())
+            try:
+                await asyncio.wait({refresh, published}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                published.cancel()
+            if not self._published.is_set():
+                # The load finished without publishing anything: surface its error
+                await refresh
+            return
+
+        if self.is_stale:
+            self.stale_hits += 1
+            self._start_refresh(loader)
+        else:
+            self.hits += 1
+
+    async def get_products(self, loader: CatalogLoader) -> List[Product]:
+        """
+        Returns the current snapshot. Only blocks when nothing has been loaded yet.
+        """
+        await self._read(loader)
+        return self._products
+
+    async def get_index(self, loader: CatalogLoader) -> ProductSearchIndex:
+        """
+        Returns the search index of the current snapshot, with the same caching rules as get_products.
+        """
+        await self._read(loader)
+        return self._index
+
+    async def refresh(self, loader: CatalogLoader) -> List[Product]:
+        """
+        Forces a refresh (or joins the one already running) and waits for it.
+        """
+        await asyncio.shield(self._start_refresh(loader))
+        return self._products
+
+    def invalidate(self) -> None:
+        """
+        Marks the snapshot as stale so the next read triggers a background refresh.
+        """
+        if self._loaded_at is not None:
+            self._loaded_at = time.monotonic() - self.ttl_seconds - 1
+
+    def _start_refresh(self, loader: CatalogLoader) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._run_refresh(loader))
+        return self._refresh_task
+
+    async def _publish_partial(self, products: List[Product]) -> None:
+        if self._loaded_at is not None or len(products) < 2 * len(self._products) or not products:
+            return
+        index = await asyncio.to_thread(ProductSearchIndex, list(products))
+        if self._loaded_at is not None:
+            return
+        self._products = index.products
+        self._index = index
+        self.partial = True
+        self.partial_publishes += 1
+        self._published.set()
+
+    async def _run_refresh(self, loader: CatalogLoader) -> None:
+        try:
+            # Only the first load publishes partial snapshots; a refresh keeps serving the old one
+            on_page = self._publish_partial if self._loaded_at is None else None
+            products = await loader(on_page=on_page)
+            # Building the index is pure CPU work; keep it off the event loop
+            index = await asyncio.to_thread(ProductSearchIndex, products)
+        except Exception as e:
+            self.refresh_errors += 1
+            self.last_error = str(e)
+            logger.warning("Katalog yenilenemedi: %s", e)
+            # Without any snapshot (not even a partial one) there is nothing to serve, so surface the error
+            if not self._published.is_set():
+                raise
+            return
+
+        self._products = products
+        self._index = index
+        self._loaded_at = time.monotonic()
+        self.partial = False
+        self._published.set()
+        self.refreshes += 1
+        self.last_error = None
+
+    def stats(self) -> dict:
+        age = self.age
+        return {
+            "products": len(self._products),
+            "age_seconds": round(age, 3) if age is not None else None,
+            "ttl_seconds": self.ttl_seconds,
+            "stale": self.is_stale,
+            "partial": self.partial,
+            "refreshing": self._refresh_task is not None and not self._refresh_task.done(),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "partial_hits": self.partial_hits,
+            "partial_publishes": self.partial_publishes,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "last_error": self.last_error,
+        }
+
+
+catalog_cache = CatalogCache(ttl_seconds=settings.CATALOG_TTL_SECONDS)
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Awaitable, Dict, Optional
+
+from app.core.config import settings
+from app.core.http import META, SHOPIFY, http_clients
+from app.core.metrics import BACKGROUND_TASKS, CHAT_SESSIONS
+from app.services.catalog_cache import catalog_cache
+from app.services.shopify_service import ShopifyClient
+from app.services.social_service import SocialService
+
+if TYPE_CHECKING:
+    from app.services.ai_service import AIService
+
+logger = logging.getLogger(__name__)
+
+# Session ids of WhatsApp conversations; web chat sessions are the rest
+WHATSAPP_SESSION_PREFIX = "wa_"
+
+
+class ServiceContainer:
+    """
+    The app's long-lived services, created once in the lifespan: one AIService (so web chat
+    and WhatsApp share a session store and the models), one ShopifyClient and one SocialService.
+    Routes get them through the get_* dependencies below; background jobs, which run outside
+    a request, read them from `services`.
+
+    start() builds the AIService (and imports the Gemini SDK) on a worker thread while the
+    warm-up opens upstream connections and loads the catalog, so startup costs the slowest of
+    these steps instead of their sum.
+    """
+
+    def __init__(self):
+        self.ai_service: Optional["AIService"] = None
+        self.shopify_client: Optional[ShopifyClient] = None
+        self.social_service: Optional[SocialService] = None
+        self.ready = False
+        # step -> {"seconds": ..., "error": ...}
+        self.startup: Dict[str, dict] = {}
+
+    async def start(self) -> None:
+        started = time.perf_counter()
+        self.shopify_client = ShopifyClient()
+        self.social_service = SocialService()
+
+        steps = [self._step("ai_service", asyncio.to_thread(self._create_ai_service), required=True)]
+        if settings.STARTUP_WARMUP:
+            connections = settings.HTTP_WARMUP_CONNECTIONS
+            steps += [
+                self._step(
+                    "shopify_connections", http_clients.warm_up(SHOPIFY, self.shopify_client.base_url, connections)
+                ),
+                self._step(
+                    "meta_connections", http_clients.warm_up(META, settings.META_GRAPH_BASE_URL, connections)
+                ),
+                self._step("catalog", catalog_cache.refresh(self.shopify_client.fetch_products)),
+            ]
+        await asyncio.gather(*steps)
+
+        self.ready = True
+        self.startup["total"] = {"seconds": round(time.perf_counter() - started, 3), "error": None}
+        logger.info("Services ready", extra={"startup": self.startup})
+
+    async def close(self) -> None:
+        self.ready = False
+
+    def _create_ai_service(self) -> None:
+        from app.services.ai_service import AIService
+
+        self.ai_service = AIService(shopify_client=self.shopify_client)
+
+    async def _step(self, name: str, step: Awaitable, required: bool = False) -> None:
+        """
+        Runs one startup step and records how long it took. Warm-up steps are bounded by
+        STARTUP_WARMUP_TIMEOUT_SECONDS and only logged on failure; the app then starts cold.
+        """
+        started = time.perf_counter()
+        error = None
+        try:
+            if required:
+                await step
+            else:
+                await asyncio.wait_for(step, settings.STARTUP_WARMUP_TIMEOUT_SECONDS)
+        except Exception as e:
+            if required:
+                raise
+            error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+            logger.warning("Başlangıç ısınma adımı başarısız (%s): %s", name, error)
+        self.startup[name] = {"seconds": round(time.perf_counter() - started, 3), "error": error}
+
+    def stats(self) -> dict:
+        return {"ready": self.ready, "startup": self.startup}
+
+
+def _session_count(channel: str) -> int:
+    if services.ai_service is None:
+        return 0
+    sessions = services.ai_service.chat_sessions
+    whatsapp = sessions.count(WHATSAPP_SESSION_PREFIX)
+    return whatsapp if channel == "whatsapp" else len(sessions) - whatsapp
+
+
+services = ServiceContainer()
+CHAT_SESSIONS.set_function(lambda: _session_count("web"), channel="web")
+CHAT_SESSIONS.set_function(lambda: _session_count("whatsapp"), channel="whatsapp")
+BACKGROUND_TASKS.set_function(
+    lambda: services.ai_service.pending_tool_tasks if services.ai_service else 0, kind="tools"
+)
+
+
+def get_ai_service() -> "AIService":
+    return services.ai_service
+
+
+def get_shopify_client() -> ShopifyClient:
+    return services.shopify_client
+
+
+def get_social_service() -> SocialService:
+    return services.social_service
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import re
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app.services.search_index import normalize_turkish, tokenize
+
+if TYPE_CHECKING:
+    # Imported where protos are built, so loading this module does not pull in the SDK
+    from google.generativeai import protos
+
+# Rough token estimate; good enough to keep prompt size flat
+CHARS_PER_TOKEN = 4
+
+STATE_MARKER = "[Önceki konuşma özeti]"
+STATE_ACK = "Tamam efendim bu bilgileri dikkate alıyorum"
+
+SIZE_VALUE = r"(?:3[2-9]|4[0-9]|5[0-4]|xxxl|xxl|xl|xs|s|m|l)"
+# A size only counts next to "beden"/"numara" ("38 beden", "bedenim M"); a bare number is as
+# likely a door number or a quantity. Matched against normalize_turkish() text
+SIZE_RE = re.compile(rf"\b({SIZE_VALUE})\s*(?:beden|numara)|\b(?:beden|numara)\w*\s*:?\s*({SIZE_VALUE})\b")
+SIZE_VALUE_RE = re.compile(SIZE_VALUE, re.IGNORECASE)
+PHONE_RE = re.compile(r"(?:\+?90[\s-]*)?0?5\d{2}[\s-]*\d{3}[\s-]*\d{2}[\s-]*\d{2}")
+COLORS = [
+    "kırmızı", "siyah", "beyaz", "lacivert", "mavi", "yeşil", "sarı", "turuncu", "mor", "pembe",
+    "pudra", "bej", "krem", "kahverengi", "gri", "haki", "bordo", "ekru", "vizon", "somon",
+]
+# re.IGNORECASE does not fold İ/ı, so colours are matched on normalize_turkish() text
+COLOR_NAMES = {normalize_turkish(c): c for c in COLORS}
+COLOR_RE = re.compile(r"\b(" + "|".join(COLOR_NAMES) + r")\b")
+
+# search_products result lines (see product_render_cache.render_product)
+PRODUCT_LINE_PREFIX = "Ürün: "
+VARIANT_LINE_RE = re.compile(r"Varyant ID: (\d+), Seçenek: (.+?), Fiyat:")
+# "ikincisini alayım" picks the second product of the last search
+ORDINALS = {"ilki": 0, "birinci": 0, "ikinci": 1, "üçüncü": 2, "dördüncü": 3, "beşinci": 4}
+
+# A product from a search result: title and variant id -> option ("Kırmızı / 38")
+SearchResult = Tuple[str, Dict[str, str]]
+
+# Order of the lines in the state block
+STATE_FIELDS = {
+    "product": "Seçilen ürün",
+    "variant_id": "Varyant ID",
+    "size": "Beden",
+    "color": "Renk",
+    "searches": "Aranan ürünler",
+    "customer": "Müşteri bilgileri",
+    "phone": "Telefon",
+    "payment_method": "Ödeme",
+    "order": "Sipariş durumu",
+}
+
+
+def _part_chars(part: protos.Part) -> int:
+    if part.text:
+        return len(part.text)
+    if part.function_call:
+        return len(part.function_call.name) + len(str(dict(part.function_call.args)))
+    if part.function_response:
+        return len(part.function_response.name) + len(str(part.function_response.response.get("result", "")))
+    return 0
+
+
+def estimate_tokens(history: List[protos.Content]) -> int:
+    return sum(_part_chars(p) for c in history for p in c.parts) // CHARS_PER_TOKEN
+
+
+def _user_text(content: protos.Content) -> str:
+    if content.role != "user":
+        return ""
+    return " ".join(p.text for p in content.parts if p.text)
+
+
+def _is_turn_start(content: protos.Content) -> bool:
+    # A customer message; function responses are also sent with the user role
+    return content.role == "user" and any(p.text for p in content.parts)
+
+
+def _sizes(text: str) -> List[str]:
+    return [(a or b).upper() for a, b in SIZE_RE.findall(normalize_turkish(text))]
+
+
+def _colors(text: str) -> List[str]:
+    return [COLOR_NAMES[c].capitalize() for c in COLOR_RE.findall(normalize_turkish(text))]
+
+
+def _option_size_color(option: str):
+    """
+    Size and colour of a variant option such as "Kırmızı / 38".
+    """
+    size = color = None
+    for value in option.split("/"):
+        value = value.strip()
+        if SIZE_VALUE_RE.fullmatch(value):
+            size = value.upper()
+        elif normalize_turkish(value) in COLOR_NAMES:
+            color = COLOR_NAMES[normalize_turkish(value)].capitalize()
+    return size, color
+
+
+def parse_search_result(text: str) -> List[SearchResult]:
+    results: List[SearchResult] = []
+    for line in text.splitlines():
+        if line.startswith(PRODUCT_LINE_PREFIX):
+            results.append((line[len(PRODUCT_LINE_PREFIX):].strip(), {}))
+        elif results:
+            match = VARIANT_LINE_RE.search(line)
+            if match:
+                results[-1][1][match.group(1)] = match.group(2)
+    return results
+
+
+def _selected_product(text: str, candidates: List[SearchResult]) -> Optional[SearchResult]:
+    """
+    The product a customer message picks out of the last search results, by ordinal
+    ("ikincisi") or by the title words that tell the results apart ("ikra olanı").
+    """
+    words = tokenize(text)
+    for word in words:
+        for ordinal, index in ORDINALS.items():
+            if word.startswith(ordinal) and index < len(candidates):
+                return candidates[index]
+
+    titles = [set(tokenize(title)) for title, _ in candidates]
+    common = set.intersection(*titles) if titles else set()
+    scores = [
+        sum(1 for t in tokens - common if len(t) >= 3 and any(w.startswith(t) for w in words))
+        for tokens in titles
+    ]
+    best = max(scores, default=0)
+    if best and scores.count(best) == 1:
+        return candidates[scores.index(best)]
+    return None
+
+
+def shrink_search_result(text: str, max_chars: int) -> str:
+    """
+    Drops the description lines from a search_products result and caps its length.
+    Product titles and variant lines (IDs, options, stock) are what later turns still need.
+    """
+    lines = [line for line in text.splitlines() if not line.startswith("Özellikler:") and line.strip()]
+    shrunk = "\n".join(lines)
+    if len(shrunk) > max_chars:
+        shrunk = shrunk[:max_chars] + "\n(...kısaltıldı)"
+    return shrunk
+
+
+class HistoryCompactor:
+    """
+    Keeps a chat history inside a token budget before it is replayed to the model.
+    1. Tool results older than the most recent turns are shrunk (search descriptions dropped).
+    2. If that is not enough, the oldest turns are dropped and folded into a state block
+       (chosen product, size, colour, customer fields) at the start of the history.
+    """
+
+    def __init__(self, token_budget: int, keep_recent_turns: int, tool_result_chars: int):
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.tool_result_chars = tool_result_chars
+
+    def compact(self, history: List[protos.Content]) -> Optional[List[protos.Content]]:
+        """
+        Returns the compacted history, or None if it already fits the budget.
+        """
+        if estimate_tokens(history) <= self.token_budget:
+            return None
+
+        state, turns = self._split(history)
+        recent_from = max(0, len(turns) - self.keep_recent_turns)
+
+        for turn in turns[:recent_from]:
+            for i, content in enumerate(turn):
+                turn[i] = self._shrink_tool_results(content)
+
+        # Results of the last search among the dropped turns, for a selection in a later one
+        candidates: List[SearchResult] = []
+        while recent_from > 0 and self._estimate(state, turns) > self.token_budget:
+            dropped = turns.pop(0)
+            recent_from -= 1
+            self._absorb(state, dropped, candidates)
+
+        return self._state_contents(state) + [c for turn in turns for c in turn]
+
+    def _estimate(self, state: Dict[str, str], turns: List[List[protos.Content]]) -> int:
+        return estimate_tokens(self._state_contents(state) + [c for turn in turns for c in turn])
+
+    def _split(self, history: List[protos.Content]):
+        """
+        Separates a previous state block from the rest and groups the rest into turns.
+        """
+        state: Dict[str, str] = {}
+        start = 0
+        if len(history) >= 2 and _user_text(history[0]).startswith(STATE_MARKER):
+            state = self._parse_state(_user_text(history[0]))
+            start = 2
+
+        turns: List[List[protos.Content]] = []
+        for content in history[start:]:
+            if _is_turn_start(content) or not turns:
+                turns.append([])
+            turns[-1].append(content)
+        return state, turns
+
+    def _shrink_tool_results(self, content: protos.Content) -> protos.Content:
+        if not any(p.function_response for p in content.parts):
+            return content
+        from google.generativeai import protos
+
+        parts = []
+        for part in content.parts:
+            fr = part.function_response
+            if fr and fr.name == "search_products":
+                result = str(fr.response.get("result", ""))
+                shrunk = shrink_search_result(result, self.tool_result_chars)
+                if shrunk != result:
+                    part = protos.Part(
+                        function_response=protos.FunctionResponse(name=fr.name, response={"result": shrunk})
+                    )
+            parts.append(part)
+        return protos.Content(role=content.role, parts=parts)
+
+    def _absorb(self, state: Dict[str, str], turn: List[protos.Content], candidates: List[SearchResult]) -> None:
+        """
+        Folds what a dropped turn established into the state block. `candidates` carries the
+        last search results from one dropped turn to the next and is updated in place.
+        """
+        for content in turn:
+            text = _user_text(content)
+            phones = PHONE_RE.findall(text)
+            if phones:
+                state["phone"] = phones[-1].strip()
+                # The message carrying the phone number usually carries name and address too
+                state["customer"] = " ".join(text.split())[:300]
+            elif text:
+                # Door numbers in an address message would look like sizes, so only look elsewhere
+                self._absorb_size_color(state, text)
+                selected = _selected_product(text, candidates)
+                if selected:
+                    state["product"] = selected[0]
+
+            for part in content.parts:
+                fc = part.function_call
+                if fc and fc.name == "search_products":
+                    query = str(fc.args.get("query", "")).strip()
+                    self._absorb_size_color(state, query)
+                    if query:
+                        searches = [s for s in state.get("searches", "").split(", ") if s and s != query]
+                        state["searches"] = ", ".join((searches + [query])[-3:])
+                elif fc and fc.name == "create_draft_order":
+                    args = dict(fc.args)
+                    if args.get("variant_id"):
+                        state["variant_id"] = str(int(args["variant_id"]))
+                        self._absorb_variant(state, state["variant_id"], candidates)
+                    if args.get("product_summary"):
+                        state["product"] = str(args["product_summary"])
+                    if args.get("payment_method"):
+                        state["payment_method"] = str(args["payment_method"])
+                    if args.get("phone"):
+                        state["phone"] = str(args["phone"])
+                    customer = " ".join(
+                        str(args[k]) for k in ("first_name", "last_name", "address1", "city") if args.get(k)
+                    )
+                    if customer:
+                        state["customer"] = customer
+                fr = part.function_response
+                if fr and fr.name == "search_products":
+                    results = parse_search_result(str(fr.response.get("result", "")))
+                    if results:
+                        candidates[:] = results
+                    if len(results) == 1:
+                        state["product"] = results[0][0]
+                elif fr and fr.name == "create_draft_order":
+                    state["order"] = " ".join(str(fr.response.get("result", "")).split())[:200]
+
+    def _absorb_size_color(self, state: Dict[str, str], text: str) -> None:
+        sizes = _sizes(text)
+        if sizes:
+            state["size"] = sizes[-1]
+        colors = _colors(text)
+        if colors:
+            state["color"] = colors[-1]
+
+    def _absorb_variant(self, state: Dict[str, str], variant_id: str, candidates: List[SearchResult]) -> None:
+        """
+        Takes product, size and colour from the ordered variant's line in the last search results.
+        """
+        for title, variants in candidates:
+            if variant_id in variants:
+                state["product"] = title
+                size, color = _option_size_color(variants[variant_id])
+                if size:
+                    state["size"] = size
+                if color:
+                    state["color"] = color
+                return
+
+    def _state_contents(self, state: Dict[str, str]) -> List[protos.Content]:
+        if not state:
+            return []
+        from google.generativeai import protos
+
+        lines = [STATE_MARKER]
+        for key, label in STATE_FIELDS.items():
+            if state.get(key):
+                lines.append(f"- {label}: {state[key]}")
+        return [
+            protos.Content(role="user", parts=[protos.Part(text="\n".join(lines))]),
+            protos.Content(role="model", parts=[protos.Part(text=STATE_ACK)]),
+        ]
+
+    def _parse_state(self, text: str) -> Dict[str, str]:
+        by_label = {label: key for key, label in STATE_FIELDS.items()}
+        state = {}
+        for line in text.splitlines()[1:]:
+            label, _, value = line.lstrip("- ").partition(": ")
+            if label in by_label and value:
+                state[by_label[label]] = value
+        return state
@@ -0,0 +1,387 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import and_, delete, func, or_, select, update
+
+from app.core.config import settings
+from app.core.metrics import BACKGROUND_TASKS
+from app.core.tracing import trace
+from app.db.database import SessionLocal
+from app.db.models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+# A handler either does the work itself, or passes it on and returns an awaitable that
+# finishes (or raises) when the work is done; see JobQueue._run
+JobHandler = Callable[[dict], Awaitable[Optional[Awaitable[None]]]]
+
+
+class QueueFullError(Exception):
+    """Raised by enqueue when the backlog is at JOB_QUEUE_MAX_DEPTH."""
+
+
+class JobQueue:
+    """
+    Persistent job queue on top of the application database, with an in-process worker pool.
+    Workers claim jobs with a conditional UPDATE, so several processes can share the table.
+    A claimed job is invisible to other workers until its visibility timeout runs out; while the
+    handler runs, a heartbeat keeps pushing that timeout forward, so only a job whose process
+    died becomes claimable again. Each claim carries a token and the job is settled (deleted,
+    rescheduled or released) only by the claim that still holds it. Failed jobs are retried with exponential
+    backoff and jitter until JOB_MAX_ATTEMPTS, then kept with status "failed".
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        workers: int = 4,
+        max_depth: int = 1000,
+        max_handed_off: int = 200,
+        max_attempts: int = 5,
+        visibility_timeout: float = 120.0,
+        poll_interval: float = 1.0,
+        backoff_base: float = 2.0,
+        backoff_max: float = 300.0,
+    ):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_handed_off = max_handed_off
+        self.max_attempts = max_attempts
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._handed_off: Set[asyncio.Task] = set()
+        # Claimed jobs not yet settled: one per worker plus the handed-off ones
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+        # Stats
+        self.enqueued = 0
+        self.rejected = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        self.lost_claims = 0
+        self.worker_errors = 0
+        self.in_flight = 0
+        self._wait_times = deque(maxlen=1000)
+        self._run_times = deque(maxlen=1000)
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def depth(self) -> int:
+        """
+        Jobs waiting or running (failed ones do not count).
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(func.count(Job.id)).where(Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING]))
+            )
+            return result.scalar_one()
+
+    async def enqueue(self, kind: str, payload: dict) -> int:
+        ids = await self.enqueue_many([(kind, payload)])
+        return ids[0]
+
+    async def enqueue_many(self, items: List[tuple]) -> List[int]:
+        """
+        Persists (kind, payload) jobs in one transaction and wakes the workers.
+        Raises QueueFullError when the backlog would go over max_depth.
+        """
+        if not items:
+            return []
+        if await self.depth() + len(items) > self.max_depth:
+            self.rejected += len(items)
+            raise QueueFullError(f"Job queue is full ({self.max_depth})")
+
+        jobs = [Job(kind=kind, payload=json.dumps(payload, ensure_ascii=False)) for kind, payload in items]
+        async with self.session_factory() as session:
+            session.add_all(jobs)
+            await session.flush()
+            ids = [job.id for job in jobs]
+            await session.commit()
+
+        self.enqueued += len(jobs)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return ids
+
+    async def start(self) -> None:
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.workers + self.max_handed_off)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop_claiming(self, grace_seconds: float = 10.0) -> None:
+        """
+        Stops the workers from claiming new jobs and lets the ones they are running finish for
+        a grace period. Handed-off jobs keep running; stop() settles them. Called first on
+        shutdown, so the work a handler passed on (the WhatsApp mailbox) can be drained
+        before its jobs are released.
+        """
+        self._stopping = True
+        if self._wakeup is not None:
+            self._wakeup.set()
+        tasks, self._tasks = self._tasks, []
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=grace_seconds)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def stop(self, grace_seconds: float = 10.0) -> None:
+        """
+        Lets running and handed-off jobs finish for a grace period, then cancels them.
+        Cancelled jobs are released so the next process picks them up right away.
+        """
+        await self.stop_claiming(grace_seconds)
+        tasks = list(self._handed_off)
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=grace_seconds)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            await self._slots.acquire()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.exception("Job queue claim error")
+                job = None
+
+            if job is None:
+                self._slots.release()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # e.g. the DB was unreachable when settling the job; its lease runs out and it is retried
+                self.worker_errors += 1
+                logger.exception("Job queue worker error", extra={"job_id": job.id, "kind": job.kind})
+
+    async def _claim(self) -> Optional[Job]:
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(Job.status == JobStatus.PENDING, Job.available_at <= now),
+            and_(Job.status == JobStatus.RUNNING, Job.locked_until < now),
+        )
+        token = uuid.uuid4().hex
+        async with self.session_factory() as session:
+            for _ in range(3):
+                result = await session.execute(select(Job.id).where(claimable).order_by(Job.id).limit(1))
+                job_id = result.scalar_one_or_none()
+                if job_id is None:
+                    return None
+
+                # Only one worker (in any process) wins the conditional update
+                claimed = await session.execute(
+                    update(Job)
+                    .where(Job.id == job_id, claimable)
+                    .values(
+                        status=JobStatus.RUNNING,
+                        attempts=Job.attempts + 1,
+                        locked_until=now + timedelta(seconds=self.visibility_timeout),
+                        claim_token=token,
+                    )
+                )
+                await session.commit()
+                if claimed.rowcount == 1:
+                    result = await session.execute(select(Job).where(Job.id == job_id))
+                    return result.scalar_one()
+        return None
+
+    async def _run(self, job: Job) -> None:
+        """
+        Calls the job's handler. If the handler returns an awaitable, the work was passed on
+        (e.g. to a sender's mailbox): the worker moves on to the next job while this one keeps
+        its lease until the awaitable finishes, and is settled then.
+        """
+        handler = self._handlers.get(job.kind)
+        self._wait_times.append((datetime.utcnow() - job.created_at).total_seconds())
+        self.in_flight += 1
+        start = time.monotonic()
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job kind '{job.kind}'")
+            with trace(f"job {job.kind}"):
+                handed_off = await handler(json.loads(job.payload))
+        except asyncio.CancelledError:
+            await asyncio.shield(self._finish(job, start, heartbeat, cancelled=True))
+            raise
+        except Exception as e:
+            await self._finish(job, start, heartbeat, error=e)
+            return
+
+        if handed_off is None:
+            await self._finish(job, start, heartbeat)
+            return
+        task = asyncio.create_task(self._await_handed_off(job, start, heartbeat, handed_off))
+        self._handed_off.add(task)
+        task.add_done_callback(self._handed_off.discard)
+
+    async def _await_handed_off(self, job: Job, start: float, heartbeat: asyncio.Task, work: Awaitable) -> None:
+        try:
+            try:
+                await work
+            except asyncio.CancelledError:
+                await asyncio.shield(self._finish(job, start, heartbeat, cancelled=True))
+                raise
+            except Exception as e:
+                await self._finish(job, start, heartbeat, error=e)
+            else:
+                await self._finish(job, start, heartbeat)
+        except Exception:
+            self.worker_errors += 1
+            logger.exception("Job queue settle error", extra={"job_id": job.id, "kind": job.kind})
+
+    async def _finish(
+        self, job: Job, start: float, heartbeat: asyncio.Task, error: Exception = None, cancelled: bool = False
+    ) -> None:
+        # Stopped before the job is settled, so a late extension never races the settle
+        heartbeat.cancel()
+        try:
+            if cancelled:
+                await self._release(job)
+            elif error is not None:
+                logger.warning(
+                    "Job failed: %s", error, extra={"job_id": job.id, "kind": job.kind, "attempt": job.attempts}
+                )
+                await self._fail(job, str(error))
+            else:
+                self._run_times.append(time.monotonic() - start)
+                await self._complete(job)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def _owned(self, job: Job):
+        return and_(Job.id == job.id, Job.claim_token == job.claim_token)
+
+    async def _settle(self, job: Job, statement) -> bool:
+        """
+        Runs a statement restricted to this claim. False when the claim was lost (the lease ran
+        out and another worker took the job); the newer claim's row is then left alone.
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(statement.where(self._owned(job)))
+            await session.commit()
+        if result.rowcount == 0:
+            self.lost_claims += 1
+            logger.warning("Job claim lost", extra={"job_id": job.id, "kind": job.kind})
+            return False
+        return True
+
+    async def _heartbeat(self, job: Job) -> None:
+        """
+        Extends the lease of a running job every third of the visibility timeout.
+        """
+        interval = self.visibility_timeout / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                extended = await self._settle(
+                    job, update(Job).values(locked_until=datetime.utcnow() + timedelta(seconds=self.visibility_timeout))
+                )
+            except Exception:
+                logger.exception("Job heartbeat failed", extra={"job_id": job.id, "kind": job.kind})
+                continue
+            if not extended:
+                return
+
+    async def _complete(self, job: Job) -> None:
+        if await self._settle(job, delete(Job)):
+            self.completed += 1
+
+    async def _fail(self, job: Job, error: str) -> None:
+        values = {"last_error": error[:2000], "locked_until": None, "claim_token": None}
+        final = job.attempts >= self.max_attempts
+        if final:
+            values["status"] = JobStatus.FAILED
+        else:
+            delay = min(self.backoff_base * 2 ** (job.attempts - 1), self.backoff_max)
+            values["status"] = JobStatus.PENDING
+            values["available_at"] = datetime.utcnow() + timedelta(seconds=delay * random.uniform(0.5, 1.5))
+        if await self._settle(job, update(Job).values(**values)):
+            if final:
+                self.failed += 1
+            else:
+                self.retried += 1
+
+    async def _release(self, job: Job) -> None:
+        await self._settle(
+            job,
+            update(Job).values(
+                status=JobStatus.PENDING, locked_until=None, claim_token=None, attempts=Job.attempts - 1
+            ),
+        )
+
+    def _latency(self, samples) -> dict:
+        if not samples:
+            return {"p50": None, "p95": None, "max": None}
+        ordered = sorted(samples)
+        return {
+            "p50": round(ordered[len(ordered) // 2], 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+            "max": round(ordered[-1], 3),
+        }
+
+    async def stats(self) -> dict:
+        async with self.session_factory() as session:
+            result = await session.execute(select(Job.status, func.count(Job.id)).group_by(Job.status))
+            by_status = {status.value: count for status, count in result.all()}
+        return {
+            "workers": len(self._tasks),
+            "in_flight": self.in_flight,
+            "handed_off": len(self._handed_off),
+            "pending": by_status.get(JobStatus.PENDING.value, 0),
+            "running": by_status.get(JobStatus.RUNNING.value, 0),
+            "failed_jobs": by_status.get(JobStatus.FAILED.value, 0),
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "lost_claims": self.lost_claims,
+            "worker_errors": self.worker_errors,
+            "wait_seconds": self._latency(self._wait_times),
+            "run_seconds": self._latency(self._run_times),
+        }
+
+
+job_queue = JobQueue(
+    workers=settings.JOB_WORKERS,
+    max_depth=settings.JOB_QUEUE_MAX_DEPTH,
+    max_handed_off=settings.JOB_MAX_HANDED_OFF,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    visibility_timeout=settings.JOB_VISIBILITY_TIMEOUT_SECONDS,
+    poll_interval=settings.JOB_POLL_INTERVAL_SECONDS,
+)
+BACKGROUND_TASKS.set_function(lambda: job_queue.in_flight, kind="jobs")
@@ -0,0 +1,179 @@
+import re
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.core.config import Settings, settings
+from app.services.history_compactor import PHONE_RE
+from app.services.search_index import normalize_turkish
+
+LITE = "lite"
+FLASH = "flash"
+PRO = "pro"
+TIERS = (LITE, FLASH, PRO)
+
+# Tier to try next when a model call fails or runs out of its time budget.
+# Pro falls back to flash: a slower answer beats none.
+FALLBACKS = {LITE: FLASH, FLASH: PRO, PRO: FLASH}
+
+
+@dataclass
+class TurnContext:
+    """
+    What a routing policy sees for one model call of a chat turn.
+    """
+
+    message: str
+    round_no: int = 0
+    history_length: int = 0
+    # Last text the model wrote before this turn (e.g. a question asking to confirm the order)
+    last_model_text: str = ""
+    # Tools the model called earlier in this turn
+    tool_names: List[str] = field(default_factory=list)
+    # Tier of the previous model call in this turn
+    tier: Optional[str] = None
+    # Tier of the call that produced the final answer
+    served_tier: Optional[str] = None
+    fallbacks: int = 0
+
+
+class RoutingPolicy(ABC):
+    """
+    Picks the model tier for each model call of a chat turn.
+    """
+
+    @abstractmethod
+    def choose(self, ctx: TurnContext) -> str:
+        ...
+
+
+class FixedPolicy(RoutingPolicy):
+    def __init__(self, tier: str = FLASH):
+        self.tier = tier
+
+    def choose(self, ctx: TurnContext) -> str:
+        return self.tier
+
+
+class RuleBasedPolicy(RoutingPolicy):
+    """
+    Cheap message and conversation features, no extra model call:
+    - order turns (order / payment / address words, a phone number, or a short "yes" to the
+      model's order question) and every call after create_draft_order go to pro;
+    - short greetings, thanks and "var mı?" stock questions at the start of a turn go to lite;
+    - everything else goes to flash. Later rounds of a turn keep the tier of the first one.
+    """
+
+    ORDER_RE = re.compile(r"sipari|kapida|kredi kart|odeme|ödeme|adres|satin al|onayl|fatura")
+    CONFIRM_RE = re.compile(r"(evet|tamam|olur|onayliyorum|aynen|dogru|doğru)\b[\s!.]*")
+    ORDER_QUESTION_RE = re.compile(r"onay|sipari|ödeme|odeme|adres")
+    SIMPLE_RE = re.compile(
+        r"^(merhaba|selam|slm|iyi günler|iyi gunler|günaydin|gunaydin|teşekkür|tesekkur|sağol|sagol)"
+        r"|var mi\b|stok|beden|renk|fiyat"
+    )
+    SIMPLE_MAX_WORDS = 8
+    # Long conversations carry more state than the lite tier handles well
+    SIMPLE_MAX_HISTORY = 20
+
+    def choose(self, ctx: TurnContext) -> str:
+        if "create_draft_order" in ctx.tool_names:
+            return PRO
+        if ctx.round_no > 0 and ctx.tier is not None:
+            return ctx.tier
+
+        text = normalize_turkish(ctx.message).strip()
+        if self.ORDER_RE.search(text) or PHONE_RE.search(text):
+            return PRO
+        if self.CONFIRM_RE.fullmatch(text) and self.ORDER_QUESTION_RE.search(normalize_turkish(ctx.last_model_text)):
+            return PRO
+        if (
+            len(text.split()) <= self.SIMPLE_MAX_WORDS
+            and ctx.history_length <= self.SIMPLE_MAX_HISTORY
+            and self.SIMPLE_RE.search(text)
+        ):
+            return LITE
+        return FLASH
+
+
+POLICIES: Dict[str, Callable[[], RoutingPolicy]] = {
+    "rules": RuleBasedPolicy,
+    "fixed": FixedPolicy,
+}
+
+
+class ModelRouter:
+    """
+    One GenerativeModel per tier (created on first use), the routing policy, per-tier time
+    budgets and fallbacks, and what each tier served: calls, failures, fallbacks, turn latency.
+    """
+
+    def __init__(self, model_factory: Callable[[str], Any], policy: RoutingPolicy, config: Settings = settings):
+        self.model_factory = model_factory
+        self.policy = policy
+        self.model_names = {LITE: config.AI_MODEL_LITE, FLASH: config.AI_MODEL_FLASH, PRO: config.AI_MODEL_PRO}
+        self.timeouts = {
+            LITE: config.AI_TIMEOUT_LITE_SECONDS,
+            FLASH: config.AI_TIMEOUT_FLASH_SECONDS,
+            PRO: config.AI_TIMEOUT_PRO_SECONDS,
+        }
+        self._models: Dict[str, Any] = {}
+
+        # Stats
+        self.calls = {tier: 0 for tier in TIERS}
+        self.failures = {tier: 0 for tier in TIERS}
+        self.turns = {tier: 0 for tier in TIERS}
+        self.fallbacks: Dict[str, int] = {}
+        self._turn_times = {tier: deque(maxlen=1000) for tier in TIERS}
+
+    def model(self, tier: str) -> Any:
+        model = self._models.get(tier)
+        if model is None:
+            model = self._models[tier] = self.model_factory(self.model_names[tier])
+        return model
+
+    def timeout(self, tier: str) -> float:
+        return self.timeouts[tier]
+
+    def fallback(self, tier: str, tried: Iterable[str]) -> Optional[str]:
+        next_tier = FALLBACKS.get(tier)
+        return next_tier if next_tier not in set(tried) else None
+
+    def record_call(self, tier: str, failed: bool = False) -> None:
+        self.calls[tier] += 1
+        if failed:
+            self.failures[tier] += 1
+
+    def record_fallback(self, from_tier: str, to_tier: str) -> None:
+        key = f"{from_tier}->{to_tier}"
+        self.fallbacks[key] = self.fallbacks.get(key, 0) + 1
+
+    def record_turn(self, tier: str, seconds: float) -> None:
+        self.turns[tier] += 1
+        self._turn_times[tier].append(seconds)
+
+    def _latency(self, samples) -> dict:
+        if not samples:
+            return {"p50": None, "p95": None}
+        ordered = sorted(samples)
+        return {
+            "p50": round(ordered[len(ordered) // 2], 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "policy": type(self.policy).__name__,
+            "tiers": {
+                tier: {
+                    "model": self.model_names[tier],
+                    "timeout_seconds": self.timeouts[tier],
+                    "calls": self.calls[tier],
+                    "failures": self.failures[tier],
+                    "turns": self.turns[tier],
+                    "turn_seconds": self._latency(self._turn_times[tier]),
+                }
+                for tier in TIERS
+            },
+            "fallbacks": dict(self.fallbacks),
+        }
@@ -0,0 +1,56 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Set
+
+from app.core.config import settings
+
+
+@dataclass(eq=False)
+class Subscription:
+    queue: asyncio.Queue
+    overflowed: bool = False
+
+
+class OrderEventBroker:
+    """
+    In-process fan-out of order changes to the open admin dashboards (SSE).
+    Publishing costs one queue put per open tab, so load follows the number of changes.
+    A tab that falls behind by more than its queue size is marked overflowed and told
+    to resync; it catches up through the /orders/changes endpoint instead.
+    """
+
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self._subscriptions: Set[Subscription] = set()
+
+        # Stats
+        self.published = 0
+        self.overflows = 0
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(queue=asyncio.Queue(self.max_queue))
+        self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscriptions.discard(subscription)
+
+    def publish(self, event: dict) -> None:
+        self.published += 1
+        for subscription in list(self._subscriptions):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscription.overflowed = True
+                self._subscriptions.discard(subscription)
+                self.overflows += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "published": self.published,
+            "overflows": self.overflows,
+        }
+
+
+order_events = OrderEventBroker(max_queue=settings.ADMIN_EVENTS_QUEUE_SIZE)
@@ -0,0 +1,75 @@
+import csv
+import enum
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from app.db.database import SessionLocal
+from app.services.order_service import EXPORT_COLUMNS, OrderService
+
+# Rows buffered per chunk sent to the client
+EXPORT_CHUNK_ROWS = 500
+
+# Spreadsheet apps run a cell starting with these as a formula; customer-entered names and
+# addresses are written with a leading quote instead
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _json_value(value):
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+async def iter_order_export(export_format: str, **filters) -> AsyncIterator[bytes]:
+    """
+    Streams the matching orders as CSV or NDJSON, in chunks of EXPORT_CHUNK_ROWS rows.
+    Uses its own session: it runs after the request handler has returned, for as long
+    as the download takes.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if export_format == "csv":
+        # BOM so Excel opens the Turkish characters correctly; the header goes out before the query runs
+        buffer.write("\ufeff")
+        writer.writerow(EXPORT_COLUMNS)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    async with SessionLocal() as db:
+        rows = 0
+        async for row in OrderService(db).stream_orders(**filters):
+            if export_format == "csv":
+                writer.writerow([_csv_value(row[name]) for name in EXPORT_COLUMNS])
+            else:
+                buffer.write(json.dumps({name: _json_value(row[name]) for name in EXPORT_COLUMNS}, ensure_ascii=False))
+                buffer.write("\n")
+            rows += 1
+            if rows % EXPORT_CHUNK_ROWS == 0:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
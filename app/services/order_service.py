@@ -1,12 +1,89 @@
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from app.core.tracing import span, traced
 from app.db.models import Order, OrderStatus, OrderSource, PaymentMethod
-from typing import List, Optional
+from app.schemas.order import OrderOut
+from app.services.order_events import order_events
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+# Columns the admin list needs (see OrderOut); avoids loading every column of every row
+ORDER_LIST_COLUMNS = [getattr(Order, name) for name in OrderOut.model_fields]
+
+# Columns of the CSV/NDJSON export, in file order
+EXPORT_COLUMNS = [
+    "id", "created_at", "status", "source", "payment_method", "first_name", "last_name",
+    "phone", "email", "address", "city", "product_summary", "amount", "shopify_invoice_url",
+]
+
+def encode_cursor(created_at: datetime, order_id: int) -> str:
+    """
+    Opaque position of the last row of a page: its (created_at, id).
+    """
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{order_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, order_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def decode_since(since: str) -> Tuple[datetime, int]:
+    """
+    A changes cursor, or a plain ISO timestamp (every change at or after it).
+    """
+    try:
+        return decode_cursor(since)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(since), 0
+    except ValueError:
+        raise ValueError("Invalid since (expected a cursor or an ISO timestamp)")
+
+def filter_orders(
+    query,
+    status: Optional[OrderStatus] = None,
+    source: Optional[OrderSource] = None,
+    payment_method: Optional[PaymentMethod] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+):
+    """
+    The admin list filters, shared by the paged list and the export.
+    """
+    if status is not None:
+        query = query.where(Order.status == status)
+    if source is not None:
+        query = query.where(Order.source == source)
+    if payment_method is not None:
+        query = query.where(Order.payment_method == payment_method)
+    if created_from is not None:
+        query = query.where(Order.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(Order.created_at < created_to)
+    return query
+
+def publish_order_event(event_type: str, order) -> None:
+    """
+    Pushes a created/updated order (Order or OrderOut) to the live admin dashboards.
+    The event id is the order's (updated_at, id) cursor, which /orders/changes accepts as `since`.
+    """
+    order_out = OrderOut.model_validate(order)
+    order_events.publish({
+        "type": event_type,
+        "id": encode_cursor(order_out.updated_at, order_out.id),
+        "order": order_out.model_dump(mode="json"),
+    })
 
 class OrderService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
+    @traced("orders.create_order")
     async def create_order(
         self,
         first_name: str,
@@ -34,19 +111,152 @@ class OrderService:
             status=OrderStatus.PENDING
         )
         self.db.add(new_order)
-        await self.db.commit()
+        with span("db.commit"):
+            await self.db.commit()
         await self.db.refresh(new_order)
+        publish_order_event("created", new_order)
         return new_order
 
-    async def get_orders(self, skip: int = 0, limit: int = 100) -> List[Order]:
-        result = await self.db.execute(select(Order).order_by(Order.created_at.desc()).offset(skip).limit(limit))
-        return result.scalars().all()
+    @traced("orders.get_orders")
+    async def get_orders(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[OrderStatus] = None,
+        source: Optional[OrderSource] = None,
+        payment_method: Optional[PaymentMethod] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> Tuple[List[OrderOut], Optional[str]]:
+        """
+        Newest orders first, one page at a time.
+        Keyset pagination: the next page starts strictly after the previous page's last
+        (created_at, id), so every page is an index range scan no matter how deep it is.
+        Returns the page and the cursor of the next one (None on the last page).
+        """
+        query = filter_orders(
+            select(*ORDER_LIST_COLUMNS), status, source, payment_method, created_from, created_to
+        )
+        if cursor:
+            after_created_at, after_id = decode_cursor(cursor)
+            query = query.where(tuple_(Order.created_at, Order.id) < tuple_(after_created_at, after_id))
+
+        # One extra row tells whether there is a next page
+        query = query.order_by(Order.created_at.desc(), Order.id.desc()).limit(limit + 1)
+        result = await self.db.execute(query)
+        rows = result.mappings().all()
+
+        orders = [OrderOut.model_validate(dict(row)) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = orders[-1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        return orders, next_cursor
+
+    async def stream_orders(self, batch_size: int = 1000, **filters) -> AsyncIterator[dict]:
+        """
+        Every order matching the filters, newest first, read through a server-side cursor
+        `batch_size` rows at a time, so memory stays flat however many rows match.
+        """
+        query = filter_orders(select(*(getattr(Order, name) for name in EXPORT_COLUMNS)), **filters)
+        query = query.order_by(Order.created_at.desc(), Order.id.desc()).execution_options(yield_per=batch_size)
+        result = await self.db.stream(query)
+        async for row in result.mappings():
+            yield row
 
+    @traced("orders.get_changes")
+    async def get_changes(
+        self, since: Tuple[datetime, int], limit: int = 200, overlap_seconds: float = 0
+    ) -> Tuple[List[OrderOut], str, bool]:
+        """
+        Orders created or updated after the (updated_at, id) position, oldest change first.
+        Returns the orders, the cursor to continue from and whether more changes are waiting.
+
+        updated_at is set by the app before the commit, so a transaction that commits late can
+        land behind a position already handed out. With overlap_seconds the changes up to that
+        much older than the position are read again (the latest `limit` of them); they may
+        repeat ones the caller already has, so callers de-duplicate by order id. They do not
+        move the cursor.
+        """
+        overlap = []
+        if overlap_seconds > 0 and since[0] != datetime.min:
+            window = (
+                select(*ORDER_LIST_COLUMNS)
+                .where(Order.updated_at >= since[0] - timedelta(seconds=overlap_seconds))
+                .where(tuple_(Order.updated_at, Order.id) <= tuple_(since[0], since[1]))
+                .order_by(Order.updated_at.desc(), Order.id.desc())
+                .limit(limit)
+            )
+            overlap = list(reversed((await self.db.execute(window)).mappings().all()))
+
+        query = (
+            select(*ORDER_LIST_COLUMNS)
+            .where(tuple_(Order.updated_at, Order.id) > tuple_(since[0], since[1]))
+            .order_by(Order.updated_at.asc(), Order.id.asc())
+            .limit(limit + 1)
+        )
+        result = await self.db.execute(query)
+        rows = result.mappings().all()
+
+        changes = [OrderOut.model_validate(dict(row)) for row in rows[:limit]]
+        if changes:
+            cursor = encode_cursor(changes[-1].updated_at, changes[-1].id)
+        else:
+            cursor = encode_cursor(*since)
+        # An order has one row, so the window and the page never share one
+        orders = [OrderOut.model_validate(dict(row)) for row in overlap] + changes
+        return orders, cursor, len(rows) > limit
+
+    @traced("orders.latest_change")
+    async def latest_change(self) -> Optional[Tuple[datetime, int]]:
+        """
+        (updated_at, id) of the most recent change, the starting point for a new live stream.
+        """
+        result = await self.db.execute(
+            select(Order.updated_at, Order.id).order_by(Order.updated_at.desc(), Order.id.desc()).limit(1)
+        )
+        row = result.first()
+        return (row[0], row[1]) if row else None
+
+    @traced("orders.bulk_update_status")
+    async def bulk_update_status(self, order_ids: List[int], status: OrderStatus) -> Dict[int, str]:
+        """
+        Moves a set of orders to a status with one UPDATE ... RETURNING in one transaction.
+        Returns per ID: "updated", "unchanged" (already in that status) or "not_found".
+        """
+        order_ids = list(dict.fromkeys(order_ids))
+        result = await self.db.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids), Order.status != status)
+            .values(status=status, updated_at=datetime.utcnow())
+            .returning(*ORDER_LIST_COLUMNS)
+        )
+        updated = [OrderOut.model_validate(dict(row)) for row in result.mappings().all()]
+
+        results = {order_id: "not_found" for order_id in order_ids}
+        for order in updated:
+            results[order.id] = "updated"
+        # Only needed to tell "already in that status" from "does not exist"
+        remaining = [order_id for order_id, outcome in results.items() if outcome == "not_found"]
+        if remaining:
+            existing = await self.db.execute(select(Order.id).where(Order.id.in_(remaining)))
+            for order_id in existing.scalars():
+                results[order_id] = "unchanged"
+        with span("db.commit"):
+            await self.db.commit()
+
+        for order in updated:
+            publish_order_event("updated", order)
+        return results
+
+    @traced("orders.update_status")
     async def update_status(self, order_id: int, status: OrderStatus) -> Optional[Order]:
         result = await self.db.execute(select(Order).where(Order.id == order_id))
         order = result.scalar_one_or_none()
         if order:
             order.status = status
-            await self.db.commit()
+            with span("db.commit"):
+                await self.db.commit()
             await self.db.refresh(order)
+            publish_order_event("updated", order)
         return order
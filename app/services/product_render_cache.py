@@ -0,0 +1,101 @@
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+from app.core.config import settings
+from app.schemas.product import Product
+from app.services.search_index import strip_html
+
+DESCRIPTION_SNIPPET_CHARS = 300
+
+
+def _is_available(variant) -> bool:
+    # Untracked stock, items in stock and "continue selling" variants can all be ordered
+    if variant.inventory_management is None:
+        return True
+    if variant.inventory_quantity > 0:
+        return True
+    return variant.inventory_policy == "continue"
+
+
+def render_product(p: Product) -> str:
+    """
+    The block search_products shows for one product: title, description snippet, variant lines.
+    """
+    variant_info = []
+    for v in p.variants:
+        status_text = "Mevcut" if _is_available(v) else "Tükendi"
+        variant_info.append(f"   - Varyant ID: {v.id}, Seçenek: {v.title}, Fiyat: {v.price} TL, Durum: {status_text}")
+
+    desc_snippet = "Açıklama Yok"
+    if p.body_html:
+        clean_desc = strip_html(p.body_html)
+        if len(clean_desc) > DESCRIPTION_SNIPPET_CHARS:
+            desc_snippet = clean_desc[:DESCRIPTION_SNIPPET_CHARS] + "..."
+        else:
+            desc_snippet = clean_desc
+
+    variants_str = "\n".join(variant_info)
+    return f"Ürün: {p.title}\nÖzellikler: {desc_snippet}\n{variants_str}"
+
+
+def _version(p: Product) -> Hashable:
+    # Stock changes go through inventory levels and do not always bump the product's
+    # updated_at, so every variant field _is_available reads is part of it
+    return p.updated_at, tuple(
+        (v.id, v.inventory_quantity, v.inventory_management, v.inventory_policy) for v in p.variants
+    )
+
+
+class ProductRenderCache:
+    """
+    Rendered search blocks, one per product version, keyed by product id and checked against
+    the version (updated_at plus the variant stock fields). A new snapshot of an unchanged
+    product reuses its block and a changed one is rendered again.
+    Products without updated_at are rendered on every call.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._blocks: "OrderedDict[int, Tuple[Hashable, str]]" = OrderedDict()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def get(self, product: Product) -> str:
+        if product.updated_at is None:
+            self.misses += 1
+            return render_product(product)
+
+        version = _version(product)
+        cached = self._blocks.get(product.id)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            self._blocks.move_to_end(product.id)
+            return cached[1]
+
+        # Older versions of the product are replaced, not kept next to the new one
+        self.misses += 1
+        block = render_product(product)
+        self._blocks[product.id] = (version, block)
+        self._blocks.move_to_end(product.id)
+        while len(self._blocks) > self.max_size:
+            self._blocks.popitem(last=False)
+        return block
+
+    def clear(self) -> None:
+        self._blocks.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._blocks),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+product_render_cache = ProductRenderCache(max_size=settings.CATALOG_RENDER_CACHE_SIZE)
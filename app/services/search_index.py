@@ -0,0 +1,159 @@
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from app.schemas.product import Product
+
+TOKEN_RE = re.compile(r"\w+")
+HTML_TAG_RE = re.compile(r"<[^<]+?>")
+
+# Relative weight of a match in each field
+FIELD_BOOSTS = {
+    "title": 3.0,
+    "variants": 1.5,
+    "body": 1.0,
+}
+
+# Matches that are not the exact token count for less
+PREFIX_MATCH_WEIGHT = 0.6  # "elbis" -> "elbise"
+STEM_MATCH_WEIGHT = 0.5  # "elbiseler" -> "elbise"
+MIN_PARTIAL_LEN = 3
+PHRASE_BONUS = 2.0
+
+
+def normalize_turkish(text: str) -> str:
+    """
+    Turkish compliant normalization.
+    Maps İ -> i and ı -> i to handle case-insensitive matching correctly.
+    """
+    if not text:
+        return ""
+    return text.replace('İ', 'i').replace('ı', 'i').lower()
+
+
+def strip_html(html: Optional[str]) -> str:
+    if not html:
+        return ""
+    return HTML_TAG_RE.sub('', html)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(normalize_turkish(text))
+
+
+class ProductSearchIndex:
+    """
+    Inverted index over product titles, stripped descriptions and variant option values.
+    Ranking is BM25F-style: per-field term frequencies are length-normalized, boosted and
+    combined before saturation. Everything that does not depend on the query is folded
+    into the posting weights at build time, so a query only walks the postings of its terms.
+    """
+
+    def __init__(self, products: List[Product], k1: float = 1.2, b: float = 0.75):
+        self.products = products
+        self.k1 = k1
+        self.b = b
+        self._titles = [normalize_turkish(p.title) for p in products]
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._vocabulary: List[str] = []
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def _fields(self, product: Product, title: str) -> Dict[str, List[str]]:
+        return {
+            "title": TOKEN_RE.findall(title),
+            "variants": [t for v in product.variants for t in tokenize(v.title)],
+            "body": tokenize(strip_html(product.body_html)),
+        }
+
+    def _build(self) -> None:
+        doc_fields = [self._fields(p, t) for p, t in zip(self.products, self._titles)]
+
+        n_docs = len(doc_fields)
+        avg_len = {}
+        for field in FIELD_BOOSTS:
+            total = sum(len(f[field]) for f in doc_fields)
+            avg_len[field] = (total / n_docs) if n_docs and total else 1.0
+
+        # token -> {doc: length-normalized, boosted term frequency}
+        raw: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for doc, fields in enumerate(doc_fields):
+            for field, tokens in fields.items():
+                if not tokens:
+                    continue
+                norm = 1 - self.b + self.b * len(tokens) / avg_len[field]
+                boost = FIELD_BOOSTS[field]
+                for token, tf in Counter(tokens).items():
+                    postings = raw[token]
+                    postings[doc] = postings.get(doc, 0.0) + boost * tf / norm
+
+        k1 = self.k1
+        for token, postings in raw.items():
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            docs = array('i')
+            weights = array('f')
+            for doc, tf in postings.items():
+                docs.append(doc)
+                weights.append(idf * tf * (k1 + 1) / (tf + k1))
+            self._postings[token] = (docs, weights)
+
+        self._vocabulary = sorted(self._postings)
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """
+        Maps a query term to index tokens: the exact token, tokens it is a prefix of,
+        and (for inflected forms) the longest indexed prefix of the term itself.
+        """
+        matches = []
+        if term in self._postings:
+            matches.append((term, 1.0))
+        if len(term) < MIN_PARTIAL_LEN:
+            return matches
+
+        vocab = self._vocabulary
+        i = bisect_left(vocab, term)
+        while i < len(vocab) and vocab[i].startswith(term):
+            if vocab[i] != term:
+                matches.append((vocab[i], PREFIX_MATCH_WEIGHT))
+            i += 1
+
+        if not matches:
+            for end in range(len(term) - 1, MIN_PARTIAL_LEN - 1, -1):
+                if term[:end] in self._postings:
+                    matches.append((term[:end], STEM_MATCH_WEIGHT))
+                    break
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[float, Product]]:
+        """
+        Returns up to `limit` (score, product) pairs, best first.
+        """
+        normalized = normalize_turkish(query).strip()
+        terms = list(dict.fromkeys(TOKEN_RE.findall(normalized)))
+        if not terms:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            for token, factor in self._expand(term):
+                docs, weights = self._postings[token]
+                for doc, weight in zip(docs, weights):
+                    scores[doc] += factor * weight
+
+        # Bonus for the exact sequence in the title, as the old scorer did
+        if len(terms) > 1:
+            for doc in scores:
+                if normalized in self._titles[doc]:
+                    scores[doc] += PHRASE_BONUS * len(terms)
+
+        ranked = heapq.nsmallest(
+            limit, scores.items(), key=lambda item: (-item[1], len(self.products[item[0]].title))
+        )
+        return [(score, self.products[doc]) for doc, score in ranked]
@@ -0,0 +1,48 @@
+import time
+from collections import OrderedDict
+
+
+class SeenIdCache:
+    """
+    Bounded set of recently seen IDs with a TTL, oldest first.
+    Used to drop Meta's webhook redeliveries of a message we already queued.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+        # Stats
+        self.duplicates = 0
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def _expire(self, now: float) -> None:
+        while self._seen:
+            oldest, expires_at = next(iter(self._seen.items()))
+            if expires_at > now and len(self._seen) <= self.max_size:
+                break
+            del self._seen[oldest]
+
+    def __contains__(self, item_id: str) -> bool:
+        now = time.monotonic()
+        self._expire(now)
+        return item_id in self._seen
+
+    def add(self, item_id: str) -> None:
+        self._seen[item_id] = time.monotonic() + self.ttl_seconds
+        self._seen.move_to_end(item_id)
+        self._expire(time.monotonic())
+
+    def discard(self, item_id: str) -> None:
+        self._seen.pop(item_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._seen),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "duplicates": self.duplicates,
+        }
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.core.tracing import trace
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[str, str], Awaitable[None]]
+
+
+@dataclass
+class _Mailbox:
+    messages: Deque[Tuple[float, str, asyncio.Future]] = field(default_factory=deque)
+    arrived: asyncio.Event = field(default_factory=asyncio.Event)
+    worker: asyncio.Task = None
+
+
+class SenderMailbox:
+    """
+    Processes each sender's messages strictly in order, one model turn at a time.
+    Messages that arrive within the debounce window of each other are merged into one turn,
+    so "name", "address", "phone" sent in quick succession cost a single model call.
+    """
+
+    def __init__(
+        self,
+        handler: MessageHandler,
+        debounce_seconds: float,
+        max_delay_seconds: float,
+        max_batch: int,
+    ):
+        self.handler = handler
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.max_batch = max_batch
+        self._mailboxes: Dict[str, _Mailbox] = {}
+        # Set by close(): queued messages are handled right away instead of after the debounce
+        self._closing = False
+
+        # Stats
+        self.received = 0
+        self.turns = 0
+        self.merged = 0
+        self.failures = 0
+
+    @property
+    def active_mailboxes(self) -> int:
+        """
+        Senders with queued messages or a turn in progress.
+        """
+        return len(self._mailboxes)
+
+    def submit(self, sender_id: str, text: str, order_key: Optional[float] = None) -> asyncio.Future:
+        """
+        Queues a message and returns a future that resolves (True on success, False on failure)
+        once the turn containing it has been handled.
+        order_key (e.g. receive time) keeps queued messages in arrival order even if they are
+        submitted slightly out of order by concurrent callers.
+        """
+        future = asyncio.get_running_loop().create_future()
+        if order_key is None:
+            order_key = time.time()
+        mailbox = self._mailboxes.get(sender_id)
+        if mailbox is None:
+            mailbox = self._mailboxes[sender_id] = _Mailbox()
+
+        position = len(mailbox.messages)
+        while position > 0 and mailbox.messages[position - 1][0] > order_key:
+            position -= 1
+        mailbox.messages.insert(position, (order_key, text, future))
+        mailbox.arrived.set()
+        self.received += 1
+
+        if mailbox.worker is None or mailbox.worker.done():
+            mailbox.worker = asyncio.create_task(self._drain(sender_id, mailbox))
+        return future
+
+    async def _wait_for_quiet(self, mailbox: _Mailbox) -> None:
+        """
+        Waits until no new message has arrived for the debounce window (capped by max_delay).
+        """
+        loop = asyncio.get_running_loop()
+        give_up_at = loop.time() + self.max_delay_seconds
+        while len(mailbox.messages) < self.max_batch and not self._closing:
+            mailbox.arrived.clear()
+            timeout = min(self.debounce_seconds, give_up_at - loop.time())
+            if timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(mailbox.arrived.wait(), timeout)
+            except asyncio.TimeoutError:
+                return
+
+    async def _drain(self, sender_id: str, mailbox: _Mailbox) -> None:
+        batch = []
+        try:
+            while mailbox.messages:
+                await self._wait_for_quiet(mailbox)
+
+                batch = []
+                while mailbox.messages and len(batch) < self.max_batch:
+                    batch.append(mailbox.messages.popleft())
+
+                merged_text = "\n".join(text for _, text, _ in batch)
+                self.turns += 1
+                self.merged += len(batch) - 1
+                try:
+                    # One trace per turn; the worker task would otherwise stay in the first job's trace
+                    with trace("mailbox.turn"):
+                        await self.handler(sender_id, merged_text)
+                    ok = True
+                except Exception as e:
+                    logger.exception("Error handling messages", extra={"sender_id": sender_id})
+                    self.failures += 1
+                    ok = False
+
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result(ok)
+        except asyncio.CancelledError:
+            # Cut off by close(): the waiters see the cancellation and their jobs are released
+            for _, _, future in [*batch, *mailbox.messages]:
+                future.cancel()
+            mailbox.messages.clear()
+            raise
+        finally:
+            if self._mailboxes.get(sender_id) is mailbox and not mailbox.messages:
+                del self._mailboxes[sender_id]
+
+    async def close(self, grace_seconds: float = 10.0) -> None:
+        """
+        Handles the queued messages without waiting out the debounce, for up to a grace
+        period, then cancels the turns still running. Nothing is sent after this returns.
+        """
+        self._closing = True
+        for mailbox in self._mailboxes.values():
+            mailbox.arrived.set()
+        workers = [m.worker for m in self._mailboxes.values() if m.worker is not None]
+        if not workers:
+            return
+        done, pending = await asyncio.wait(workers, timeout=grace_seconds)
+        for worker in pending:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "active_senders": self.active_mailboxes,
+            "queued_messages": sum(len(m.messages) for m in self._mailboxes.values()),
+            "received": self.received,
+            "turns": self.turns,
+            "merged": self.merged,
+            "failures": self.failures,
+        }
@@ -0,0 +1,148 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+
+def estimate_history_bytes(chat: Any) -> int:
+    """
+    Approximate size of a ChatSession's history: the serialized size of each Content message.
+    """
+    total = 0
+    for content in getattr(chat, "history", None) or []:
+        try:
+            total += type(content).pb(content).ByteSize()
+        except Exception:
+            total += len(str(content))
+    return total
+
+
+@dataclass
+class _Entry:
+    chat: Any
+    last_used: float
+    size: int = 0
+
+
+class ChatSessionStore:
+    """
+    Bounded store for Gemini ChatSession objects, keyed by session_id.
+    Sessions idle for longer than the TTL are dropped, and the least recently used ones
+    are evicted once the session count or the estimated history size goes over its cap.
+    """
+
+    def __init__(self, max_sessions: int, max_bytes: int, idle_ttl_seconds: float):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+
+        # Stats
+        self.created = 0
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._entries
+
+    @property
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, session_id: str) -> Optional[Any]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if now - entry.last_used > self.idle_ttl_seconds:
+            self._remove(session_id)
+            self.evicted_idle += 1
+            return None
+        entry.last_used = now
+        self._entries.move_to_end(session_id)
+        return entry.chat
+
+    def get_or_create(self, session_id: str, factory: Callable[[], Any]) -> Any:
+        chat = self.get(session_id)
+        if chat is None:
+            chat = factory()
+            self.put(session_id, chat)
+        return chat
+
+    def put(self, session_id: str, chat: Any) -> None:
+        if session_id in self._entries:
+            self._remove(session_id)
+        size = estimate_history_bytes(chat)
+        self._entries[session_id] = _Entry(chat=chat, last_used=time.monotonic(), size=size)
+        self._bytes += size
+        self.created += 1
+        self._enforce_limits(keep=session_id)
+
+    def record(self, session_id: str) -> None:
+        """
+        Re-measures a session's history after a turn and applies the caps.
+        """
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return
+        size = estimate_history_bytes(entry.chat)
+        self._bytes += size - entry.size
+        entry.size = size
+        entry.last_used = time.monotonic()
+        self._entries.move_to_end(session_id)
+        self._enforce_limits(keep=session_id)
+
+    def count(self, prefix: str) -> int:
+        """
+        Sessions whose id starts with prefix (e.g. one channel's); scans every entry.
+        """
+        return sum(1 for session_id in self._entries if session_id.startswith(prefix))
+
+    def discard(self, session_id: str) -> None:
+        if session_id in self._entries:
+            self._remove(session_id)
+
+    def evict_expired(self) -> int:
+        """
+        Drops idle sessions. Entries are kept in LRU order, so this stops at the first fresh one.
+        """
+        cutoff = time.monotonic() - self.idle_ttl_seconds
+        evicted = 0
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if entry.last_used >= cutoff:
+                break
+            self._remove(session_id)
+            evicted += 1
+        self.evicted_idle += evicted
+        return evicted
+
+    def _remove(self, session_id: str) -> None:
+        entry = self._entries.pop(session_id)
+        self._bytes -= entry.size
+
+    def _enforce_limits(self, keep: str) -> None:
+        self.evict_expired()
+        while len(self._entries) > self.max_sessions or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                # Never evict the session whose turn is running
+                break
+            self._remove(oldest)
+            self.evicted_lru += 1
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._entries),
+            "history_bytes": self._bytes,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+            "idle_ttl_seconds": self.idle_ttl_seconds,
+            "created": self.created,
+            "evicted_idle": self.evicted_idle,
+            "evicted_lru": self.evicted_lru,
+        }
@@ -0,0 +1,140 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+
+# Lower value goes first
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+
+
+class ShopifyRateLimiter:
+    """
+    Client-side mirror of Shopify's leaky-bucket REST limit, shared by every ShopifyClient.
+    The bucket level is estimated locally (leaking at leak_rate per second) and corrected from
+    the X-Shopify-Shop-Api-Call-Limit header of each response. Requests wait here instead of
+    tripping a 429; waiting writes go before reads, and the last `write_reserve` slots are
+    only handed to writes so a draft order is never stuck behind catalog pages.
+    """
+
+    def __init__(self, bucket_size: int, leak_rate: float, write_reserve: int):
+        self.bucket_size = bucket_size
+        self.leak_rate = leak_rate
+        self.write_reserve = write_reserve
+
+        self._level = 0.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        # Stats
+        self.granted = 0
+        self.waited = 0
+        self.throttled = 0
+
+    def _leak(self) -> float:
+        now = time.monotonic()
+        self._level = max(0.0, self._level - (now - self._updated) * self.leak_rate)
+        self._updated = now
+        return now
+
+    def _limit_for(self, priority: int) -> float:
+        if priority == PRIORITY_WRITE:
+            return self.bucket_size
+        return self.bucket_size - self.write_reserve
+
+    async def acquire(self, priority: int = PRIORITY_READ) -> None:
+        """
+        Waits until a request of the given priority may be sent, then takes a slot in the bucket.
+        """
+        now = self._leak()
+        if not self._waiters and now >= self._paused_until and self._level + 1 <= self._limit_for(priority):
+            self._level += 1
+            self.granted += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.waited += 1
+        self._dispatch()
+        await future
+
+    def _dispatch(self) -> None:
+        now = self._leak()
+        while self._waiters and now >= self._paused_until:
+            priority, _, future = self._waiters[0]
+            if future.done():  # cancelled while waiting
+                heapq.heappop(self._waiters)
+                continue
+            if self._level + 1 > self._limit_for(priority):
+                break
+            heapq.heappop(self._waiters)
+            self._level += 1
+            self.granted += 1
+            future.set_result(None)
+
+        if self._waiters and self._timer is None:
+            priority = self._waiters[0][0]
+            delay = max(
+                self._paused_until - now,
+                (self._level + 1 - self._limit_for(priority)) / self.leak_rate,
+                0.01,
+            )
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def update_from_headers(self, headers) -> None:
+        """
+        Syncs the estimate with Shopify's own count, e.g. "X-Shopify-Shop-Api-Call-Limit: 32/40".
+        """
+        value = headers.get("X-Shopify-Shop-Api-Call-Limit")
+        if not value:
+            return
+        try:
+            used, size = (int(x) for x in value.split("/"))
+        except ValueError:
+            return
+        self._leak()
+        self._level = float(used)
+        self.bucket_size = size
+
+    def pause(self, seconds: float) -> None:
+        """
+        Holds every request back after a 429 (Retry-After).
+        """
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._waiters:
+            self._dispatch()
+
+    def stats(self) -> dict:
+        self._leak()
+        now = time.monotonic()
+        return {
+            "bucket_size": self.bucket_size,
+            "level": round(self._level, 2),
+            "write_reserve": self.write_reserve,
+            "waiting": sum(1 for _, _, f in self._waiters if not f.done()),
+            "paused_for": round(max(0.0, self._paused_until - now), 2),
+            "granted": self.granted,
+            "waited": self.waited,
+            "throttled": self.throttled,
+        }
+
+
+shopify_rate_limiter = ShopifyRateLimiter(
+    bucket_size=settings.SHOPIFY_BUCKET_SIZE,
+    leak_rate=settings.SHOPIFY_LEAK_RATE,
+    write_reserve=settings.SHOPIFY_WRITE_RESERVE,
+)
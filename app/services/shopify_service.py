@@ -1,156 +1,417 @@
+import asyncio
 import httpx
-from typing import List, Optional
-import re
+import json
+import logging
+import random
+from typing import AsyncIterator, List, Optional
 from app.core.config import settings
+from app.core.http import SHOPIFY, http_clients
+from app.core.tracing import traced
 from app.schemas.product import Product
+from app.services.catalog_cache import PageCallback, catalog_cache
+from app.services.product_render_cache import product_render_cache
+from app.services.search_index import normalize_turkish
+from app.services.shopify_rate_limiter import PRIORITY_READ, PRIORITY_WRITE, shopify_rate_limiter
 
 from app.db.database import SessionLocal
 from app.services.order_service import OrderService
 
+logger = logging.getLogger(__name__)
+
+BULK_PRODUCTS_QUERY = """
+{
+  products(query: "status:active") {
+    edges {
+      node {
+        id
+        title
+        handle
+        bodyHtml
+        productType
+        vendor
+        updatedAt
+        variants {
+          edges {
+            node {
+              id
+              title
+              price
+              sku
+              inventoryQuantity
+              inventoryPolicy
+              inventoryItem { tracked }
+            }
+          }
+        }
+        images {
+          edges {
+            node { url altText }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+BULK_RUN_MUTATION = """
+mutation RunBulk($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+BULK_POLL_QUERY = """
+{
+  currentBulkOperation {
+    id
+    status
+    errorCode
+    objectCount
+    url
+  }
+}
+"""
+
+async def _iter_jsonl(response: httpx.Response) -> AsyncIterator[dict]:
+    """
+    Yields the objects of a streamed JSONL body. Each network chunk's complete lines are
+    decoded with a single json.loads call (much cheaper than one call per line on a large
+    export), and only one partial line is ever buffered.
+    """
+    buffer = b""
+    async for chunk in response.aiter_bytes():
+        lines = (buffer + chunk).split(b"\n")
+        buffer = lines.pop()
+        lines = [line for line in lines if line.strip()]
+        if lines:
+            for node in json.loads(b"[" + b",".join(lines) + b"]"):
+                yield node
+    if buffer.strip():
+        yield json.loads(buffer)
+
+def _gid_to_int(gid: str) -> int:
+    # "gid://shopify/Product/123" -> 123
+    return int(gid.rsplit("/", 1)[-1])
+
+def _bulk_product_data(node: dict) -> dict:
+    """
+    Maps a GraphQL product line to the REST shape the Product schema expects.
+    """
+    return {
+        "id": _gid_to_int(node["id"]),
+        "title": node.get("title"),
+        "body_html": node.get("bodyHtml"),
+        "handle": node.get("handle"),
+        "product_type": node.get("productType"),
+        "vendor": node.get("vendor"),
+        "updated_at": node.get("updatedAt"),
+        "variants": [],
+        "images": [],
+    }
+
+def _bulk_variant_data(node: dict) -> dict:
+    tracked = (node.get("inventoryItem") or {}).get("tracked")
+    return {
+        "id": _gid_to_int(node["id"]),
+        "title": node.get("title"),
+        "price": node.get("price"),
+        "inventory_quantity": node.get("inventoryQuantity") or 0,
+        "inventory_policy": (node.get("inventoryPolicy") or "DENY").lower(),
+        "inventory_management": "shopify" if tracked else None,
+        "sku": node.get("sku"),
+    }
+
 class ShopifyClient:
     def __init__(self):
-        self.base_url = f"https://{settings.SHOPIFY_STORE_URL}/admin/api/{settings.SHOPIFY_API_VERSION}"
+        self.base_url = settings.SHOPIFY_API_BASE_URL or f"https://{settings.SHOPIFY_STORE_URL}/admin/api/{settings.SHOPIFY_API_VERSION}"
         self.headers = {
             "X-Shopify-Access-Token": settings.SHOPIFY_ACCESS_TOKEN,
             "Content-Type": "application/json"
         }
 
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        priority: int = PRIORITY_READ,
+        idempotent: bool = True,
+        **kwargs
+    ) -> httpx.Response:
+        """
+        Sends a request through the shared rate limiter.
+        429s are retried after Retry-After (Shopify rejected the call, so even a POST is safe to resend).
+        Network errors and 5xx are retried with jittered backoff for idempotent calls only.
+        """
+        client = http_clients.get(SHOPIFY)
+        max_retries = settings.SHOPIFY_MAX_RETRIES
+
+        for attempt in range(max_retries + 1):
+            await shopify_rate_limiter.acquire(priority)
+            try:
+                response = await client.request(method, url, headers=self.headers, **kwargs)
+            except httpx.TransportError:
+                if not idempotent or attempt == max_retries:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            shopify_rate_limiter.update_from_headers(response.headers)
+
+            if response.status_code == 429 and attempt < max_retries:
+                try:
+                    retry_after = float(response.headers.get("Retry-After", 1.0))
+                except ValueError:
+                    retry_after = 1.0
+                logger.warning("Shopify rate limit (429), %ss bekleniyor.", retry_after)
+                shopify_rate_limiter.pause(retry_after)
+                continue
+
+            if response.status_code >= 500 and idempotent and attempt < max_retries:
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def _backoff(self, attempt: int) -> float:
+        return settings.SHOPIFY_RETRY_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    @traced("shopify.check_connection")
     async def check_connection(self) -> dict:
         """
         Verifies connection to Shopify by fetching shop details.
         """
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(
-                    f"{self.base_url}/shop.json",
-                    headers=self.headers
-                )
-                response.raise_for_status() 
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                raise Exception(f"Shopify API Error: {e.response.status_code} - {e.response.text}") from e
-            except httpx.RequestError as e:
-                raise Exception(f"Network Error during Shopify connection check: {str(e)}") from e
-            except Exception as e:
-                raise Exception(f"Unexpected error connecting to Shopify: {str(e)}") from e
+        try:
+            response = await self._request("GET", f"{self.base_url}/shop.json")
+            return response.json()
+        except httpx.HTTPStatusError as e:
+            raise Exception(f"Shopify API Error: {e.response.status_code} - {e.response.text}") from e
+        except httpx.RequestError as e:
+            raise Exception(f"Network Error during Shopify connection check: {str(e)}") from e
+        except Exception as e:
+            raise Exception(f"Unexpected error connecting to Shopify: {str(e)}") from e
 
     def normalize_turkish(self, text: str) -> str:
         """
         Turkish compliant normalization.
         Maps İ -> i and ı -> i to handle case-insensitive matching correctly.
         """
-        if not text:
-            return ""
-        return text.replace('İ', 'i').replace('ı', 'i').lower()
+        return normalize_turkish(text)
+
+    def _parse_products(self, data: dict) -> List[Product]:
+        products = []
+        for p_data in data.get("products", []):
+            try:
+                products.append(Product(**p_data))
+            except Exception as e:
+                logger.warning("Bir ürün verisi işlenemedi: %s - Hata: %s", p_data.get('title', 'Bilinmiyor'), e)
+                continue
+        return products
+
+    def _decode_page(self, response: httpx.Response) -> List[Product]:
+        return self._parse_products(response.json())
+
+    async def iter_product_pages(self, page_size: int = 250) -> AsyncIterator[List[Product]]:
+        """
+        Walks the whole active catalog following Shopify's cursor pagination (Link header / page_info).
+        Each page is decoded on its own and yielded as soon as it is parsed, so only one raw page is held at a time.
+        With CATALOG_PREFETCH_PAGES the next page is requested while the current one is being decoded.
+        """
+        prefetch = settings.CATALOG_PREFETCH_PAGES
+
+        async def fetch(url: str, params: Optional[dict]) -> httpx.Response:
+            return await self._request("GET", url, params=params)
+
+        pending = asyncio.create_task(
+            fetch(f"{self.base_url}/products.json", {"limit": page_size, "status": "active"})
+        )
+        try:
+            while pending is not None:
+                response = await pending
+                pending = None
+
+                # The cursor lives in the headers, so the next request can start before this body is decoded
+                next_url = response.links.get("next", {}).get("url")
+                if next_url and prefetch:
+                    pending = asyncio.create_task(fetch(next_url, None))
+
+                if pending is not None:
+                    # Decode off the event loop so the prefetch request actually goes out meanwhile
+                    page = await asyncio.to_thread(self._decode_page, response)
+                else:
+                    page = self._decode_page(response)
+                del response
+                yield page
+
+                if next_url and not prefetch:
+                    pending = asyncio.create_task(fetch(next_url, None))
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+
+    @traced("shopify.fetch_products")
+    async def fetch_products(self, on_page: Optional[PageCallback] = None) -> List[Product]:
+        """
+        Downloads the full active catalog from Shopify (REST pages or a GraphQL bulk operation, per CATALOG_SYNC_MODE).
+        on_page, if given, is awaited with the products loaded so far after each page.
+        """
+        if settings.CATALOG_SYNC_MODE == "bulk":
+            return await self.fetch_products_bulk(on_page)
+
+        logger.info("Shopify'dan ürünler çekiliyor...")
+
+        all_products = []
+        pages = 0
+        async for page in self.iter_product_pages():
+            all_products.extend(page)
+            pages += 1
+            if on_page is not None:
+                await on_page(all_products)
+
+        logger.info("Toplam %d ürün (%d sayfa) hafızaya alındı.", len(all_products), pages)
+        return all_products
+
+    async def _graphql(self, query: str, variables: Optional[dict] = None) -> dict:
+        response = await self._request(
+            "POST", f"{self.base_url}/graphql.json", json={"query": query, "variables": variables or {}}
+        )
+        body = response.json()
+        if body.get("errors"):
+            raise Exception(f"Shopify GraphQL Error: {body['errors']}")
+        return body.get("data", {})
 
+    async def run_bulk_product_export(self) -> Optional[str]:
+        """
+        Starts a bulk operation exporting the active catalog and polls until it finishes.
+        Returns the JSONL download URL (None for an empty store).
+        """
+        data = await self._graphql(BULK_RUN_MUTATION, {"query": BULK_PRODUCTS_QUERY})
+        result = data.get("bulkOperationRunQuery", {})
+        if result.get("userErrors"):
+            raise Exception(f"Bulk operation could not start: {result['userErrors']}")
+        operation_id = result.get("bulkOperation", {}).get("id")
+        logger.info("Shopify bulk operation başladı: %s", operation_id)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.CATALOG_BULK_TIMEOUT_SECONDS
+        while True:
+            await asyncio.sleep(settings.CATALOG_BULK_POLL_SECONDS)
+            operation = (await self._graphql(BULK_POLL_QUERY)).get("currentBulkOperation") or {}
+            if operation.get("id") != operation_id:
+                raise Exception(f"Bulk operation {operation_id} was replaced by {operation.get('id')}")
+            status = operation.get("status")
+            if status == "COMPLETED":
+                logger.info("Bulk operation tamamlandı (%s nesne).", operation.get('objectCount'))
+                return operation.get("url")
+            if status in ("FAILED", "CANCELED", "EXPIRED"):
+                raise Exception(f"Bulk operation {status}: {operation.get('errorCode')}")
+            if loop.time() > deadline:
+                raise Exception(f"Bulk operation did not finish in {settings.CATALOG_BULK_TIMEOUT_SECONDS}s")
+
+    async def iter_bulk_products(self, url: str) -> AsyncIterator[Product]:
+        """
+        Streams the bulk operation's JSONL result line by line.
+        Child lines (variants, images) follow their product and point to it with __parentId,
+        so a product is complete, and yielded, as soon as the next product line shows up.
+        """
+        client = http_clients.get(SHOPIFY)
+        current: Optional[dict] = None
+        current_gid = None
+
+        # The result is a signed storage URL; it must not get the Shopify token
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            async for node in _iter_jsonl(response):
+                parent = node.get("__parentId")
+
+                if parent is None:
+                    if current is not None:
+                        product = self._parse_bulk_product(current)
+                        if product is not None:
+                            yield product
+                    current, current_gid = _bulk_product_data(node), node["id"]
+                elif parent == current_gid:
+                    if "/ProductVariant/" in node.get("id", ""):
+                        current["variants"].append(_bulk_variant_data(node))
+                    elif node.get("url"):
+                        current["images"].append({"src": node["url"], "alt": node.get("altText")})
+                else:
+                    logger.warning("Bulk satırı beklenmeyen üst kayda bağlı: %s", parent)
+
+        if current is not None:
+            product = self._parse_bulk_product(current)
+            if product is not None:
+                yield product
+
+    def _parse_bulk_product(self, data: dict) -> Optional[Product]:
+        try:
+            return Product(**data)
+        except Exception as e:
+            logger.warning("Bir ürün verisi işlenemedi: %s - Hata: %s", data.get('title', 'Bilinmiyor'), e)
+            return None
+
+    async def fetch_products_bulk(self, on_page: Optional[PageCallback] = None, page_size: int = 250) -> List[Product]:
+        """
+        Downloads the full active catalog with a GraphQL bulk operation.
+        on_page is awaited every page_size products, as with the REST pages.
+        """
+        logger.info("Shopify'dan ürünler bulk operation ile çekiliyor...")
+        url = await self.run_bulk_product_export()
+        if not url:
+            return []
+
+        all_products = []
+        async for product in self.iter_bulk_products(url):
+            all_products.append(product)
+            if on_page is not None and len(all_products) % page_size == 0:
+                await on_page(all_products)
+        logger.info("Toplam %d ürün (bulk) hafızaya alındı.", len(all_products))
+        return all_products
+
+    @traced("shopify.search_products")
     async def search_products(self, query: str = None, limit: int = 10) -> str:
         """
-        Searches for products in Shopify and returns a human-readable string.
-        Uses a scoring system for fuzzy matching (best effort).
+        Searches for products in the cached catalog snapshot and returns a human-readable string.
+        Ranking comes from the BM25 index built with the snapshot (see search_index.py).
         """
-        print(f"DEBUG: Searching Shopify for: {query}")
-        
-        request_params = {"limit": 250, "status": "active"}
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                print(f"DEBUG: Shopify'dan ürünler çekiliyor... (Limit: 250)")
-                
-                response = await client.get(
-                    f"{self.base_url}/products.json",
-                    headers=self.headers,
-                    params=request_params 
-                )
-                response.raise_for_status()
-                data = response.json()
-        
-                all_products = []
-                for p_data in data.get("products", []):
-                    try:
-                        all_products.append(Product(**p_data))
-                    except Exception as e:
-                        print(f"UYARI: Bir ürün verisi işlenemedi: {p_data.get('title', 'Bilinmiyor')} - Hata: {e}")
-                        continue
-        
-                print(f"DEBUG: Toplam {len(all_products)} ürün hafızaya alındı.")
+        logger.debug("Product search", extra={"query": query})
+
+        try:
+            index = await catalog_cache.get_index(self.fetch_products)
 
-                # Fuzzy / Scoring Search Algorithm
+            if query:
+                scored_results = index.search(query, limit=limit)
+                results = [item[1] for item in scored_results]
+            else:
                 scored_results = []
-                
-                if query:
-                    # Normalize query using custom Turkish logic
-                    query_lower = self.normalize_turkish(query)
-                    query_parts = query_lower.split() 
-                    
-                    for p in all_products:
-                        title_lower = self.normalize_turkish(p.title)
-                        score = 0
-                        
-                        # Check matches for each word
-                        for part in query_parts:
-                            if part in title_lower:
-                                score += 1
-                        
-                        # Bonus for exact sequence
-                        if query_lower in title_lower:
-                            score += 2
-                            
-                        if score > 0:
-                            scored_results.append((score, p))
-                    
-                    # Sort: Highest Score first, then shortest title
-                    scored_results.sort(key=lambda x: (-x[0], len(x[1].title)))
-                    results = [item[1] for item in scored_results]
-                else:
-                    results = all_products
+                results = index.products[:limit]
 
-                results = results[:limit]
-                count = len(results)
-                
-                top_score = scored_results[0][0] if scored_results else 0
-                print(f"DEBUG: Found {count} products. Top Score: {top_score}")
-
-                if count == 0:
-                    return "Aradığınız kriterde ürün bulunamadı. Lütfen ürün adını veya rengini değiştirip tekrar deneyiniz."
-
-                # Format Output
-                output_lines = []
-                if query:
-                    output_lines.append(f"🔍 '{query}' için arama sonuçları:\n")
-
-                for p in results:
-                    variant_info = []
-                    for v in p.variants:
-                        # Logic for stock display
-                        is_available = False
-                        
-                        if v.inventory_management is None:
-                            is_available = True
-                        elif v.inventory_quantity > 0:
-                            is_available = True
-                        elif v.inventory_policy == "continue":
-                            is_available = True
-                        
-                        status_text = "Mevcut" if is_available else "Tükendi"
-                        
-                        variant_line = f"   - Varyant ID: {v.id}, Seçenek: {v.title}, Fiyat: {v.price} TL, Durum: {status_text}"
-                        variant_info.append(variant_line)
-                    
-                    # Description Snippet
-                    desc_snippet = "Açıklama Yok"
-                    if p.body_html:
-                        clean_desc = re.sub('<[^<]+?>', '', p.body_html)
-                        desc_snippet = clean_desc[:300] + "..." if len(clean_desc) > 300 else clean_desc
-
-                    variants_str = "\n".join(variant_info)
-                    output_lines.append(f"Ürün: {p.title}\nÖzellikler: {desc_snippet}\n{variants_str}")
-                
-                return "\n".join(output_lines)
+            count = len(results)
 
-            except Exception as e:
-                print(f"Error searching products: {e}")
-                return "Ürün aranırken bir hata oluştu."
+            top_score = scored_results[0][0] if scored_results else 0
+            logger.debug("Product search results", extra={"query": query, "count": count, "top_score": round(top_score, 2)})
+
+            if count == 0:
+                return "Aradığınız kriterde ürün bulunamadı. Lütfen ürün adını veya rengini değiştirip tekrar deneyiniz."
+
+            # Format Output
+            output_lines = []
+            if query:
+                output_lines.append(f"🔍 '{query}' için arama sonuçları:\n")
 
+            # Product blocks are rendered once per product version (see product_render_cache.py)
+            output_lines.extend(product_render_cache.get(p) for p in results)
+
+            return "\n".join(output_lines)
+
+        except Exception as e:
+            logger.exception("Error searching products")
+            return "Ürün aranırken bir hata oluştu."
+
+    @traced("shopify.create_draft_order")
     async def create_draft_order(
         self, 
         variant_id: int, 
@@ -202,20 +463,21 @@ class ShopifyClient:
                 }
             }
             
-            async with httpx.AsyncClient() as client:
-                try:
-                    print(f"DEBUG: Creating Shopify Draft Order for {first_name} {last_name}")
-                    response = await client.post(
-                        f"{self.base_url}/draft_orders.json",
-                        headers=self.headers,
-                        json=payload
-                    )
-                    response.raise_for_status()
-                    data = response.json()
-                    invoice_url = data.get("draft_order", {}).get("invoice_url")
-                
-                except Exception as e:
-                    return f"Sipariş oluşturulurken hata oluştu: {str(e)}"
+            try:
+                logger.info("Creating Shopify draft order", extra={"variant_id": variant_id, "phone": phone})
+                # Orders go ahead of catalog reads and are never blindly resent
+                response = await self._request(
+                    "POST",
+                    f"{self.base_url}/draft_orders.json",
+                    priority=PRIORITY_WRITE,
+                    idempotent=False,
+                    json=payload
+                )
+                data = response.json()
+                invoice_url = data.get("draft_order", {}).get("invoice_url")
+            
+            except Exception as e:
+                return f"Sipariş oluşturulurken hata oluştu: {str(e)}"
 
         # 2. Save Order to Local Database (Always)
         try:
@@ -236,7 +498,7 @@ class ShopifyClient:
                     payment_method=pm_enum,
                     shopify_invoice_url=invoice_url
                 )
-                print(f"DEBUG: Order saved to database successfully.")
+                logger.info("Order saved to database", extra={"payment_method": payment_method})
                 
             if payment_method == "Kapıda Ödeme":
                 return "✅ Siparişiniz KAPIDA ÖDEME seçeneğiyle alınmıştır! Hazırlanıp en kısa sürede kargoya verilecektir. 📦"
@@ -246,5 +508,5 @@ class ShopifyClient:
                 return "Sipariş oluşturuldu ancak ödeme linki alınamadı."
                 
         except Exception as e:
-            print(f"ERROR: Could not save order to DB: {e}")
+            logger.exception("Could not save order to DB")
             return f"Sipariş kaydı sırasında hata oluştu: {str(e)}"
@@ -1,5 +1,9 @@
-import httpx
+import logging
 from app.core.config import settings
+from app.core.http import META, http_clients
+from app.core.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 class SocialService:
     def __init__(self):
@@ -7,11 +11,12 @@ class SocialService:
         self.wa_token = settings.META_ACCESS_TOKEN
         self.phone_number_id = settings.META_PHONE_ID
 
+    @traced("social.send_whatsapp_message")
     async def send_whatsapp_message(self, to_number: str, text: str):
         """
         Sends a WhatsApp message via Meta Graph API.
         """
-        url = f"https://graph.facebook.com/v17.0/{self.phone_number_id}/messages"
+        url = f"{settings.META_GRAPH_BASE_URL}/{self.phone_number_id}/messages"
         headers = {
             "Authorization": f"Bearer {self.wa_token}",
             "Content-Type": "application/json"
@@ -22,17 +27,17 @@ class SocialService:
             "text": {"body": text}
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                # Actual sending logic
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                print(f"DEBUG: WhatsApp Message SENT successfully to {to_number}. Status: {response.status_code}")
-                return response.json()
-            except Exception as e:
-                print(f"Error sending WhatsApp: {e}")
-                return None
+        client = http_clients.get(META)
+        try:
+            # Actual sending logic
+            response = await client.post(url, headers=headers, json=payload)
+            response.raise_for_status()
+            logger.debug("WhatsApp message sent", extra={"to_number": to_number, "status_code": response.status_code})
+            return response.json()
+        except Exception as e:
+            logger.error("Error sending WhatsApp: %s", e, extra={"to_number": to_number})
+            return None
 
     async def send_instagram_message(self, recipient_id: str, text: str):
-         print(f"[MOCK SOCIAL] Sending Instagram to {recipient_id}: {text}")
+         logger.info("[MOCK SOCIAL] Sending Instagram message", extra={"recipient_id": recipient_id, "chars": len(text)})
          return {"status": "mock_sent"}
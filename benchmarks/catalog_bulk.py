@@ -0,0 +1,85 @@
+"""
+Catalog sync benchmark: REST pagination vs. a GraphQL bulk operation streamed as JSONL.
+
+    python -m benchmarks.catalog_bulk --products 20000 --latency-ms 30
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+from benchmarks.common import serve_process
+from benchmarks.stubs import shopify_stub
+
+
+async def sync(mode: str, trace_memory: bool = False) -> tuple:
+    from app.core.config import settings
+    from app.core.http import http_clients
+    from app.services.shopify_service import ShopifyClient
+
+    settings.CATALOG_SYNC_MODE = mode
+    settings.CATALOG_BULK_POLL_SECONDS = 0.05
+    client = ShopifyClient()
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    products = await client.fetch_products()
+    elapsed = time.perf_counter() - start
+    await http_clients.close()
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return len(products), elapsed, peak
+
+
+async def stream_only() -> tuple:
+    """
+    Parses the bulk result without keeping the products: the memory cost of the parser itself.
+    """
+    from app.core.http import http_clients
+    from app.services.shopify_service import ShopifyClient
+
+    client = ShopifyClient()
+    url = await client.run_bulk_product_export()
+    tracemalloc.start()
+    count = 0
+    async for _ in client.iter_bulk_products(url):
+        count += 1
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await http_clients.close()
+    return count, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with serve_process(shopify_stub.create_app, product_count=args.products, latency_ms=args.latency_ms) as url:
+        os.environ["SHOPIFY_API_BASE_URL"] = f"{url}/admin/api/2024-01"
+        # Warm the stub caches so both modes see the same server cost
+        asyncio.run(sync("rest"))
+        asyncio.run(sync("bulk"))
+
+        print(f"{args.products} products, {args.latency_ms:.0f} ms stub latency per REST page")
+        for mode in ("rest", "bulk"):
+            timings = [asyncio.run(sync(mode))[1] for _ in range(args.rounds)]
+            count, _, peak = asyncio.run(sync(mode, trace_memory=True))
+            best = min(timings)
+            print(
+                f"  mode={mode:4}  products={count}  sync_best={best:.2f}s  "
+                f"throughput={count / best:,.0f}/s  peak_mem={peak / 1024 / 1024:.1f} MiB"
+            )
+
+        count, peak = asyncio.run(stream_only())
+        print(f"  bulk stream only (products discarded)  products={count}  peak_mem={peak / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Full-catalog ingest benchmark: ShopifyClient.fetch_products against a local stub.
+
+    python -m benchmarks.catalog_ingest --products 20000 --latency-ms 30
+"""
+import argparse
+import asyncio
+import os
+import time
+import tracemalloc
+
+from benchmarks.common import serve_process
+from benchmarks.stubs import shopify_stub
+
+
+async def ingest(prefetch: bool, trace_memory: bool = False) -> tuple:
+    from app.core.config import settings
+    from app.core.http import http_clients
+    from app.services.shopify_service import ShopifyClient
+
+    settings.CATALOG_PREFETCH_PAGES = prefetch
+    client = ShopifyClient()
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    products = await client.fetch_products()
+    elapsed = time.perf_counter() - start
+    # Pooled connections belong to this event loop
+    await http_clients.close()
+    peak = 0
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return len(products), elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--latency-ms", type=float, default=30.0)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with serve_process(shopify_stub.create_app, product_count=args.products, latency_ms=args.latency_ms) as url:
+        os.environ["SHOPIFY_API_BASE_URL"] = f"{url}/admin/api/2024-01"
+        # Warm the stub's page cache so both modes see the same server cost
+        asyncio.run(ingest(prefetch=True))
+
+        print(f"{args.products} products, {args.latency_ms:.0f} ms stub latency per page")
+        for prefetch in (False, True):
+            timings = [asyncio.run(ingest(prefetch))[1] for _ in range(args.rounds)]
+            count, _, peak = asyncio.run(ingest(prefetch, trace_memory=True))
+            print(
+                f"  prefetch={str(prefetch):5}  products={count}  "
+                f"ingest_best={min(timings):.2f}s  peak_mem={peak / 1024 / 1024:.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Cold-start benchmark: how long a fresh app process takes to import and to start accepting
+requests, and how slow its first requests are compared to the ones after.
+
+    python -m benchmarks.cold_start --runs 5
+    python -m benchmarks.cold_start --no-warmup     # STARTUP_WARMUP=false
+
+Each run starts uvicorn in a new interpreter (nothing inherited from this process) against
+the Shopify and Graph stubs, waits until the port accepts connections (uvicorn binds after
+the lifespan has finished), then sends one product search and one chat turn that searches
+the catalog, each twice. The Gemini stub is installed before the app is imported, which loads
+the SDK up front, so "ready" includes the SDK import either way; the "import" column is
+measured separately in a bare interpreter.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.common import free_port, process_memory_mib, start_process
+
+# The first chat turn goes through search_products, i.e. the catalog and the Shopify pool
+CHAT_MESSAGE = "ikra elbise var mı"
+COLUMNS = ("import", "ready", "search_1", "search_2", "chat_1", "chat_2")
+
+
+def create_app():
+    # Runs in the server process (uvicorn --factory); keep this module's imports light
+    from benchmarks.stubs import gemini_stub
+
+    gemini_stub.install(latency_ms=float(os.environ.get("COLD_START_GEMINI_LATENCY_MS", "0")))
+    from app.main import app
+
+    return app
+
+
+def measure_import() -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1])
+
+
+def wait_for_port(port: int, proc: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline or proc.poll() is not None:
+                raise RuntimeError("app did not start")
+            time.sleep(0.01)
+
+
+def run_once(env: dict) -> tuple:
+    import httpx
+
+    port = free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.cold_start:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log"],
+        env=env,
+    )
+    try:
+        wait_for_port(port, proc)
+        result = {"ready": time.perf_counter() - start}
+        memory = process_memory_mib(proc.pid)
+
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120) as client:
+            for i in (1, 2):
+                t = time.perf_counter()
+                client.get("/api/v1/products/search", params={"q": "elbise"}).raise_for_status()
+                result[f"search_{i}"] = time.perf_counter() - t
+            for i in (1, 2):
+                t = time.perf_counter()
+                response = client.post("/api/v1/chat/", json={"message": CHAT_MESSAGE, "session_id": f"cold-{i}"})
+                response.raise_for_status()
+                result[f"chat_{i}"] = time.perf_counter() - t
+        return result, memory
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--shopify-latency-ms", type=float, default=80)
+    parser.add_argument("--graph-latency-ms", type=float, default=60)
+    parser.add_argument("--gemini-latency-ms", type=float, default=400)
+    parser.add_argument("--no-warmup", action="store_true", help="start with STARTUP_WARMUP=false")
+    args = parser.parse_args()
+
+    from benchmarks.stubs import graph_stub, shopify_stub
+
+    shop_proc, shop_url = start_process(
+        shopify_stub.create_app, product_count=args.products, latency_ms=args.shopify_latency_ms, jitter_ms=0,
+    )
+    graph_proc, graph_url = start_process(graph_stub.create_app, latency_ms=args.graph_latency_ms)
+    tmp = tempfile.TemporaryDirectory()
+    try:
+        env = {
+            **os.environ,
+            "SHOPIFY_API_BASE_URL": f"{shop_url}/admin/api/2024-01",
+            "META_GRAPH_BASE_URL": f"{graph_url}/v17.0",
+            "DATABASE_URL": f"sqlite+aiosqlite:///{tmp.name}/cold_start.db",
+            "COLD_START_GEMINI_LATENCY_MS": str(args.gemini_latency_ms),
+            "STARTUP_WARMUP": "false" if args.no_warmup else "true",
+        }
+        env.setdefault("LOG_LEVEL", "ERROR")
+        # measure_import runs in a child with the same settings
+        os.environ.update(env)
+
+        print(
+            f"runs={args.runs}  products={args.products}  shopify={args.shopify_latency_ms:.0f}ms  "
+            f"gemini={args.gemini_latency_ms:.0f}ms  warm-up={'off' if args.no_warmup else 'on'}"
+        )
+        print("  " + "".join(f"{c:>11}" for c in ("run",) + COLUMNS) + "   rss at ready")
+        rows = []
+        for run in range(1, args.runs + 1):
+            result, memory = run_once(env)
+            result["import"] = measure_import()
+            rows.append(result)
+            print("  " + f"{run:>11}" + "".join(f"{result[c] * 1000:9.0f}ms" for c in COLUMNS)
+                  + f"   {memory['rss'] or 0:.0f} MiB")
+        print("  " + f"{'median':>11}" + "".join(
+            f"{statistics.median(r[c] for r in rows) * 1000:9.0f}ms" for c in COLUMNS
+        ))
+    finally:
+        for proc in (shop_proc, graph_proc):
+            proc.terminate()
+            proc.join(timeout=5)
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Shared helpers for the benchmark scripts.
+Run benchmarks from the repository root, e.g. `python -m benchmarks.catalog_ingest`.
+"""
+import contextlib
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+# Settings() needs these at import time; benchmarks never talk to the real services
+os.environ.setdefault("SHOPIFY_STORE_URL", "benchmark.myshopify.com")
+os.environ.setdefault("SHOPIFY_ACCESS_TOKEN", "benchmark")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def serve(app, port: int = None):
+    """
+    Runs an ASGI app with uvicorn on a background thread and yields its base URL.
+    """
+    import uvicorn
+
+    port = port or free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def _run_factory(factory, kwargs: dict, port: int) -> None:
+    import uvicorn
+
+    uvicorn.run(factory(**kwargs), host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+def start_process(factory, port: int = None, **kwargs) -> tuple:
+    """
+    Runs factory(**kwargs) with uvicorn in a child process and returns (process, base URL)
+    once it accepts connections. The caller terminates the process.
+    """
+    port = port or free_port()
+    proc = multiprocessing.Process(target=_run_factory, args=(factory, kwargs, port), daemon=True)
+    proc.start()
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline or not proc.is_alive():
+                proc.terminate()
+                raise RuntimeError("server did not start")
+            time.sleep(0.05)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+@contextlib.contextmanager
+def serve_process(factory, port: int = None, **kwargs):
+    """
+    Like serve(), but builds the app with factory(**kwargs) in a separate process
+    so the stub's CPU time and allocations do not skew the measurements.
+    """
+    proc, url = start_process(factory, port, **kwargs)
+    try:
+        yield url
+    finally:
+        proc.terminate()
+        proc.join(timeout=5)
+
+
+def process_memory_mib(pid: int) -> dict:
+    """
+    Current and peak resident memory of a process, from /proc (Linux only).
+    """
+    memory = {"rss": None, "peak": None}
+    with contextlib.suppress(OSError):
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    memory["rss"] = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    memory["peak"] = int(line.split()[1]) / 1024
+    return memory
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
@@ -0,0 +1,237 @@
+"""
+End-to-end load test: the app runs under uvicorn in its own process against local stand-ins
+for every external service, and is driven over HTTP at a fixed concurrency.
+
+  Shopify     stubs/shopify_stub.py (latency, jitter, leaky-bucket rate limit with 429s)
+  Gemini      stubs/gemini_stub.py (scripted text and function calls, installed in the app process)
+  Meta Graph  stubs/graph_stub.py (/messages, records when each reply arrives)
+
+    python -m benchmarks.load_test --concurrency 20 --requests 500
+    python -m benchmarks.load_test --scenarios webhook --gemini-latency-ms 800
+
+Scenarios:
+  chat     POST /api/v1/chat/; every virtual user keeps its own session and repeats a greeting,
+           a product question (search_products) and an order (draft order + DB write)
+  search   GET /api/v1/products/search (the catalog snapshot is loaded from the stub first)
+  webhook  POST /api/v1/webhooks/whatsapp, one message per sender; also reports the time until
+           the reply reaches the Graph stub (queue, debounce, model turn, send)
+
+Reports p50/p95/p99 latency, throughput, errors and the app process memory (RSS and peak).
+Other app settings can be overridden through the environment as usual.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import tempfile
+import time
+
+from benchmarks import common  # noqa: F401  (sets the env Settings() needs)
+from benchmarks.common import percentile, process_memory_mib, start_process
+from benchmarks.search_index import QUERIES
+from benchmarks.stubs import graph_stub, shopify_stub
+
+SCENARIOS = ("chat", "search", "webhook")
+CHAT_SCRIPT = ["merhaba", "ikra elbise var mı", "kırmızı 38 beden sipariş vermek istiyorum"]
+WEBHOOK_TEXTS = ["merhaba", "leyla tunik var mı", "siyah ferace", "defne etek var mı"]
+
+
+def create_app_under_test(gemini_latency_ms: float, gemini_jitter_ms: float):
+    # Runs in the app process; the AIService is created in the lifespan, after the patch
+    from benchmarks.stubs import gemini_stub
+
+    gemini_stub.install(latency_ms=gemini_latency_ms, jitter_ms=gemini_jitter_ms)
+    from app.main import app
+
+    return app
+
+
+async def drive(concurrency: int, requests: int, send) -> tuple:
+    """
+    Calls send(worker, i) for i in range(requests) from `concurrency` workers. send returns
+    None on success or an error label. Returns latencies (ms), error counts and elapsed seconds.
+    """
+    counter = itertools.count()
+    latencies, errors = [], {}
+
+    async def worker(w: int):
+        while (i := next(counter)) < requests:
+            start = time.perf_counter()
+            try:
+                error = await send(w, i)
+            except Exception as e:
+                error = type(e).__name__
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+            else:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def report(name: str, latencies: list, errors: dict, elapsed: float, memory: dict) -> None:
+    print(
+        f"  {name:10} ok={len(latencies):6}  errors={sum(errors.values()):4}  "
+        f"throughput={len(latencies) / elapsed:8.1f}/s  p50={percentile(latencies, 50):8.1f}ms  "
+        f"p95={percentile(latencies, 95):8.1f}ms  p99={percentile(latencies, 99):8.1f}ms  "
+        f"rss={memory['rss'] or 0:6.0f} MiB  peak={memory['peak'] or 0:6.0f} MiB"
+    )
+    if errors:
+        print(f"  {'':10} {errors}")
+
+
+async def run_chat(client, args) -> tuple:
+    turns = {}
+
+    async def send(w: int, i: int):
+        turn = turns.get(w, 0)
+        turns[w] = turn + 1
+        response = await client.post("/api/v1/chat/", json={
+            "message": CHAT_SCRIPT[turn % len(CHAT_SCRIPT)],
+            "session_id": f"load-{w}",
+        })
+        if response.status_code != 200:
+            return f"HTTP {response.status_code}"
+        # Tool and model failures come back as answer text
+        text = response.json()["response"].lower()
+        return "error text" if "hata" in text else None
+
+    return await drive(args.concurrency, args.requests, send)
+
+
+async def run_search(client, args) -> tuple:
+    async def send(w: int, i: int):
+        response = await client.get("/api/v1/products/search", params={"q": QUERIES[i % len(QUERIES)]})
+        return None if response.status_code == 200 else f"HTTP {response.status_code}"
+
+    return await drive(args.concurrency, args.requests, send)
+
+
+async def run_webhook(client, graph_url: str, args) -> tuple:
+    import httpx
+
+    posted = {}
+
+    async def send(w: int, i: int):
+        sender = f"90555{i:07d}"
+        posted[sender] = time.time()
+        response = await client.post("/api/v1/webhooks/whatsapp", json={
+            "object": "whatsapp_business_account",
+            "entry": [{"changes": [{"value": {"messages": [{
+                "from": sender,
+                "id": f"wamid.load.{i}",
+                "timestamp": str(int(time.time())),
+                "type": "text",
+                "text": {"body": WEBHOOK_TEXTS[i % len(WEBHOOK_TEXTS)]},
+            }]}}]}],
+        })
+        if response.status_code != 200 or response.json().get("status") != "received":
+            posted.pop(sender, None)
+            return f"HTTP {response.status_code}"
+        return None
+
+    result = await drive(args.concurrency, args.requests, send)
+
+    # Replies arrive at the Graph stub once the job workers have run the turns
+    deadline = time.monotonic() + args.drain_timeout
+    async with httpx.AsyncClient(base_url=graph_url) as graph:
+        while True:
+            received = (await graph.get("/stub/received")).json()
+            if len(received) >= len(posted) or time.monotonic() > deadline:
+                break
+            await asyncio.sleep(0.25)
+    replies = [(received[s][0] - t) * 1000 for s, t in posted.items() if s in received]
+    return result, replies
+
+
+async def run(args, app_url: str, graph_url: str, shop_url: str, app_pid: int) -> None:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        response = await client.get("/api/v1/products/search", params={"q": "elbise"})
+        response.raise_for_status()
+        print(f"  catalog warm-up ({args.products} products): {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        for scenario in args.scenarios:
+            if scenario == "chat":
+                report("chat", *await run_chat(client, args), process_memory_mib(app_pid))
+            elif scenario == "search":
+                report("search", *await run_search(client, args), process_memory_mib(app_pid))
+            elif scenario == "webhook":
+                (latencies, errors, elapsed), replies = await run_webhook(client, graph_url, args)
+                report("webhook", latencies, errors, elapsed, process_memory_mib(app_pid))
+                print(
+                    f"  {'':10} replies={len(replies)}/{len(latencies)}  reply p50={percentile(replies, 50):.0f}ms  "
+                    f"p95={percentile(replies, 95):.0f}ms  p99={percentile(replies, 99):.0f}ms"
+                )
+
+    async with httpx.AsyncClient(base_url=shop_url) as shop:
+        stats = (await shop.get("/stub/stats")).json()
+    print(f"  shopify stub: throttled (429)={stats['throttled']}  draft_orders={stats['draft_orders']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--shopify-latency-ms", type=float, default=80)
+    parser.add_argument("--shopify-jitter-ms", type=float, default=40)
+    parser.add_argument("--no-rate-limit", action="store_true", help="turn off the Shopify stub's leaky bucket")
+    parser.add_argument("--gemini-latency-ms", type=float, default=400)
+    parser.add_argument("--gemini-jitter-ms", type=float, default=300)
+    parser.add_argument("--graph-latency-ms", type=float, default=60)
+    parser.add_argument("--debounce", type=float, default=0.1, help="WHATSAPP_DEBOUNCE_SECONDS for the run")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for webhook replies")
+    args = parser.parse_args()
+
+    processes = []
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            shop_proc, shop_url = start_process(
+                shopify_stub.create_app,
+                product_count=args.products,
+                latency_ms=args.shopify_latency_ms,
+                jitter_ms=args.shopify_jitter_ms,
+                rate_limit=not args.no_rate_limit,
+            )
+            processes.append(shop_proc)
+            graph_proc, graph_url = start_process(graph_stub.create_app, latency_ms=args.graph_latency_ms)
+            processes.append(graph_proc)
+
+            # Inherited by the app process
+            os.environ.update({
+                "SHOPIFY_API_BASE_URL": f"{shop_url}/admin/api/2024-01",
+                "META_GRAPH_BASE_URL": f"{graph_url}/v17.0",
+                "DATABASE_URL": f"sqlite+aiosqlite:///{tmp}/load_test.db",
+                "WHATSAPP_DEBOUNCE_SECONDS": str(args.debounce),
+                "JOB_QUEUE_MAX_DEPTH": str(args.requests + 1000),
+            })
+            os.environ.setdefault("LOG_LEVEL", "ERROR")
+            app_proc, app_url = start_process(
+                create_app_under_test,
+                gemini_latency_ms=args.gemini_latency_ms,
+                gemini_jitter_ms=args.gemini_jitter_ms,
+            )
+            processes.append(app_proc)
+
+            print(
+                f"concurrency={args.concurrency}  requests/scenario={args.requests}  "
+                f"shopify={args.shopify_latency_ms:.0f}±{args.shopify_jitter_ms:.0f}ms"
+                f"{'' if args.no_rate_limit else ' (rate limited)'}  "
+                f"gemini={args.gemini_latency_ms:.0f}±{args.gemini_jitter_ms:.0f}ms  graph={args.graph_latency_ms:.0f}ms"
+            )
+            asyncio.run(run(args, app_url, graph_url, shop_url, app_proc.pid))
+        finally:
+            for proc in processes:
+                proc.terminate()
+                proc.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Cost of the built-in metrics: one histogram observation / counter increment, a request
+through MetricsMiddleware vs. the same app without it, and rendering /metrics.
+
+    python -m benchmarks.metrics_overhead --requests 5000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks import common  # noqa: F401  (sets the env Settings() needs)
+from benchmarks.common import percentile
+
+
+def per_call_ns(fn, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) * 1e9 / calls
+
+
+async def request_timings(app, requests: int) -> list:
+    import httpx
+
+    timings = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(requests):
+            start = time.perf_counter()
+            await client.get(f"/api/v1/admin/orders/{i}")
+            timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def build_app(instrumented: bool):
+    from fastapi import APIRouter, FastAPI
+    from app.core.metrics import MetricsMiddleware
+
+    router = APIRouter()
+
+    @router.get("/orders/{order_id}")
+    async def order(order_id: int):
+        return {"id": order_id}
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api/v1/admin")
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+def main():
+    from app.core.metrics import HTTP_SECONDS, UPSTREAM_ERRORS, UPSTREAM_SECONDS, registry
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    observe = per_call_ns(
+        lambda: UPSTREAM_SECONDS.observe(0.042, upstream="shopify", operation="GET products.json"), args.calls
+    )
+    inc = per_call_ns(lambda: UPSTREAM_ERRORS.inc(upstream="shopify", operation="GET products.json"), args.calls)
+    print(f"histogram observe   {observe:8.0f} ns/call")
+    print(f"counter inc         {inc:8.0f} ns/call")
+
+    for instrumented in (False, True):
+        timings = asyncio.run(request_timings(build_app(instrumented), args.requests))
+        label = "with middleware" if instrumented else "without middleware"
+        print(f"{label:20}p50={percentile(timings, 50):7.0f}us  p99={percentile(timings, 99):7.0f}us")
+
+    # A realistic scrape: a few dozen routes x statuses on top of the upstream series
+    for i in range(60):
+        HTTP_SECONDS.observe(0.01, method="GET", route=f"/api/v1/route{i}", status=200)
+    start = time.perf_counter()
+    body = registry.render()
+    print(f"render /metrics     {(time.perf_counter() - start) * 1000:8.2f} ms ({len(body.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
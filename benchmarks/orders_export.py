@@ -0,0 +1,70 @@
+"""
+Order export benchmark: time to first byte, total time and process peak RSS while
+downloading /api/v1/admin/orders/export from a large synthetic orders table.
+The server runs in this process, so a flat RSS across table sizes means the export
+does not grow with the row count.
+
+    python -m benchmarks.orders_export --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks import common  # noqa: F401  (sets the env Settings() needs)
+
+
+async def run(args) -> None:
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from benchmarks.orders_keyset import create_indexes, populate
+    from app.main import app
+    from benchmarks.common import serve
+
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    start = time.perf_counter()
+    await populate(engine, args.rows)
+    await create_indexes(engine)
+    await engine.dispose()
+    print(f"{args.rows} orders (loaded in {time.perf_counter() - start:.1f}s)")
+
+    # A real server: ASGITransport buffers the whole response body
+    with serve(app) as url:
+        await export(url)
+
+
+async def export(url: str) -> None:
+    import httpx
+
+    async with httpx.AsyncClient(base_url=url, timeout=None) as client:
+        for export_format in ("csv", "ndjson"):
+            start = time.perf_counter()
+            first_byte = None
+            size = 0
+            async with client.stream("GET", "/api/v1/admin/orders/export", params={"format": export_format}) as response:
+                async for chunk in response.aiter_raw():
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - start
+                    size += len(chunk)
+            elapsed = time.perf_counter() - start
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(
+                f"  {export_format:6}  first_byte={first_byte * 1000:.1f}ms  total={elapsed:.1f}s  "
+                f"size={size / 1024 / 1024:.0f} MiB  process_max_rss={peak:.0f} MiB"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # app.db.database reads DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/orders.db"
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
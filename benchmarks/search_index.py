@@ -0,0 +1,82 @@
+"""
+Search index benchmark: build time, memory and query latency on synthetic catalogs,
+compared with the old linear title scan.
+
+    python -m benchmarks.search_index --sizes 1000 20000 100000
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks import common  # noqa: F401  (sets the env Settings() needs)
+from benchmarks.common import percentile
+from benchmarks.stubs.shopify_stub import make_product
+
+QUERIES = [
+    "ikra", "ikra elbise", "kırmızı elbise 38", "keten tunik", "siyah ferace",
+    "viskon", "lale gömlek", "pudra 40", "şifon etek", "zeynep takım lacivert",
+]
+
+
+def legacy_scan(products, query, normalize):
+    """
+    The scorer search_products used before the index: substring matches on every title.
+    """
+    query_lower = normalize(query)
+    parts = query_lower.split()
+    scored = []
+    for p in products:
+        title_lower = normalize(p.title)
+        score = sum(1 for part in parts if part in title_lower)
+        if query_lower in title_lower:
+            score += 2
+        if score > 0:
+            scored.append((score, p))
+    scored.sort(key=lambda x: (-x[0], len(x[1].title)))
+    return scored[:10]
+
+
+def measure_queries(fn, rounds: int) -> list:
+    timings = []
+    for _ in range(rounds):
+        for q in QUERIES:
+            start = time.perf_counter()
+            fn(q)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    from app.schemas.product import Product
+    from app.services.search_index import ProductSearchIndex, normalize_turkish
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 20000, 100000])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        products = [Product(**make_product(i)) for i in range(1, size + 1)]
+
+        start = time.perf_counter()
+        index = ProductSearchIndex(products)
+        build = time.perf_counter() - start
+
+        # Separate traced build; tracemalloc slows the build down several times
+        tracemalloc.start()
+        traced = ProductSearchIndex(products)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del traced
+
+        indexed = measure_queries(lambda q: index.search(q, limit=10), args.rounds)
+        legacy = measure_queries(lambda q: legacy_scan(products, q, normalize_turkish), max(1, args.rounds // 5))
+
+        print(f"{size} products")
+        print(f"  build={build:.2f}s  index_mem={current / 1024 / 1024:.1f} MiB  build_peak={peak / 1024 / 1024:.1f} MiB")
+        print(f"  index query  p50={percentile(indexed, 50):.3f}ms  p95={percentile(indexed, 95):.3f}ms")
+        print(f"  legacy scan  p50={percentile(legacy, 50):.3f}ms  p95={percentile(legacy, 95):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Search result rendering microbenchmark: building each result block per query (the old
+search_products loop) vs. joining blocks from the per-product render cache.
+
+    python -m benchmarks.search_render --products 20000
+"""
+import argparse
+import time
+
+from benchmarks import common  # noqa: F401  (sets the env Settings() needs)
+from benchmarks.common import percentile
+from benchmarks.search_index import QUERIES
+from benchmarks.stubs.shopify_stub import make_product
+
+
+def measure(fn, queries, rounds: int) -> list:
+    timings = []
+    for _ in range(rounds):
+        for results in queries:
+            start = time.perf_counter()
+            fn(results)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    from app.schemas.product import Product
+    from app.services.product_render_cache import ProductRenderCache, render_product
+    from app.services.search_index import ProductSearchIndex
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    products = [Product(**make_product(i)) for i in range(1, args.products + 1)]
+    index = ProductSearchIndex(products)
+    # Scoring is the same in both modes, so only the rendering of fixed result lists is timed
+    queries = [[p for _, p in index.search(q, limit=args.limit)] for q in QUERIES]
+
+    cache = ProductRenderCache(max_size=args.products)
+    for results in queries:
+        for p in results:
+            cache.get(p)
+
+    uncached = measure(lambda results: "\n".join(render_product(p) for p in results), queries, args.rounds)
+    cached = measure(lambda results: "\n".join(cache.get(p) for p in results), queries, args.rounds)
+
+    print(f"{args.products} products, {args.limit} results per query")
+    print(f"  render per query  p50={percentile(uncached, 50):.3f}ms  p95={percentile(uncached, 95):.3f}ms")
+    print(f"  render cache      p50={percentile(cached, 50):.3f}ms  p95={percentile(cached, 95):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Scripted stand-in for Gemini: a GenerativeModel whose generate_content_async answers from a
+script instead of calling Google. Chat turns still go through the real ChatSession, the tool
+loop and the tools (against the Shopify stub), so only the model's own work is replaced.
+
+The reply depends on the last message of the conversation:
+  tool results                       -> a text answer quoting the first result line
+  "sipariş" in the text              -> a create_draft_order call (credit card, so a draft order is created)
+  a product word in the text         -> a search_products call
+  anything else, or tools disabled   -> a short text answer
+Text is streamed in a few chunks when stream=True.
+
+    from benchmarks.stubs import gemini_stub
+    gemini_stub.install(latency_ms=400)   # before the app starts and creates its AIService
+"""
+import asyncio
+import random
+
+import google.generativeai as genai
+from google.generativeai import protos
+from google.generativeai.types import generation_types
+
+ORDER_WORDS = ("sipariş", "satın al")
+PRODUCT_WORDS = ("elbise", "tunik", "ferace", "etek", "gömlek", "pantolon", "kap", "takım")
+GREETING = "Merhaba efendim hoş geldiniz 🌸 size nasıl yardımcı olabilirim"
+
+_RealGenerativeModel = genai.GenerativeModel
+
+
+class FakeGenerativeModel(_RealGenerativeModel):
+    # Seconds before the response (or its first chunk), and between streamed chunks
+    latency = 0.0
+    jitter = 0.0
+    chunk_delay = 0.0
+
+    async def generate_content_async(self, contents, *, stream: bool = False, tool_config=None, **kwargs):
+        await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        parts = self._script(contents, tools_enabled="NONE" not in str(tool_config or ""))
+        if not stream:
+            return generation_types.AsyncGenerateContentResponse.from_response(_response(parts))
+        return await generation_types.AsyncGenerateContentResponse.from_aiterator(self._chunks(parts))
+
+    def _script(self, contents, tools_enabled: bool) -> list:
+        last = contents[-1]
+        results = [p.function_response for p in last.parts if "function_response" in p]
+        if results:
+            first_line = str(results[0].response["result"]).strip().splitlines()[0][:160]
+            return [protos.Part(text=f"Baktım efendim ✨ {first_line} başka bir isteğiniz var mı")]
+
+        text = " ".join(p.text for p in last.parts if p.text).lower()
+        if tools_enabled and any(word in text for word in ORDER_WORDS):
+            return [protos.Part(function_call=protos.FunctionCall(name="create_draft_order", args={
+                "variant_id": 101,
+                "quantity": 1,
+                "first_name": "Ayşe",
+                "last_name": "Yılmaz",
+                "address1": "Örnek Mah. 1. Sok. No:2",
+                "city": "İstanbul",
+                "phone": "05551234567",
+                "product_summary": "İkra Elbise (Kırmızı, 38)",
+                "payment_method": "Kredi Kartı",
+            }))]
+        if tools_enabled and any(word in text for word in PRODUCT_WORDS):
+            query = " ".join(w for w in text.split() if w not in ("var", "mı", "mi"))
+            return [protos.Part(function_call=protos.FunctionCall(name="search_products", args={"query": query}))]
+        return [protos.Part(text=GREETING)]
+
+    async def _chunks(self, parts: list):
+        if len(parts) != 1 or not parts[0].text:
+            yield _response(parts)
+            return
+        words = parts[0].text.split(" ")
+        step = max(1, len(words) // 3)
+        for i in range(0, len(words), step):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            chunk = " ".join(words[i:i + step]) + (" " if i + step < len(words) else "")
+            yield _response([protos.Part(text=chunk)])
+
+
+def _response(parts: list) -> protos.GenerateContentResponse:
+    return protos.GenerateContentResponse(candidates=[protos.Candidate(
+        index=0,
+        content=protos.Content(role="model", parts=parts),
+        finish_reason=protos.Candidate.FinishReason.STOP,
+    )])
+
+
+def install(latency_ms: float = 0.0, jitter_ms: float = 0.0, chunk_delay_ms: float = 0.0) -> None:
+    """
+    Replaces genai.GenerativeModel with the scripted model. AIService looks the class up when
+    it creates a model, so call this before the app starts (the lifespan creates the AIService).
+    """
+    FakeGenerativeModel.latency = latency_ms / 1000
+    FakeGenerativeModel.jitter = jitter_ms / 1000
+    FakeGenerativeModel.chunk_delay = chunk_delay_ms / 1000
+    genai.GenerativeModel = FakeGenerativeModel
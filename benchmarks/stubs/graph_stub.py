@@ -0,0 +1,40 @@
+"""
+Local stand-in for the Meta Graph API `/messages` endpoint (WhatsApp Cloud API sends).
+Point META_GRAPH_BASE_URL at it, e.g. http://127.0.0.1:8002/v17.0. Receipt times per
+recipient are kept so a benchmark can measure webhook-to-reply latency.
+"""
+import asyncio
+import itertools
+import random
+import time
+
+from fastapi import FastAPI, Request
+
+
+def create_app(latency_ms: float = 0.0, jitter_ms: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    app.state.latency = latency_ms / 1000
+    app.state.jitter = jitter_ms / 1000
+    # recipient -> [time.time() of each message sent to them]
+    app.state.received = {}
+    message_ids = itertools.count(1)
+
+    @app.post("/{version}/{phone_number_id}/messages")
+    async def messages(version: str, phone_number_id: str, request: Request):
+        delay = app.state.latency + random.uniform(0, app.state.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        body = await request.json()
+        recipient = body["to"]
+        app.state.received.setdefault(recipient, []).append(time.time())
+        return {
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": recipient, "wa_id": recipient}],
+            "messages": [{"id": f"wamid.stub.{next(message_ids)}"}],
+        }
+
+    @app.get("/stub/received")
+    async def received():
+        return app.state.received
+
+    return app
@@ -0,0 +1,249 @@
+"""
+Local stand-in for the Shopify Admin API (REST products, draft orders and shop, GraphQL
+bulk operations), serving a synthetic catalog. Latency (with jitter) applies to every Admin
+API call; with rate_limit=True REST calls go through Shopify's leaky bucket, report it in
+X-Shopify-Shop-Api-Call-Limit and get a 429 with Retry-After once it is full.
+"""
+import asyncio
+import base64
+import itertools
+import math
+import random
+import time
+
+import json
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+COLORS = ["Kırmızı", "Siyah", "Beyaz", "Lacivert", "Bej", "Yeşil", "Pudra", "Haki"]
+SIZES = ["36", "38", "40", "42", "44", "46"]
+NAMES = ["İkra", "Leyla", "Defne", "Ada", "Zeynep", "Nil", "Elif", "Asya", "Mira", "Lale"]
+KINDS = ["Elbise", "Tunik", "Ferace", "Etek", "Gömlek", "Pantolon", "Kap", "Takım"]
+FABRICS = ["keten", "viskon", "krep", "şifon", "pamuklu", "saten", "triko", "kaşe"]
+
+
+def make_product(i: int) -> dict:
+    rnd = random.Random(i)
+    name = f"{rnd.choice(NAMES)} {rnd.choice(KINDS)} {i}"
+    fabric = rnd.choice(FABRICS)
+    colors = rnd.sample(COLORS, 2)
+    variants = []
+    for c_idx, color in enumerate(colors):
+        for s_idx, size in enumerate(rnd.sample(SIZES, 3)):
+            variants.append({
+                "id": i * 100 + c_idx * 10 + s_idx,
+                "title": f"{color} / {size}",
+                "price": f"{rnd.randint(300, 2500)}.00",
+                "inventory_quantity": rnd.randint(0, 5),
+                "inventory_policy": "deny",
+                "inventory_management": "shopify",
+                "sku": f"SKU-{i}-{c_idx}{s_idx}",
+            })
+    return {
+        "id": i,
+        "title": name,
+        "body_html": f"<p>{fabric.capitalize()} kumaştan {name.lower()}.</p><ul><li>Boy: {rnd.randint(90, 140)} cm</li><li>Kalıp: rahat</li></ul>",
+        "handle": f"urun-{i}",
+        "product_type": name.split()[1],
+        "vendor": "ModaMasal",
+        "updated_at": "2024-01-01T00:00:00+03:00",
+        "variants": variants,
+        "images": [{"src": f"https://cdn.example.com/{i}.jpg", "alt": name}],
+    }
+
+
+def make_bulk_lines(i: int):
+    """
+    The product as Shopify's bulk JSONL writes it: the product line, then one line per child
+    (variants, images) pointing back to it with __parentId.
+    """
+    product = make_product(i)
+    gid = f"gid://shopify/Product/{i}"
+    yield {
+        "id": gid,
+        "title": product["title"],
+        "handle": product["handle"],
+        "bodyHtml": product["body_html"],
+        "productType": product["product_type"],
+        "vendor": product["vendor"],
+        "updatedAt": product["updated_at"],
+    }
+    for v in product["variants"]:
+        yield {
+            "id": f"gid://shopify/ProductVariant/{v['id']}",
+            "title": v["title"],
+            "price": v["price"],
+            "sku": v["sku"],
+            "inventoryQuantity": v["inventory_quantity"],
+            "inventoryPolicy": v["inventory_policy"].upper(),
+            "inventoryItem": {"tracked": v["inventory_management"] == "shopify"},
+            "__parentId": gid,
+        }
+    for image in product["images"]:
+        yield {"url": image["src"], "altText": image["alt"], "__parentId": gid}
+
+
+def _encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(str(offset).encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> int:
+    return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+
+LIMIT_HEADER = "X-Shopify-Shop-Api-Call-Limit"
+
+
+def create_app(
+    product_count: int = 20000,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    rate_limit: bool = False,
+    bucket_size: int = 40,
+    leak_rate: float = 2.0,
+) -> FastAPI:
+    app = FastAPI()
+    app.state.product_count = product_count
+    app.state.latency = latency_ms / 1000
+    app.state.jitter = jitter_ms / 1000
+    app.state.rate_limit = rate_limit
+    app.state.bucket_size = bucket_size
+    app.state.leak_rate = leak_rate
+    app.state.bucket = {"level": 0.0, "updated": time.monotonic()}
+    app.state.throttled = 0
+    app.state.draft_orders = 0
+    # Pages are rendered once so the stub itself stays cheap under repeated ingests
+    page_cache = {}
+    draft_order_ids = itertools.count(1)
+
+    async def upstream_delay() -> None:
+        delay = app.state.latency + random.uniform(0, app.state.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def call_limit() -> dict:
+        """
+        Takes a slot in the REST leaky bucket and returns the call-limit header,
+        or raises a 429 like Shopify when the bucket is full.
+        """
+        if not app.state.rate_limit:
+            return {}
+        bucket = app.state.bucket
+        now = time.monotonic()
+        bucket["level"] = max(0.0, bucket["level"] - (now - bucket["updated"]) * app.state.leak_rate)
+        bucket["updated"] = now
+        if bucket["level"] + 1 > app.state.bucket_size:
+            app.state.throttled += 1
+            raise HTTPException(
+                status_code=429,
+                detail="Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service.",
+                headers={"Retry-After": "1.0", LIMIT_HEADER: f"{app.state.bucket_size}/{app.state.bucket_size}"},
+            )
+        bucket["level"] += 1
+        return {LIMIT_HEADER: f"{math.ceil(bucket['level'])}/{app.state.bucket_size}"}
+
+    @app.get("/admin/api/{version}/products.json")
+    async def products(
+        request: Request,
+        limit: int = Query(50, le=250),
+        page_info: str = None,
+    ):
+        headers = call_limit()
+        await upstream_delay()
+        offset = _decode_cursor(page_info) if page_info else 0
+        end = min(offset + limit, app.state.product_count)
+        key = (offset, end)
+        if key not in page_cache:
+            page_cache[key] = json.dumps(
+                {"products": [make_product(i) for i in range(offset + 1, end + 1)]}
+            ).encode()
+        if end < app.state.product_count:
+            next_url = request.url.replace_query_params(limit=limit, page_info=_encode_cursor(end))
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        return Response(page_cache[key], media_type="application/json", headers=headers)
+
+    @app.get("/admin/api/{version}/shop.json")
+    async def shop(response: Response):
+        response.headers.update(call_limit())
+        await upstream_delay()
+        return {"shop": {
+            "id": 1,
+            "name": "ModaMasal Stub",
+            "myshopify_domain": "benchmark.myshopify.com",
+            "currency": "TRY",
+            "iana_timezone": "Europe/Istanbul",
+        }}
+
+    @app.post("/admin/api/{version}/draft_orders.json", status_code=201)
+    async def draft_orders(request: Request, response: Response):
+        response.headers.update(call_limit())
+        await upstream_delay()
+        draft_order = (await request.json())["draft_order"]
+        draft_order_id = next(draft_order_ids)
+        app.state.draft_orders += 1
+        return {"draft_order": {
+            **draft_order,
+            "id": draft_order_id,
+            "name": f"#D{draft_order_id}",
+            "status": "open",
+            "currency": "TRY",
+            "invoice_url": f"{request.base_url}invoices/{draft_order_id}",
+        }}
+
+    @app.get("/stub/stats")
+    async def stub_stats():
+        return {"throttled": app.state.throttled, "draft_orders": app.state.draft_orders}
+
+    # Bulk operations complete after `bulk_polls` status checks
+    app.state.bulk_polls = 2
+    app.state.bulk = None
+
+    @app.post("/admin/api/{version}/graphql.json")
+    async def graphql(request: Request):
+        await upstream_delay()
+        body = await request.json()
+        query = body.get("query", "")
+        if "bulkOperationRunQuery" in query:
+            app.state.bulk = {"id": f"gid://shopify/BulkOperation/{random.randint(1, 10**9)}", "polls": 0}
+            return {"data": {"bulkOperationRunQuery": {
+                "bulkOperation": {"id": app.state.bulk["id"], "status": "CREATED"},
+                "userErrors": [],
+            }}}
+        if "currentBulkOperation" in query:
+            bulk = app.state.bulk
+            if bulk is None:
+                return {"data": {"currentBulkOperation": None}}
+            bulk["polls"] += 1
+            done = bulk["polls"] >= app.state.bulk_polls
+            return {"data": {"currentBulkOperation": {
+                "id": bulk["id"],
+                "status": "COMPLETED" if done else "RUNNING",
+                "errorCode": None,
+                "objectCount": str(app.state.product_count * 8) if done else "0",
+                "url": str(request.base_url) + "bulk/products.jsonl" if done else None,
+            }}}
+        return {"errors": [{"message": "Unsupported query in stub"}]}
+
+    bulk_chunks = []
+
+    @app.get("/bulk/products.jsonl")
+    async def bulk_result():
+        # Rendered once, like the REST pages, then streamed in chunks
+        if not bulk_chunks:
+            chunk = []
+            for i in range(1, app.state.product_count + 1):
+                chunk.extend(json.dumps(line) for line in make_bulk_lines(i))
+                if len(chunk) >= 2000:
+                    bulk_chunks.append(("\n".join(chunk) + "\n").encode())
+                    chunk = []
+            if chunk:
+                bulk_chunks.append(("\n".join(chunk) + "\n").encode())
+
+        async def body():
+            for chunk in bulk_chunks:
+                yield chunk
+
+        return StreamingResponse(body(), media_type="application/jsonl")
+
+    return app
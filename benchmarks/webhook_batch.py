@@ -0,0 +1,108 @@
+"""
+WhatsApp webhook batch benchmark: synthetic multi-entry / multi-message deliveries,
+including Meta-style redeliveries, posted to /api/v1/webhooks/whatsapp.
+Measures payload walking + dedup on its own and the full endpoint (enqueue into SQLite).
+Job workers are not started, so only ingestion is measured.
+
+    python -m benchmarks.webhook_batch --deliveries 500 --messages 20 --duplicates 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import percentile
+
+
+def make_delivery(rnd: random.Random, counter: list, messages: int, duplicate_ids: list, duplicates: float) -> dict:
+    entries = []
+    per_entry = max(1, messages // 2)
+    remaining = messages
+    while remaining > 0:
+        batch = []
+        for _ in range(min(per_entry, remaining)):
+            if duplicate_ids and rnd.random() < duplicates:
+                msg_id = rnd.choice(duplicate_ids)
+            else:
+                counter[0] += 1
+                msg_id = f"wamid.{counter[0]}"
+                duplicate_ids.append(msg_id)
+            batch.append({
+                "from": f"90555{rnd.randint(0, 999):03d}0000",
+                "id": msg_id,
+                "timestamp": str(int(time.time())),
+                "type": "text",
+                "text": {"body": rnd.choice(["merhaba", "ikra elbise var mı", "38 beden", "kapıda ödeme"])},
+            })
+            remaining -= 1
+        # Two changes per entry: one with messages, one status update that must be skipped
+        entries.append({"changes": [
+            {"value": {"messages": batch}},
+            {"value": {"statuses": [{"id": "wamid.status", "status": "delivered"}]}},
+        ]})
+    return {"object": "whatsapp_business_account", "entry": entries}
+
+
+async def run(args) -> None:
+    import httpx
+    from app.db.database import init_db
+    from app.main import app
+    from app.routers import webhooks
+
+    await init_db()
+    rnd = random.Random(42)
+    counter, ids = [0], []
+    payloads = [make_delivery(rnd, counter, args.messages, ids, args.duplicates) for _ in range(args.deliveries)]
+    total_messages = args.deliveries * args.messages
+
+    # 1. Payload walk + dedup only
+    start = time.perf_counter()
+    unique = 0
+    for payload in payloads:
+        for msg in webhooks.extract_text_messages(payload):
+            if msg["id"] not in webhooks.seen_message_ids:
+                webhooks.seen_message_ids.add(msg["id"])
+                unique += 1
+    elapsed = time.perf_counter() - start
+    print(f"extract+dedup: {total_messages} messages in {elapsed * 1000:.1f}ms "
+          f"({total_messages / elapsed:,.0f} msg/s), {unique} unique")
+
+    # 2. Full endpoint, fresh dedup cache
+    webhooks.seen_message_ids._seen.clear()
+    webhooks.seen_message_ids.duplicates = 0
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        for payload in payloads:
+            t = time.perf_counter()
+            response = await client.post("/api/v1/webhooks/whatsapp", json=payload)
+            latencies.append((time.perf_counter() - t) * 1000)
+            assert response.status_code == 200, response.text
+        elapsed = time.perf_counter() - start
+
+    stats = webhooks.job_queue
+    print(f"endpoint: {args.deliveries} deliveries x {args.messages} messages in {elapsed:.2f}s "
+          f"({args.deliveries / elapsed:,.0f} deliveries/s, {total_messages / elapsed:,.0f} msg/s)")
+    print(f"  queued={stats.enqueued}  duplicates_dropped={webhooks.seen_message_ids.duplicates}")
+    print(f"  per-delivery p50={percentile(latencies, 50):.2f}ms  p95={percentile(latencies, 95):.2f}ms  "
+          f"p99={percentile(latencies, 99):.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--deliveries", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--duplicates", type=float, default=0.3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp}/webhook_bench.db"
+        os.environ.setdefault("JOB_QUEUE_MAX_DEPTH", str(args.deliveries * args.messages + 1))
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+import os
+
+# Settings() is built on import and needs these; the tests never reach the real services
+os.environ.setdefault("SHOPIFY_STORE_URL", "test.myshopify.com")
+os.environ.setdefault("SHOPIFY_ACCESS_TOKEN", "test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
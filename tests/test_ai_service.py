@@ -0,0 +1,73 @@
+import asyncio
+
+from google.api_core import exceptions as google_exceptions
+
+from benchmarks.stubs import gemini_stub
+
+gemini_stub.install()
+
+from app.services.ai_service import TURN_TIMEOUT_MESSAGE, AIService  # noqa: E402
+
+
+class FailAfterToolsModel(gemini_stub.FakeGenerativeModel):
+    """
+    The scripted model, but calls that carry tool results fail (on every tier) while `failing` is set.
+    """
+
+    failing = True
+
+    async def generate_content_async(self, contents, **kwargs):
+        last = contents[-1]
+        if self.failing and any("function_response" in p for p in last.parts):
+            raise google_exceptions.InternalServerError("backend error")
+        return await super().generate_content_async(contents, **kwargs)
+
+
+def _assert_calls_answered(history) -> None:
+    for i, content in enumerate(history):
+        if any(p.function_call for p in content.parts):
+            following = history[i + 1] if i + 1 < len(history) else None
+            assert following is not None and following.role == "user"
+            assert all(p.function_response for p in following.parts)
+
+
+async def _tool(name, args):
+    return "Ürün: İkra Elbise"
+
+
+def _run_session(stream: bool) -> None:
+    gemini_stub.genai.GenerativeModel = FailAfterToolsModel
+    FailAfterToolsModel.failing = True
+    try:
+        ai = AIService()
+        ai.execute_tool = _tool
+
+        async def turn(message: str) -> str:
+            texts = []
+            async for event in ai.stream_response(message, "s1", stream=stream):
+                if event["type"] in ("text", "error"):
+                    texts.append(event["text"])
+            return "".join(texts)
+
+        async def main():
+            first = await turn("ikra elbise var mı")
+            assert "Teknik Hata" in first
+            chat = ai.chat_sessions.get_or_create("s1", None)
+            _assert_calls_answered(chat.history)
+            assert chat.history[-1].parts[0].text == TURN_TIMEOUT_MESSAGE
+
+            FailAfterToolsModel.failing = False
+            assert await turn("merhaba") == gemini_stub.GREETING
+            _assert_calls_answered(chat.history)
+
+        asyncio.run(main())
+    finally:
+        gemini_stub.genai.GenerativeModel = gemini_stub.FakeGenerativeModel
+
+
+def test_error_after_tool_round_closes_turn():
+    _run_session(stream=False)
+
+
+def test_error_after_tool_round_closes_streamed_turn():
+    _run_session(stream=True)
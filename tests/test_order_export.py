@@ -0,0 +1,22 @@
+import csv
+import io
+
+from app.services.order_export import _csv_value
+
+
+def test_formula_cells_are_quoted():
+    for value in ("=HYPERLINK(\"http://x\")", "+905551234567", "-2+3", "@SUM(A1)", "\tx", "\rx"):
+        assert _csv_value(value) == "'" + value
+
+
+def test_plain_values_are_unchanged():
+    assert _csv_value("Ayşe Yılmaz") == "Ayşe Yılmaz"
+    assert _csv_value("Örnek Mah. 1. Sok. No:2") == "Örnek Mah. 1. Sok. No:2"
+    assert _csv_value(-5.0) == -5.0
+    assert _csv_value(None) == ""
+
+
+def test_quoted_value_survives_csv_round_trip():
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow([_csv_value("=1+1"), _csv_value("a,b")])
+    assert next(csv.reader(io.StringIO(buffer.getvalue()))) == ["'=1+1", "a,b"]